@@ -1,8 +1,10 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
 from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # ===== Загрузка .env =====
@@ -36,6 +38,19 @@ else:
         )
     }
 
+# ===== CACHE =====
+# Общий для всех воркеров хоста кэш на SQLite (WAL), без Redis/memcached
+CACHES = {
+    "default": {
+        "BACKEND": "users.cache.SQLiteCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "sporthub-cache.sqlite3")),
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": 50000,
+        },
+    }
+}
+
 # ===== STATIC & MEDIA =====
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
@@ -52,6 +67,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Карта объектов запроса: повторные выборки профиля/пользователя из памяти
+    "users.identity.IdentityMapMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -72,12 +89,35 @@ CORS_EXPOSE_HEADERS = ["Authorization"]
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # ===== EMAIL =====
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True").lower() in ("1", "true", "yes")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER or "noreply@sporthub.local")
+# Без SMTP-учётки (локальный запуск) письма пишутся в консоль;
+# EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend сохраняет их в EMAIL_FILE_PATH
+EMAIL_BACKEND = os.getenv(
+    "EMAIL_BACKEND",
+    "django.core.mail.backends.smtp.EmailBackend" if EMAIL_HOST_USER
+    else "django.core.mail.backends.console.EmailBackend",
+)
+EMAIL_FILE_PATH = os.getenv("EMAIL_FILE_PATH", str(BASE_DIR / "sent_emails"))
+EMAIL_TIMEOUT = 30
+
+# Outbox: письма отправляет воркер `manage.py send_outbox`, а не запрос
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 30
+
+# Очистка растущих таблиц (`manage.py purge_data`, задача retention.purge):
+# удаление пачками по первичному ключу с паузой, чтобы не держать долгих блокировок
+RETENTION_BATCH_SIZE = 1000
+RETENTION_PAUSE_SECONDS = 0.2
+RETENTION_CODE_DAYS = 1
+RETENTION_NOTIFICATION_DAYS = int(os.getenv("RETENTION_NOTIFICATION_DAYS", 90))
+RETENTION_OUTBOX_DAYS = 30
+RETENTION_JOB_DAYS = 30
 
 # ===== INSTALLED APPS =====
 INSTALLED_APPS = [
@@ -87,6 +127,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     "corsheaders",
     "rest_framework",
@@ -119,18 +160,65 @@ ROOT_URLCONF = "Sporthub.urls"
 WSGI_APPLICATION = "Sporthub.wsgi.application"
 
 # ===== JWT =====
+# Подпись токенов: по умолчанию HS256 на SECRET_KEY. Для RS256/EdDSA (нужен пакет
+# cryptography) задайте JWT_ALGORITHM и ключи в PEM — строкой (переводы строк как \n)
+# или путём к файлу в JWT_*_KEY_FILE. Публичный ключ отдаётся в /auth/jwks/,
+# чтобы другие сервисы проверяли токены сами.
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+
+
+def _jwt_key(name):
+    path = os.getenv(f"{name}_FILE")
+    if path:
+        return Path(path).read_text()
+    return os.getenv(name, "").replace("\\n", "\n")
+
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=3650),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=3650),
     "AUTH_HEADER_TYPES": ("Bearer",),
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
+    "ALGORITHM": JWT_ALGORITHM,
+}
+if not JWT_ALGORITHM.startswith("HS"):
+    SIMPLE_JWT["SIGNING_KEY"] = _jwt_key("JWT_PRIVATE_KEY")
+    SIMPLE_JWT["VERIFYING_KEY"] = _jwt_key("JWT_PUBLIC_KEY")
+    if not SIMPLE_JWT["SIGNING_KEY"] or not SIMPLE_JWT["VERIFYING_KEY"]:
+        raise ImproperlyConfigured(f"Для {JWT_ALGORITHM} нужны JWT_PRIVATE_KEY и JWT_PUBLIC_KEY")
+
+# Вход по email без учёта регистра (индекс на LOWER(email)) или по username
+AUTHENTICATION_BACKENDS = [
+    "users.backends.EmailBackend",
+]
+
+# Стоимость хэша пароля: PASSWORD_HASH_ITERATIONS подбирается под железо
+# командой `manage.py calibrate_hasher` (0 — значение Django по умолчанию)
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 0))
+# Стандартный PBKDF2PasswordHasher не указан: у него тот же алгоритм, и Django
+# проверял бы им пароли (и добирал бы время до его числа итераций)
+PASSWORD_HASHERS = [
+    "users.hashers.CalibratedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Лимиты auth-эндпоинтов (users.throttling): запросов/период, период — s, m, h, d с множителем
+AUTH_THROTTLE_RATES = {
+    "ip": os.getenv("THROTTLE_IP_RATE", "30/m"),  # все auth-запросы с одного IP
+    "login": "10/15m",  # попытки входа на один email
+    "send": "5/h",      # письма с кодом на один email: регистрация, повтор, сброс пароля
+    "code": "5/15m",    # попытки ввести код на один email
 }
 
 # ===== REST FRAMEWORK =====
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWT без запроса пользователя и профиля на каждый запрос (кэш снимков в процессе)
+        "users.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
@@ -143,6 +231,12 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.FormParser",
         "rest_framework.parsers.MultiPartParser",
     ],
+    "DEFAULT_PAGINATION_CLASS": "users.pagination.StandardPagination",
+    # Сколько прокси перед приложением: IP клиента для лимитов берётся из X-Forwarded-For.
+    # По умолчанию заголовок не учитывается (REMOTE_ADDR), иначе без прокси клиент
+    # подменяет его и обходит лимит по IP. За прокси значение задаётся в Procfile
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", 0)),
+    "PAGE_SIZE": 20,
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
     "EXCEPTION_HANDLER": "users.handlers.custom_exception_handler",
 }
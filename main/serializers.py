@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from users.models import Hall, Club, Review
+from users.models import Hall, Club, Review, SearchDocument
 
 class HallSerializer(serializers.ModelSerializer):
     average_rating = serializers.FloatField(read_only=True)
@@ -11,7 +11,7 @@ class HallSerializer(serializers.ModelSerializer):
             'id', 'title', 'sport', 'description', 'address',
             'price_per_hour', 'size', 'count', 'type', 'coating', 'inventory',
             'has_locker_room', 'has_lighting', 'has_shower', 'images',
-            'video_url', 'average_rating', 'review_count'
+            'video_url', 'average_rating', 'review_count', 'latitude', 'longitude'
         ]
         ref_name = 'MainHall'
 
@@ -30,7 +30,7 @@ class ClubSerializer(serializers.ModelSerializer):
             'id', 'title', 'description', 'coach', 'contact_phone',
             'training_schedule', 'age_groups', 'price_per_month',
             'hall', 'hall_info', 'logo', 'average_rating',
-            'review_count', 'video_url'
+            'review_count', 'video_url', 'latitude', 'longitude'
         ]
         extra_kwargs = {'hall': {'write_only': True}}
         ref_name = 'MainClub'
@@ -49,6 +49,39 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 
 
+class SearchResultSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='object_id', read_only=True)
+
+    class Meta:
+        model = SearchDocument
+        fields = ['kind', 'id', 'title', 'keywords']
+        ref_name = 'MainSearchResult'
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.01, max_value=20000, required=False,
+                                    help_text='Радиус поиска в километрах')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class NearbyHallSerializer(HallSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(HallSerializer.Meta):
+        fields = HallSerializer.Meta.fields + ['distance_km']
+        ref_name = 'MainNearbyHall'
+
+
+class NearbyClubSerializer(ClubSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(ClubSerializer.Meta):
+        fields = ClubSerializer.Meta.fields + ['distance_km']
+        ref_name = 'MainNearbyClub'
+
+
 class HallDetailSerializer(HallSerializer):
     reviews = ReviewSerializer(many=True, read_only=True)
 
@@ -84,3 +117,5 @@ class AdminReviewSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user_info', 'trainer_name', 'club_name', 'created_at']
         ref_name = 'AdminReview'
+        # Что читают методы сериализатора (для OptimizedQuerysetMixin)
+        field_sources = {'user_info': ('user.username', 'user.email')}
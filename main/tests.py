@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+
+from users.models import Review
+from users.testing import CacheIsolatedAPITestCase, QueryCountMixin, make_club, make_hall, make_user
+
+
+class ConstantQueryTests(QueryCountMixin, CacheIsolatedAPITestCase):
+    """Число запросов каталога не зависит от числа строк и отзывов."""
+
+    def setUp(self):
+        super().setUp()
+        self.hall = make_hall()
+        self.club = make_club(hall=self.hall)
+
+    def add_review(self, number):
+        user = make_user(f'user{number}@example.com')
+        Review.objects.create(user=user, hall=self.hall, club=self.club, text=f'Отзыв {number}', rating=4)
+
+    def add_club(self, number):
+        hall = make_hall(f'Зал {number}', sport='Баскетбол', price_per_hour=500)
+        make_club(f'Клуб {number}', sport='Баскетбол', hall=hall)
+
+    def test_club_list(self):
+        self.assertConstantQueries('/api/clubs/', self.add_club)
+
+    def test_details_with_reviews(self):
+        for url in (f'/api/clubs/{self.club.pk}/', f'/api/halls/{self.hall.pk}/'):
+            with self.subTest(url=url):
+                self.assertConstantQueries(url, self.add_review)
+            User.objects.all().delete()
+
+    def test_review_list(self):
+        self.assertConstantQueries('/api/reviews/', self.add_review)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import HallViewSet, ClubViewSet, ReviewViewSet
+from .views import HallViewSet, ClubViewSet, ReviewViewSet, CatalogSearchView
 
 router = DefaultRouter()
 router.register(r'halls', HallViewSet, basename='hall')
@@ -8,5 +8,6 @@ router.register(r'clubs', ClubViewSet)
 router.register(r'reviews', ReviewViewSet, basename='reviews')
 
 urlpatterns = [
+    path('search/', CatalogSearchView.as_view(), name='catalog_search'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
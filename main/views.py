@@ -1,35 +1,79 @@
-from django.db.models import Avg, Count
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, generics
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from users.models import Hall, Club, Review
+from users.models import Hall, Club, Review, SearchDocument
+from users.filters import RankedSearchFilter
+from users.utils.search import search_documents
+from users.utils.geo import nearest
 from users.permissions import IsOwnerOrAdmin
+from users.pagination import CreatedAtCursorPagination
+from users.utils.http_cache import CachedResponseMixin
+from users.utils.optimizer import OptimizedQuerysetMixin
 from .serializers import (
     HallSerializer, ClubSerializer, ReviewSerializer,
-    HallDetailSerializer, ClubDetailSerializer, AdminReviewSerializer
+    HallDetailSerializer, ClubDetailSerializer, AdminReviewSerializer,
+    SearchResultSerializer, NearbyQuerySerializer, NearbyHallSerializer, NearbyClubSerializer
 )
 
 
 from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+
+def paginated_reviews(view, queryset):
+    """Отзывы зала/клуба с курсорной пагинацией, как в общем списке отзывов."""
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(queryset, view.request, view=view)
+    serializer = ReviewSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
-class HallViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Hall.objects.all().annotate(
-        average_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
+NEARBY_PARAMETERS = [
+    openapi.Parameter('lat', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=True, description='Широта'),
+    openapi.Parameter('lng', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=True, description='Долгота'),
+    openapi.Parameter('radius', openapi.IN_QUERY, type=openapi.TYPE_NUMBER,
+                      description='Радиус в километрах (по умолчанию — без ограничения)'),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description='Сколько ближайших вернуть (1–100, по умолчанию 20)'),
+]
+
+
+def nearby_response(view, serializer_class):
+    """Ближайшие объекты queryset вьюсета, упорядоченные по расстоянию."""
+    params = NearbyQuerySerializer(data=view.request.query_params)
+    params.is_valid(raise_exception=True)
+    objects = nearest(
+        view.filter_queryset(view.get_queryset()),
+        params.validated_data['lat'],
+        params.validated_data['lng'],
+        limit=params.validated_data['limit'],
+        radius_km=params.validated_data.get('radius'),
     )
+    return Response(serializer_class(objects, many=True).data)
+
+
+class HallViewSet(OptimizedQuerysetMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    # average_rating и review_count хранятся в самой таблице и обновляются сигналами Review
+    queryset = Hall.objects.order_by('id')
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    cache_namespace = 'main.halls'
+    cache_models = (Hall,)
+    filter_backends = [DjangoFilterBackend, RankedSearchFilter]
     filterset_fields = ['type', 'coating', 'has_locker_room', 'has_shower', 'has_lighting']
-    search_fields = ['title', 'address', 'inventory']
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return HallDetailSerializer
         return HallSerializer
 
+    def get_cache_models(self):
+        # Детальная карточка включает отзывы
+        if self.action == 'retrieve':
+            return (Hall, Review)
+        return self.cache_models
+
     @swagger_auto_schema(
         tags=['🏟️ Залы'],
         operation_summary='Список залов',
@@ -54,25 +98,39 @@ class HallViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         hall = self.get_object()
-        serializer = ReviewSerializer(hall.reviews.all(), many=True)
-        return Response(serializer.data)
+        return paginated_reviews(self, hall.reviews.all())
 
-
-class ClubViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Club.objects.all().annotate(
-        average_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
+    @swagger_auto_schema(
+        tags=['🏟️ Залы'],
+        operation_summary='Залы рядом',
+        operation_description='Ближайшие залы к точке (lat, lng) с расстоянием в километрах. '
+                              'Учитываются только залы с заполненными координатами.',
+        manual_parameters=NEARBY_PARAMETERS
     )
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        return nearby_response(self, NearbyHallSerializer)
+
+
+class ClubViewSet(OptimizedQuerysetMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Club.objects.order_by('id')
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    cache_namespace = 'main.clubs'
+    # Клуб отдаётся вместе с данными зала (hall_info)
+    cache_models = (Club, Hall)
+    filter_backends = [DjangoFilterBackend, RankedSearchFilter]
     filterset_fields = ['hall']
-    search_fields = ['title', 'description', 'sport']
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ClubDetailSerializer
         return ClubSerializer
 
+    def get_cache_models(self):
+        if self.action == 'retrieve':
+            return self.cache_models + (Review,)
+        return self.cache_models
+
     @swagger_auto_schema(
         tags=['🏀 Клубы'],
         operation_summary='Список клубов',
@@ -97,12 +155,49 @@ class ClubViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         club = self.get_object()
-        serializer = ReviewSerializer(club.reviews.all(), many=True)
-        return Response(serializer.data)
+        return paginated_reviews(self, club.reviews.all())
+
+    @swagger_auto_schema(
+        tags=['🏀 Клубы'],
+        operation_summary='Клубы рядом',
+        operation_description='Ближайшие клубы к точке (lat, lng) с расстоянием в километрах. '
+                              'Учитываются только клубы с заполненными координатами.',
+        manual_parameters=NEARBY_PARAMETERS
+    )
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        return nearby_response(self, NearbyClubSerializer)
+
 
+class CatalogSearchView(generics.ListAPIView):
+    serializer_class = SearchResultSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            return SearchDocument.objects.none()
+        kinds = [kind for kind in self.request.query_params.getlist('kind') if kind]
+        return search_documents(query, kinds=kinds or None)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    @swagger_auto_schema(
+        tags=['🔎 Поиск'],
+        operation_summary='Поиск по залам, клубам и тренерам',
+        operation_description='Единый поиск по каталогу с ранжированием по релевантности.',
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Поисковый запрос'),
+            openapi.Parameter('kind', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['hall', 'club', 'trainer'],
+                              description='Ограничить типом (можно указать несколько раз)'),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class ReviewViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
+    pagination_class = CreatedAtCursorPagination
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -117,6 +212,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
             return AdminReviewSerializer
         return ReviewSerializer
 
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
     @swagger_auto_schema(
         tags=['📝 Отзывы'],
         operation_summary='Список отзывов',
@@ -1,8 +1,40 @@
 from django.contrib import admin
-from .models import UserProfile, PasswordResetCode, ClassSchedule, Joinclub, Attendance
+from .models import UserProfile, PasswordResetCode, ClassSchedule, Joinclub, Attendance, OutboxEmail
+from .utils.attendance import with_attendance_summary
+from .utils.mail import requeue_dead
 
 admin.site.register(UserProfile)
 admin.site.register(PasswordResetCode)
 admin.site.register(ClassSchedule)
-admin.site.register(Joinclub)
 admin.site.register(Attendance)
+
+
+@admin.register(Joinclub)
+class JoinclubAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'attendance_present', 'attendance_absent')
+    list_select_related = ('user', 'schedule')
+
+    def get_queryset(self, request):
+        # Сводка за 30 дней считается в том же запросе, что и список записей
+        return with_attendance_summary(super().get_queryset(request))
+
+    @admin.display(description='Присутствовал (30 дн.)', ordering='attendance_present')
+    def attendance_present(self, obj):
+        return obj.attendance_present
+
+    @admin.display(description='Отсутствовал (30 дн.)', ordering='attendance_absent')
+    def attendance_absent(self, obj):
+        return obj.attendance_absent
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to',)
+    actions = ['requeue']
+
+    @admin.action(description='Вернуть недоставленные в очередь')
+    def requeue(self, request, queryset):
+        count = requeue_dead(queryset.values_list('pk', flat=True))
+        self.message_user(request, f"Возвращено в очередь: {count}")
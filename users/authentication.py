@@ -1,5 +1,20 @@
 # users/authentication.py
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import UserProfile
+from .utils.revocation import is_revoked
+
+User = get_user_model()
+
 
 class PlainJWTAuthentication(JWTAuthentication):
     def get_header(self, request):
@@ -16,3 +31,147 @@ class PlainJWTAuthentication(JWTAuthentication):
         Просто возвращаем токен как есть, без разбора Bearer.
         """
         return header
+
+
+# Поля, из которых собирается пользователь запроса без обращения к БД.
+# Остальные поля модели остаются отложенными и загружаются при первом обращении.
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+PROFILE_FIELDS = ('id', 'user_id', 'role')
+
+# Кэш процесса: сколько пользователей держать и как долго доверять снимку.
+# Сохранение User/UserProfile сбрасывает запись сразу (в этом процессе),
+# в остальных воркерах изменения видны не позже чем через USER_CACHE_TTL.
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 60
+
+
+class UserSnapshotCache:
+    """Потокобезопасный LRU-кэш снимков пользователей с ограниченным временем жизни."""
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id, snapshot):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries[user_id] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserSnapshotCache()
+
+
+def forget_user(user_id):
+    """
+    Сбрасывает снимок сразу и ещё раз после фиксации транзакции: параллельный
+    запрос мог успеть закэшировать строку до коммита.
+    """
+    user_cache.forget(user_id)
+    transaction.on_commit(lambda: user_cache.forget(user_id))
+
+
+def load_snapshot(user_id):
+    """Снимок пользователя и его профиля одним запросом (или None, если пользователя нет)."""
+    row = (
+        User.objects.filter(pk=user_id)
+        .values(*USER_FIELDS, 'userprofile__id', 'userprofile__role')
+        .first()
+    )
+    if row is None:
+        return None
+    profile_id = row.pop('userprofile__id')
+    role = row.pop('userprofile__role')
+    row['profile'] = (profile_id, user_id, role) if profile_id is not None else None
+    return row
+
+
+def _from_db(model, values):
+    # from_db ожидает значения в порядке полей модели; отсутствующие становятся отложенными
+    field_names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+def build_user(snapshot):
+    """
+    Настоящий экземпляр User из снимка: подходит для ForeignKey и фильтров ORM,
+    а профиль с ролью уже лежит в кэше связи, поэтому request.user.userprofile.role
+    не делает запросов. Неснятые поля (пароль, даты) загрузятся при обращении.
+    """
+    user = _from_db(User, snapshot)
+    profile = None
+    if snapshot['profile'] is not None:
+        profile = _from_db(UserProfile, dict(zip(PROFILE_FIELDS, snapshot['profile'])))
+        profile._state.fields_cache['user'] = user
+    # None в кэше обратной связи: hasattr(user, 'userprofile') вернёт False без запроса
+    user._state.fields_cache['userprofile'] = profile
+    return user
+
+
+def get_cached_user(user_id):
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        snapshot = load_snapshot(user_id)
+        if snapshot is None:
+            return None
+        user_cache.set(user_id, snapshot)
+    return build_user(snapshot)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса пользователя на каждый запрос.
+
+    Из проверенного токена берётся только user_id: роль и имена в долгоживущих
+    токенах могут устареть, поэтому они берутся из снимка в кэше процесса,
+    который сбрасывается сигналами User/UserProfile.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        # Отзыв проверяется по копии списка в памяти процесса, без запроса к БД
+        if is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_("Token is blacklisted"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Для проверки нужен хэш пароля — его в снимке нет
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,20 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+from .utils.accounts import check_credentials
+
+
+class EmailBackend(ModelBackend):
+    """
+    Вход по email (без учёта регистра) или username через check_credentials:
+    один запрос по индексу и один хэш пароля на попытку.
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        login = email or username or kwargs.get(User.USERNAME_FIELD)
+        if login is None or password is None:
+            return None
+        user = check_credentials(login, password)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,274 @@
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Сколько ждёт процесс, не получивший блокировку пересчёта, если старого значения нет
+SINGLE_FLIGHT_WAIT = 5.0
+SINGLE_FLIGHT_POLL = 0.05
+# Коэффициент вероятностного раннего истечения (XFetch): больше — раньше пересчёт
+EARLY_EXPIRY_BETA = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    delta REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires);
+"""
+
+
+class SQLiteCache(BaseCache):
+    """
+    Общий кэш для всех воркеров одного хоста: файл SQLite в режиме WAL.
+    Читатели не блокируют писателя, целые числа хранятся как INTEGER,
+    поэтому incr — один атомарный UPDATE.
+
+    Кроме стандартного API есть get_or_compute: пересчёт «одним полётом»
+    (ключ пересчитывает только один процесс, остальные отдают старое значение)
+    и вероятностное раннее истечение, чтобы популярные ключи не истекали у всех разом.
+
+    Параметры OPTIONS: MAX_ENTRIES (по умолчанию 10000), CULL_FREQUENCY (3),
+    BUSY_TIMEOUT (секунды ожидания блокировки записи, 5).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    # -------------------- Соединение --------------------
+
+    def _connection(self):
+        # Соединение своё у каждого потока и процесса: после fork старое не используется
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expiry(self, timeout):
+        # get_backend_timeout уже возвращает абсолютное время истечения (или None)
+        return self.get_backend_timeout(timeout)
+
+    def _cull(self, connection):
+        connection.execute('DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+        (count,) = connection.execute('SELECT COUNT(*) FROM cache_entries').fetchone()
+        if count > self._max_entries:
+            # Вытесняются ключи, истекающие раньше всех (бессрочные — в последнюю очередь)
+            connection.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency if self._cull_frequency else count,),
+            )
+
+    def _write(self, key, value, timeout, delta=0.0, mode='REPLACE'):
+        connection = self._connection()
+        expires = self._expiry(timeout)
+        if mode == 'ADD':
+            # Истёкшую запись add() вправе перезаписать
+            cursor = connection.execute(
+                'INSERT INTO cache_entries (key, value, expires, delta) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+                'delta = excluded.delta WHERE cache_entries.expires <= ?',
+                (key, self._encode(value), expires, delta, time.time()),
+            )
+        else:
+            cursor = connection.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires, delta) VALUES (?, ?, ?, ?)',
+                (key, self._encode(value), expires, delta),
+            )
+        if random.random() < 0.01:
+            self._cull(connection)
+        return cursor.rowcount > 0
+
+    def _read(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires, delta FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, delta = row
+        return self._decode(value), expires, delta
+
+    # -------------------- API кэша Django --------------------
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(key, value, timeout, mode='ADD')
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        entry = self._read(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            return default
+        return entry[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарное увеличение одним UPDATE ... RETURNING, без чтения в Python."""
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "UPDATE cache_entries SET value = value + ? "
+            "WHERE key = ? AND typeof(value) = 'integer' AND (expires IS NULL OR expires > ?) "
+            "RETURNING value",
+            (delta, key, time.time()),
+        ).fetchone()
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    def get_many(self, keys, version=None):
+        mapping = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not mapping:
+            return {}
+        placeholders = ', '.join('?' * len(mapping))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache_entries WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*mapping, time.time()),
+        ).fetchall()
+        return {mapping[key]: self._decode(value) for key, value in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        expires = self._expiry(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._encode(value), expires)
+            for key, value in data.items()
+        ]
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires, delta) VALUES (?, ?, ?, 0)', rows
+            )
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            placeholders = ', '.join('?' * len(keys))
+            self._connection().execute(f'DELETE FROM cache_entries WHERE key IN ({placeholders})', keys)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь поток: открывать файл на каждый запрос дороже, чем держать
+        pass
+
+    # -------------------- Пересчёт одним полётом --------------------
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT, version=None, beta=EARLY_EXPIRY_BETA):
+        """
+        Значение ключа; при отсутствии или (вероятностно) незадолго до истечения
+        вызывает compute(). Пересчитывает только процесс, взявший блокировку,
+        остальные получают прежнее значение или ждут нового.
+        """
+        full_key = self.make_and_validate_key(key, version=version)
+        entry = self._read(full_key)
+        now = time.time()
+        if entry is not None:
+            value, expires, delta = entry
+            # XFetch: чем дольше пересчёт (delta) и ближе истечение, тем вероятнее ранний пересчёт
+            if expires is None or now - delta * beta * math.log(1.0 - random.random()) < expires:
+                return value
+            stale = value if expires > now else None
+        else:
+            stale = None
+
+        lock_key = self.make_and_validate_key(f'{key}:lock', version=version)
+        # Метка владельца: pid не различает потоки одного процесса
+        token = f'{os.getpid()}:{uuid.uuid4().hex}'
+        deadline = now + SINGLE_FLIGHT_WAIT
+        while not (owned := self._write(lock_key, token, SINGLE_FLIGHT_WAIT, mode='ADD')):
+            if stale is not None:
+                return stale
+            if time.time() >= deadline:
+                # Владелец не успел — считаем сами, но его блокировку не трогаем
+                break
+            time.sleep(SINGLE_FLIGHT_POLL)
+            entry = self._read(full_key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                return entry[0]
+
+        try:
+            started = time.time()
+            value = compute()
+            self._write(full_key, value, timeout, delta=time.time() - started)
+            return value
+        finally:
+            if owned:
+                # Блокировка могла истечь и достаться другому процессу — удаляется только своя
+                self._connection().execute(
+                    'DELETE FROM cache_entries WHERE key = ? AND value = ?', (lock_key, self._encode(token))
+                )
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None):
+    """
+    Кэширует результат compute() под ключом. С SQLiteCache — с защитой от
+    одновременного пересчёта, с другими бэкендами — простым get/set.
+    """
+    cache = cache or default_cache
+    if hasattr(cache, 'get_or_compute'):
+        return cache.get_or_compute(key, compute, timeout)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,16 @@
+from rest_framework import filters
+
+from .utils.search import rank_catalog
+
+
+class RankedSearchFilter(filters.SearchFilter):
+    """
+    Поиск по каталогу через поисковые документы (индекс + ранжирование по релевантности)
+    вместо OR-цепочки icontains стандартного SearchFilter. Параметр запроса тот же — `search`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return rank_catalog(queryset, query)
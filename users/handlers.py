@@ -37,7 +37,11 @@ def custom_exception_handler(exc, context):
         if hasattr(exc, 'get_full_details'):
             error_data['data'] = exc.get_full_details()
             
-        return JsonResponse(error_data, status=response.status_code)
+        json_response = JsonResponse(error_data, status=response.status_code)
+        # Throttled: клиент должен знать, когда повторить запрос
+        if 'Retry-After' in response:
+            json_response['Retry-After'] = response['Retry-After']
+        return json_response
     
     # Обрабатываем непредвиденные исключения
     logger.error("Необработанное исключение: %s", str(exc), exc_info=True)
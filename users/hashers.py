@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 с числом итераций из настроек (подбирается `manage.py calibrate_hasher`).
+    Алгоритм тот же, pbkdf2_sha256, поэтому старые хэши проверяются как раньше,
+    а при расхождении числа итераций пароль пересохраняется при следующем входе.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
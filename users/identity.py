@@ -0,0 +1,197 @@
+import logging
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Model
+from django.db.models.signals import post_save, post_delete
+from django.http import Http404
+
+logger = logging.getLogger(__name__)
+
+# Карта объектов текущего запроса. ContextVar, а не threading.local: под ASGI
+# синхронные представления выполняются в другом потоке, но с копией контекста.
+_current_map = ContextVar('identity_map', default=None)
+
+
+class IdentityMap:
+    """
+    Объекты, загруженные за время запроса, по первичному ключу и уникальным полям.
+    Повторная выборка того же объекта возвращает уже загруженный экземпляр.
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _lookup_key(model, lookup):
+        """
+        Ключ для поиска по одному уникальному полю ('pk', 'id', 'user', 'user_id'...),
+        или None, если поиск не однозначен и кэшировать его нельзя.
+        """
+        if len(lookup) != 1:
+            return None
+        (name, value), = lookup.items()
+        opts = model._meta
+        if name == 'pk':
+            field = opts.pk
+        else:
+            try:
+                field = opts.get_field(name[:-3] if name.endswith('_id') else name)
+            except FieldDoesNotExist:
+                return None
+            if not (field.primary_key or field.unique) or not field.concrete:
+                return None
+        if isinstance(value, Model):
+            value = value.pk
+        try:
+            value = (field.target_field if field.is_relation else field).to_python(value)
+        except ValidationError:
+            return None
+        return (opts.label_lower, field.attname, value)
+
+    def _keys_for(self, instance):
+        opts = instance._meta
+        deferred = instance.get_deferred_fields()
+        return [
+            (opts.label_lower, field.attname, getattr(instance, field.attname))
+            for field in opts.concrete_fields
+            if (field.primary_key or field.unique) and field.attname not in deferred
+        ]
+
+    def add(self, instance):
+        # Частично загруженные объекты не кэшируются: остальные поля пришлось бы дочитывать
+        if instance.pk is None or instance.get_deferred_fields():
+            return instance
+        _watch(type(instance))
+        for key in self._keys_for(instance):
+            self._objects[key] = instance
+        return instance
+
+    def discard(self, instance):
+        for key, cached in list(self._objects.items()):
+            if cached is instance or (type(cached) is type(instance) and cached.pk == instance.pk):
+                del self._objects[key]
+
+    def get(self, model, **lookup):
+        key = self._lookup_key(model, lookup)
+        if key is not None and key in self._objects:
+            self.hits += 1
+            return self._objects[key]
+        self.misses += 1
+        instance = model._default_manager.get(**lookup)
+        if key is not None:
+            self.add(instance)
+            self._link(model, lookup, instance)
+        return instance
+
+    @staticmethod
+    def _link(model, lookup, instance):
+        # fetch(UserProfile, user=request.user): связываем оба объекта, чтобы
+        # profile.user и request.user.userprofile не делали отдельных запросов
+        (name, value), = lookup.items()
+        if not isinstance(value, Model) or name == 'pk':
+            return
+        field = model._meta.get_field(name)
+        if field.is_relation:
+            instance._state.fields_cache[field.cache_name] = value
+            if field.one_to_one:
+                value._state.fields_cache[field.remote_field.cache_name] = instance
+
+
+def current_map():
+    return _current_map.get()
+
+
+def fetch(model, **lookup):
+    """
+    Model.objects.get(**lookup) через карту объектов запроса (вне запроса — обычный get).
+    """
+    identity_map = _current_map.get()
+    if identity_map is not None:
+        return identity_map.get(model, **lookup)
+    instance = model._default_manager.get(**lookup)
+    # Вне запроса карты нет, но связь двух объектов всё равно экономит запрос
+    if IdentityMap._lookup_key(model, lookup) is not None:
+        IdentityMap._link(model, lookup, instance)
+    return instance
+
+
+def fetch_or_404(model, **lookup):
+    """Аналог get_object_or_404 через карту объектов запроса."""
+    try:
+        return fetch(model, **lookup)
+    except model.DoesNotExist:
+        raise Http404(f"{model._meta.object_name} не найден")
+
+
+def evict_changed_instance(sender, instance, **kwargs):
+    # Другой экземпляр той же строки сохранён или удалён — кэшированная копия устарела
+    identity_map = _current_map.get()
+    if identity_map is not None:
+        identity_map.discard(instance)
+        if kwargs.get('signal') is post_save:
+            identity_map.add(instance)
+
+
+_watched = set()
+
+
+def _watch(model):
+    """
+    Подписывает сброс копий на сохранение и удаление модели — только тех
+    моделей, что побывали в карте, а не на каждую запись в проекте.
+    """
+    if model in _watched:
+        return
+    uid = f'identity_map:{model._meta.label_lower}'
+    post_save.connect(evict_changed_instance, sender=model, dispatch_uid=uid)
+    post_delete.connect(evict_changed_instance, sender=model, dispatch_uid=uid)
+    _watched.add(model)
+
+
+class IdentityMapMiddleware:
+    """
+    Создаёт карту объектов на время запроса и сбрасывает её после ответа.
+    Число избежанных запросов пишется в заголовок X-Identity-Map-Hits и в лог.
+    Работает и под WSGI, и под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        identity_map = IdentityMap()
+        token = _current_map.set(identity_map)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_map.reset(token)
+        return self._report(request, response, identity_map)
+
+    async def __acall__(self, request):
+        identity_map = IdentityMap()
+        token = _current_map.set(identity_map)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_map.reset(token)
+        return self._report(request, response, identity_map)
+
+    @staticmethod
+    def _report(request, response, identity_map):
+        if identity_map.hits:
+            response['X-Identity-Map-Hits'] = str(identity_map.hits)
+            logger.debug(
+                "%s %s: избежано запросов %s (загружено %s)",
+                request.method, request.path, identity_map.hits, identity_map.misses,
+            )
+        return response
@@ -0,0 +1,263 @@
+"""
+Фоновые задачи на таблице Job.
+
+Задачи объявляются декоратором @job, периодические — @periodic с cron-выражением
+(минута, час, день месяца, месяц, день недели). Объявления живут в модулях
+<app>/tasks.py и подгружаются воркером (manage.py runworker).
+"""
+import logging
+import math
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.apps import apps
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+
+from users.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Сколько задача может висеть в RUNNING без продления, прежде чем её вернут в очередь
+LEASE_TIMEOUT = timedelta(minutes=5)
+# Как часто воркер продлевает locked_at выполняемых задач
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+RETRY_BASE_SECONDS = 30
+
+REGISTRY = {}
+SCHEDULES = []
+
+
+# -------------------- Объявление задач --------------------
+
+def job(name=None, max_attempts=3, priority=0):
+    """Регистрирует функцию как фоновую задачу."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        func.job_name = task_name
+        func.job_options = {'max_attempts': max_attempts, 'priority': priority}
+        REGISTRY[task_name] = func
+        return func
+    return decorator
+
+
+def periodic(cron, **options):
+    """Регистрирует задачу и запускает её по расписанию cron."""
+    def decorator(func):
+        func = job(**options)(func)
+        SCHEDULES.append((CronSchedule(cron), func.job_name))
+        return func
+    return decorator
+
+
+def enqueue(name, *args, run_at=None, priority=None, max_attempts=None, dedupe_key=None, **kwargs):
+    """Ставит задачу в очередь. Внутри транзакции запроса — вместе с ней."""
+    if callable(name):
+        name = name.job_name
+    options = REGISTRY[name].job_options if name in REGISTRY else {}
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        priority=options.get('priority', 0) if priority is None else priority,
+        max_attempts=options.get('max_attempts', 3) if max_attempts is None else max_attempts,
+        dedupe_key=dedupe_key,
+    )
+
+
+def autodiscover():
+    """Импортирует tasks.py всех приложений, чтобы заполнить реестр."""
+    for app_config in apps.get_app_configs():
+        try:
+            import_module(f'{app_config.name}.tasks')
+        except ModuleNotFoundError as e:
+            if e.name != f'{app_config.name}.tasks':
+                raise
+
+
+# -------------------- Cron --------------------
+
+class CronSchedule:
+    """Пятипольное cron-выражение: *, */n, a-b, a-b/n и списки через запятую."""
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Ожидается 5 полей cron: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            part, _, step = part.partition('/')
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-'))
+            else:
+                start = end = int(part)
+            values.update(range(start, end + 1, int(step or 1)))
+        if not values or min(values) < low or max(values) > high:
+            raise ValueError(f"Поле cron вне диапазона {low}-{high}: {field!r}")
+        return values
+
+    def matches(self, moment):
+        # Воскресенье — 0, как в cron
+        weekday = (moment.weekday() + 1) % 7
+        day_ok = moment.day in self.days
+        weekday_ok = weekday in self.weekdays
+        if self.any_day or self.any_weekday:
+            calendar_ok = day_ok and weekday_ok
+        else:
+            calendar_ok = day_ok or weekday_ok
+        return (
+            moment.minute in self.minutes and moment.hour in self.hours
+            and moment.month in self.months and calendar_ok
+        )
+
+
+def enqueue_due(since, until):
+    """
+    Ставит в очередь периодические задачи, слоты которых попали в (since, until].
+    dedupe_key имя:слот не даёт нескольким воркерам поставить один запуск дважды.
+    """
+    slot = since.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    due = []
+    while slot <= until:
+        local = timezone.localtime(slot)
+        for schedule, name in SCHEDULES:
+            if schedule.matches(local):
+                options = REGISTRY[name].job_options
+                due.append(Job(
+                    name=name, run_at=slot, dedupe_key=f"{name}:{slot:%Y%m%d%H%M}",
+                    priority=options['priority'], max_attempts=options['max_attempts'],
+                ))
+        slot += timedelta(minutes=1)
+    if due:
+        Job.objects.bulk_create(due, ignore_conflicts=True)
+    return len(due)
+
+
+# -------------------- Выполнение --------------------
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def supports_concurrent_workers():
+    return connection.features.has_select_for_update_skip_locked
+
+
+def claim(limit, worker=None):
+    """
+    Забирает до `limit` готовых задач и помечает их RUNNING.
+    SKIP LOCKED позволяет параллельным воркерам не ждать друг друга;
+    в SQLite запись в БД и так сериализована, поэтому воркер один.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'id')
+        if supports_concurrent_workers():
+            queryset = queryset.select_for_update(skip_locked=True)
+        jobs = list(queryset[:limit])
+        if jobs:
+            Job.objects.filter(pk__in=[item.pk for item in jobs]).update(
+                status=Job.RUNNING, locked_by=worker or worker_id(), locked_at=now
+            )
+    return jobs
+
+
+def execute(job_row):
+    """Выполняет задачу и записывает результат, время и ошибку в её строку."""
+    started = timezone.now()
+    clock = time.perf_counter()
+    fields = {'started_at': started, 'attempts': job_row.attempts + 1}
+    try:
+        func = REGISTRY.get(job_row.name)
+        if func is None:
+            raise LookupError(f"Задача {job_row.name!r} не зарегистрирована")
+        func(*job_row.args, **job_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.error("Задача %s #%s упала:\n%s", job_row.name, job_row.pk, error)
+        fields['last_error'] = error[-4000:]
+        if fields['attempts'] < job_row.max_attempts:
+            fields['status'] = Job.QUEUED
+            fields['run_at'] = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** job_row.attempts)
+        else:
+            fields['status'] = Job.FAILED
+    else:
+        fields['status'] = Job.DONE
+        fields['last_error'] = None
+    finally:
+        fields['finished_at'] = timezone.now()
+        fields['duration_ms'] = int((time.perf_counter() - clock) * 1000)
+        fields['locked_by'] = None
+        Job.objects.filter(pk=job_row.pk).update(**fields)
+        # Пул потоков живёт долго: не держим соединения с БД между задачами
+        close_old_connections()
+    return fields['status']
+
+
+def heartbeat(worker):
+    """Продлевает аренду задач, которые воркер ещё выполняет."""
+    return Job.objects.filter(status=Job.RUNNING, locked_by=worker).update(locked_at=timezone.now())
+
+
+def release_stale(timeout=LEASE_TIMEOUT):
+    """
+    Возвращает в очередь задачи, чей воркер пропал, не завершив их (аренду
+    давно не продлевали). Такой запуск засчитывается как попытка: задача,
+    которая роняет воркер, после max_attempts переходит в FAILED.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timeout)
+    failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status=Job.FAILED, attempts=F('attempts') + 1, locked_by=None, finished_at=now,
+        last_error='Воркер не завершил задачу и перестал продлевать аренду',
+    )
+    requeued = stale.update(
+        status=Job.QUEUED, attempts=F('attempts') + 1, locked_by=None,
+        run_at=now + timedelta(seconds=RETRY_BASE_SECONDS),
+    )
+    return failed + requeued
+
+
+def job_metrics(since=None):
+    """
+    Метрики по именам задач: число запусков, ошибок, среднее/максимальное время и p95.
+    """
+    queryset = Job.objects.filter(finished_at__isnull=False)
+    if since is not None:
+        queryset = queryset.filter(finished_at__gte=since)
+    rows = (
+        queryset.values('name')
+        .annotate(
+            runs=Count('id'),
+            # Строка хранит исход последней попытки: ошибка есть — попытка упала
+            failed=Count('id', filter=Q(last_error__isnull=False)),
+            avg_ms=Avg('duration_ms'),
+            max_ms=Max('duration_ms'),
+        )
+        .order_by('name')
+    )
+    metrics = {}
+    for row in rows:
+        durations = queryset.filter(name=row['name']).order_by('duration_ms').values_list('duration_ms', flat=True)
+        p95_index = max(math.ceil(row['runs'] * 0.95) - 1, 0)
+        row['p95_ms'] = durations[p95_index] if row['runs'] else None
+        metrics[row.pop('name')] = row
+    return metrics
@@ -0,0 +1,109 @@
+import csv
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.models import Hall, Club
+from users.utils.geo import encode_geohash
+from users.utils.http_cache import bump_version
+
+MODELS = {'hall': Hall, 'club': Club}
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_address(address):
+    """Адрес в сравнимом виде: слова в нижнем регистре без пунктуации."""
+    return ' '.join(_WORD_RE.findall((address or '').lower().replace('ё', 'е')))
+
+
+def load_gazetteer(path, delimiter=','):
+    """
+    Читает справочник адресов: CSV с колонками address, latitude, longitude
+    (допускаются lat и lng/lon). Возвращает {нормализованный адрес: (широта, долгота)}.
+    """
+    gazetteer = {}
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=delimiter)
+        for line, row in enumerate(reader, start=2):
+            row = {(key or '').strip().lower(): value for key, value in row.items()}
+            try:
+                latitude = float(row.get('latitude') or row.get('lat'))
+                longitude = float(row.get('longitude') or row.get('lng') or row.get('lon'))
+            except (TypeError, ValueError):
+                raise CommandError(f"{path}:{line}: нет корректных координат")
+            key = normalize_address(row.get('address'))
+            if key:
+                gazetteer[key] = (latitude, longitude)
+    return gazetteer
+
+
+def match_address(gazetteer, address):
+    """
+    Координаты адреса: точное совпадение, иначе самая длинная последовательность слов
+    адреса, найденная в справочнике (например, улица без номера дома).
+    """
+    words = normalize_address(address).split()
+    for size in range(len(words), 0, -1):
+        for start in range(len(words) - size + 1):
+            point = gazetteer.get(' '.join(words[start:start + size]))
+            if point:
+                return point
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Заполнение координат залов и клубов по локальному справочнику адресов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('gazetteer', help='CSV-файл с колонками address, latitude, longitude')
+        parser.add_argument(
+            '--model', choices=['hall', 'club', 'all'], default='all',
+            help='Какие объекты заполнять'
+        )
+        parser.add_argument('--delimiter', default=',', help='Разделитель колонок CSV')
+        parser.add_argument(
+            '--overwrite', action='store_true',
+            help='Перезаписывать уже заполненные координаты'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько адресов найдено, ничего не записывая'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            gazetteer = load_gazetteer(options['gazetteer'], options['delimiter'])
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать справочник: {e}")
+        self.stdout.write(f"В справочнике {len(gazetteer)} адресов")
+
+        names = MODELS if options['model'] == 'all' else [options['model']]
+        for name in names:
+            model = MODELS[name]
+            queryset = model.objects.only('id', 'address', 'latitude', 'longitude', 'geohash')
+            if not options['overwrite']:
+                queryset = queryset.filter(latitude__isnull=True)
+
+            matched, missing = [], 0
+            for obj in queryset.iterator(chunk_size=500):
+                point = match_address(gazetteer, obj.address)
+                if point is None:
+                    missing += 1
+                    continue
+                obj.latitude, obj.longitude = point
+                # bulk_update не вызывает save(), поэтому geohash считается здесь
+                obj.geohash = encode_geohash(*point)
+                matched.append(obj)
+
+            if not options['dry_run']:
+                with transaction.atomic():
+                    model.objects.bulk_update(matched, ['latitude', 'longitude', 'geohash'], batch_size=500)
+                    bump_version(model)
+            self.stdout.write(f"{name}: найдено {len(matched)}, не найдено {missing}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Режим dry-run: изменения не сохранены"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Координаты заполнены"))
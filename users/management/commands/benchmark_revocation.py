@@ -0,0 +1,59 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.utils.revocation import RevocationSet, jti_hash
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочная проверка списка отозванных JWT в памяти (без БД)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=3_000_000, help='Сколько jti отозвать')
+        parser.add_argument('--lookups', type=int, default=200_000, help='Сколько проверок каждого вида')
+        parser.add_argument('--increments', type=int, default=20_000, help='Сколько jti добавить после загрузки')
+
+    def handle(self, *args, **options):
+        count, lookups = options['count'], options['lookups']
+        if count < 1 or lookups < 1:
+            raise CommandError('--count и --lookups должны быть положительными')
+
+        # jti в simplejwt — uuid4().hex
+        self.stdout.write(f"Генерация {count} jti...")
+        jtis = [uuid.uuid4().hex for _ in range(count)]
+
+        revoked = RevocationSet()
+        started = time.perf_counter()
+        revoked.load(jti_hash(jti) for jti in jtis)
+        self.stdout.write(
+            f"Загрузка: {time.perf_counter() - started:.2f} с, "
+            f"{revoked.nbytes / 1024 / 1024:.1f} МБ ({revoked.nbytes / count:.0f} байт на jti)"
+        )
+
+        # Дозагрузка по одному, как при обновлении по high-water mark
+        extra = [uuid.uuid4().hex for _ in range(options['increments'])]
+        started = time.perf_counter()
+        for jti in extra:
+            revoked.add(jti)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Добавление {len(extra)} jti: {elapsed / max(len(extra), 1) * 1e6:.1f} мкс на jti")
+
+        present = random.sample(jtis, min(lookups, count)) + extra[:lookups]
+        absent = [uuid.uuid4().hex for _ in range(lookups)]
+
+        started = time.perf_counter()
+        missed = sum(1 for jti in present if jti not in revoked)
+        hit_time = (time.perf_counter() - started) / len(present)
+
+        started = time.perf_counter()
+        false_positives = sum(1 for jti in absent if jti in revoked)
+        miss_time = (time.perf_counter() - started) / len(absent)
+
+        self.stdout.write(f"Проверка отозванного: {hit_time * 1e6:.2f} мкс, пропущено {missed}")
+        self.stdout.write(f"Проверка действующего: {miss_time * 1e6:.2f} мкс, ложных срабатываний {false_positives}")
+
+        if missed:
+            raise CommandError(f'Не найдено {missed} отозванных jti')
+        self.stdout.write(self.style.SUCCESS('Все отозванные jti найдены'))
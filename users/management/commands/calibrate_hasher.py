@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from users.hashers import CalibratedPBKDF2PasswordHasher
+
+# Минимум OWASP для PBKDF2-HMAC-SHA256
+MIN_ITERATIONS = 600_000
+PROBE_ITERATIONS = 100_000
+
+
+class Command(BaseCommand):
+    help = 'Подбор PASSWORD_HASH_ITERATIONS под целевое время хэширования на этом сервере'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Желаемое время одного хэша, мс')
+        parser.add_argument(
+            '--min-iterations', type=int, default=MIN_ITERATIONS,
+            help='Нижняя граница итераций (по умолчанию минимум OWASP)'
+        )
+        parser.add_argument('--samples', type=int, default=5, help='Замеров на каждую точку')
+
+    def measure(self, hasher, iterations, samples):
+        salt = hasher.salt()
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            hasher.encode('calibration-password', salt, iterations)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
+
+    def handle(self, *args, **options):
+        hasher = get_hasher()
+        if not isinstance(hasher, CalibratedPBKDF2PasswordHasher):
+            raise CommandError(
+                f"Основной хэшер {hasher.algorithm} не настраивается этой командой: "
+                f"первым в PASSWORD_HASHERS должен быть users.hashers.CalibratedPBKDF2PasswordHasher"
+            )
+        if options['target_ms'] <= 0 or options['samples'] < 1:
+            raise CommandError('--target-ms и --samples должны быть положительными')
+
+        current = hasher.iterations
+        self.stdout.write(
+            f"Сейчас: {current} итераций, {self.measure(hasher, current, options['samples']):.0f} мс на хэш"
+        )
+
+        per_iteration = self.measure(hasher, PROBE_ITERATIONS, options['samples']) / PROBE_ITERATIONS
+        iterations = round(options['target_ms'] / per_iteration / 10_000) * 10_000
+        if iterations < options['min_iterations']:
+            self.stdout.write(self.style.WARNING(
+                f"Для {options['target_ms']:.0f} мс хватило бы {iterations} итераций — "
+                f"это ниже минимума {options['min_iterations']}, берётся минимум"
+            ))
+            iterations = options['min_iterations']
+
+        latency = self.measure(hasher, iterations, options['samples'])
+        self.stdout.write(
+            f"Подобрано: {iterations} итераций, {latency:.0f} мс на хэш "
+            f"(~{1000 / latency:.1f} входов в секунду на ядро)"
+        )
+        if iterations != settings.PASSWORD_HASH_ITERATIONS:
+            self.stdout.write(
+                "Задайте в окружении и перезапустите сервер — пароли пересохранятся при входе:"
+            )
+        self.stdout.write(self.style.SUCCESS(f"PASSWORD_HASH_ITERATIONS={iterations}"))
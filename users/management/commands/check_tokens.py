@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.authentication import CachedJWTAuthentication
+from users.utils.tokens import LazyRefreshToken, issue_access_token
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Проверка уникальности JWT токенов и замер выдачи/проверки в секунду'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmark', action='store_true', help='Замерить выдачу и проверку токенов')
+        parser.add_argument('--iterations', type=int, default=2000, help='Итераций на каждый замер')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()[:3]  # Проверяем первых 3 пользователей
+
+        self.stdout.write("=" * 60)
+        self.stdout.write("ПРОВЕРКА УНИКАЛЬНОСТИ JWT ТОКЕНОВ")
+        self.stdout.write("=" * 60)
+
+        for i, user in enumerate(users):
+            refresh = RefreshToken.for_user(user)
+
+            self.stdout.write(
+                f"\nПользователь {i + 1}: {user.email}\n"
+                f"User ID: {user.id}\n"
+                f"Access Token: {refresh.access_token}\n"
+                f"Refresh Token: {refresh}\n"
+                f"Token payload user_id: {refresh.payload.get('user_id')}\n"
+                f"Token jti: {refresh.payload.get('jti')}\n"
+                f"{'-' * 40}"
+            )
+
+        # Проверяем, что токены действительно разные
+        if len(users) >= 2:
+            user1_refresh = RefreshToken.for_user(users[0])
+            user2_refresh = RefreshToken.for_user(users[1])
+
+            self.stdout.write(f"\nСРАВНЕНИЕ ТОКЕНОВ:")
+            self.stdout.write(f"Access tokens разные: {user1_refresh.access_token != user2_refresh.access_token}")
+            self.stdout.write(f"Refresh tokens разные: {user1_refresh != user2_refresh}")
+            self.stdout.write(f"JTI разные: {user1_refresh.payload.get('jti') != user2_refresh.payload.get('jti')}")
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write("ПРОВЕРКА ЗАВЕРШЕНА")
+        self.stdout.write("=" * 60)
+
+        if options['benchmark']:
+            self.benchmark(options['iterations'])
+
+    def measure(self, label, iterations, func):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {iterations / elapsed:,.0f} в секунду ({elapsed / iterations * 1e6:.0f} мкс)")
+
+    def benchmark(self, iterations):
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('Нужен хотя бы один пользователь')
+
+        self.stdout.write(f"\nЗАМЕР ({api_settings.ALGORITHM}, {iterations} итераций)")
+        before = OutstandingToken.objects.count()
+        # Строки OutstandingToken, созданные замером, откатываются
+        with transaction.atomic():
+            self.measure('Вход, только access', iterations, lambda: str(issue_access_token(user)))
+            self.stdout.write(f"  новых строк OutstandingToken: {OutstandingToken.objects.count() - before}")
+
+            def issue_pair():
+                refresh = LazyRefreshToken.for_user(user)
+                return str(refresh.access_token), str(refresh)
+
+            self.measure('Пара access + refresh', iterations, issue_pair)
+            self.measure('Пара через RefreshToken.for_user', iterations, lambda: str(RefreshToken.for_user(user).access_token))
+            self.stdout.write(f"  новых строк OutstandingToken: {OutstandingToken.objects.count() - before}")
+            transaction.set_rollback(True)
+
+        raw = str(issue_access_token(user)).encode()
+        authenticator = CachedJWTAuthentication()
+        self.measure('Проверка access (подпись + отзыв)', iterations, lambda: authenticator.get_validated_token(raw))
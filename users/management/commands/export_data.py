@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.utils.exports import EXPORTS, RENDERERS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка клиентов или посещаемости в CSV/JSONL (память не зависит от числа строк)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=list(EXPORTS), help='Что выгрузить')
+        parser.add_argument('--format', choices=list(RENDERERS), default='csv', help='Формат файла')
+        parser.add_argument('--output', '-o', default='-', help='Файл (по умолчанию stdout)')
+        parser.add_argument('--club', type=int, help='ID клуба')
+        parser.add_argument('--trainer', type=int, help='ID тренера')
+        parser.add_argument('--date-from', type=date.fromisoformat, help='Начало периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Конец периода (ГГГГ-ММ-ДД)')
+
+    def handle(self, *args, **options):
+        filters = {key: options[key] for key in ('club', 'trainer', 'date_from', 'date_to')}
+        chunks = stream_export(options['export'], options['format'], **filters)
+
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        try:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as e:
+            raise CommandError(f"Не удалось записать {options['output']}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Выгрузка {options['export']} записана в {options['output']}"))
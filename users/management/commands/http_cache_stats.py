@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from users.utils.http_cache import cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Статистика кэша ответов публичного каталога (попадания, промахи, 304)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода'
+        )
+
+    def handle(self, *args, **options):
+        # Вьюсеты регистрируют свои пространства имён при импорте URLconf
+        get_resolver().url_patterns
+        stats = cache_stats(reset=options['reset'])
+        for namespace, row in stats.items():
+            self.stdout.write(
+                f"{namespace}: попаданий {row['hit']}, 304 {row['not_modified']}, "
+                f"промахов {row['miss']}, доля попаданий {row['hit_ratio']:.1%}"
+            )
+        if options['reset']:
+            self.stdout.write(self.style.WARNING("Счётчики обнулены"))
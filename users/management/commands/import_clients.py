@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from users.utils.imports import ClientImporter, detect_format, read_rows, setup_worker
+
+
+class RejectWriter:
+    """Файл отказов в формате входного: та же строка плюс номер и причина."""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.stream = None
+        self.writer = None
+
+    def __call__(self, number, row, reason):
+        if self.stream is None:
+            self.stream = open(self.path, 'w', newline='', encoding='utf-8')
+        if self.fmt == 'jsonl':
+            self.stream.write(json.dumps({'line': number, 'error': reason, 'row': row}, ensure_ascii=False) + '\n')
+            return
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.stream, ['line', 'error', *row], extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow({**row, 'line': number, 'error': reason})
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт клиентов из CSV или JSONL (bulk_create, хэширование паролей в пуле процессов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл с клиентами или «-» для stdin. Поля: email, password, first_name, last_name, '
+                 'phone_number, birth_date, gender, address, sport, trainer, has_paid, is_active'
+        )
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат (по умолчанию по расширению)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Строк в одной транзакции')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Процессов для хэширования паролей (1 — без пула)'
+        )
+        parser.add_argument('--rejects', help='Куда записать отклонённые строки (по умолчанию <path>.rejects)')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить строки, ничего не создавать')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(f"База {connection.vendor} не возвращает ключи из bulk_create")
+        if options['workers'] < 1 or (options['batch_size'] is not None and options['batch_size'] < 1):
+            raise CommandError('--workers и --batch-size должны быть положительными')
+
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path == '-' else detect_format(path))
+        rejects_path = options['rejects'] or ('rejects.' + fmt if path == '-' else f'{path}.rejects')
+        try:
+            # utf-8-sig: CSV из Excel начинается с BOM
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(f"Не удалось открыть {path}: {e}")
+
+        rejects = RejectWriter(rejects_path, fmt)
+        executor = None
+        if options['workers'] > 1 and not options['dry_run']:
+            executor = ProcessPoolExecutor(options['workers'], initializer=setup_worker)
+        try:
+            importer = ClientImporter(
+                batch_size=options['batch_size'],
+                executor=executor,
+                workers=options['workers'],
+                dry_run=options['dry_run'],
+                on_reject=rejects,
+                on_batch=self.progress,
+            )
+            stats = importer.run(read_rows(stream, fmt))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            rejects.close()
+            if stream is not sys.stdin:
+                stream.close()
+
+        verb = 'Прошли проверку' if options['dry_run'] else 'Импортировано'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {stats['imported']} из {stats['read']} за {stats['seconds']:.2f} с "
+            f"({self.rate(stats):.0f} строк/с; хэширование {stats['hash_seconds']:.2f} с, "
+            f"вставка {stats['insert_seconds']:.2f} с)"
+        ))
+        if stats['rejected']:
+            self.stdout.write(self.style.WARNING(f"Отклонено: {stats['rejected']}, см. {rejects_path}"))
+
+    def rate(self, stats):
+        return stats['imported'] / stats['seconds'] if stats['seconds'] else 0
+
+    def progress(self, stats):
+        self.stdout.write(
+            f"Прочитано {stats['read']}, импортировано {stats['imported']}, "
+            f"отклонено {stats['rejected']} ({self.rate(stats):.0f} строк/с)"
+        )
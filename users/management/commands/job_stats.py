@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from users.jobs import job_metrics
+from users.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Метрики фоновых задач: запуски, ошибки и время выполнения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Окно статистики в часах')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        queue = dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+        self.stdout.write(
+            f"Очередь: в ожидании {queue.get(Job.QUEUED, 0)}, выполняется {queue.get(Job.RUNNING, 0)}"
+        )
+        for name, row in job_metrics(since).items():
+            self.stdout.write(
+                f"{name}: запусков {row['runs']}, ошибок {row['failed']}, "
+                f"среднее {row['avg_ms'] or 0:.0f} мс, p95 {row['p95_ms']} мс, максимум {row['max_ms']} мс"
+            )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.utils.retention import POLICIES, get_policies, purge
+
+
+class Command(BaseCommand):
+    help = 'Удаление устаревших строк по политикам хранения (пачками по первичному ключу)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'policies', nargs='*',
+            help=f"Политики ({', '.join(policy.name for policy in POLICIES)}); по умолчанию все"
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не удалять')
+        parser.add_argument('--batch-size', type=int, default=None, help='Строк в одной пачке')
+        parser.add_argument('--pause', type=float, default=None, help='Пауза между пачками, секунд')
+        parser.add_argument('--list', action='store_true', help='Показать политики и выйти')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for policy in POLICIES:
+                self.stdout.write(f"{policy.name}: {policy.description}")
+            return
+
+        try:
+            policies = get_policies(options['policies'])
+        except KeyError as e:
+            raise CommandError(f"Неизвестные политики: {e.args[0]}")
+
+        total = 0
+        for policy in policies:
+            stats = purge(
+                policy,
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+                dry_run=options['dry_run'],
+            )
+            table = policy.model._meta.db_table
+            if options['dry_run']:
+                self.stdout.write(f"{policy.name} ({table}): будет удалено {stats['matched']}")
+                total += stats['matched']
+                continue
+            deleted = sum(stats['deleted'].values())
+            total += deleted
+            cascade = ', '.join(
+                f"{label} {count}" for label, count in sorted(stats['deleted'].items())
+                if label != policy.model._meta.label
+            )
+            self.stdout.write(
+                f"{policy.name} ({table}): удалено {stats['deleted'][policy.model._meta.label]}"
+                f" за {stats['batches']} пачек, {stats['seconds']:.2f} с"
+                + (f"; каскадом: {cascade}" if cascade else "")
+            )
+
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f"{verb} строк: {total}"))
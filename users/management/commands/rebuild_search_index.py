@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from users.utils.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестроение поисковых документов залов, клубов и тренеров'
+
+    def handle(self, *args, **options):
+        stats = rebuild_search_index()
+        for kind, count in stats.items():
+            self.stdout.write(f"{kind}: {count} документов")
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс перестроен"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from users.utils.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт хранимых рейтингов залов, клубов и тренеров по таблице отзывов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не записывая'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        stats = recompute_ratings(dry_run=dry_run)
+
+        for model_name, (checked, fixed) in stats.items():
+            self.stdout.write(f"{model_name}: проверено {checked}, расхождений {fixed}")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Режим dry-run: изменения не сохранены"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Рейтинги согласованы"))
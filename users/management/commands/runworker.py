@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users import jobs
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач: периодические расписания и очередь Job в пуле потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Размер пула потоков')
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='Пауза между опросами пустой очереди, секунд'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти'
+        )
+        parser.add_argument(
+            '--no-scheduler', action='store_true',
+            help='Не ставить периодические задачи (их ставит другой воркер)'
+        )
+
+    def handle(self, *args, **options):
+        jobs.autodiscover()
+        threads = max(options['threads'], 1)
+        if not jobs.supports_concurrent_workers() and threads > 1:
+            # SQLite не умеет SKIP LOCKED и сериализует запись — работаем в один поток
+            self.stdout.write(self.style.WARNING("БД без SKIP LOCKED: воркер работает в один поток"))
+            threads = 1
+
+        worker = jobs.worker_id()
+        self.stdout.write(
+            f"Воркер {worker}: потоков {threads}, задач {len(jobs.REGISTRY)}, расписаний {len(jobs.SCHEDULES)}"
+        )
+
+        last_tick = timezone.now()
+        last_heartbeat = last_tick
+        running = set()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                while True:
+                    if not options['no_scheduler']:
+                        now = timezone.now()
+                        jobs.enqueue_due(last_tick, now)
+                        last_tick = now
+                    if running and timezone.now() - last_heartbeat >= jobs.HEARTBEAT_INTERVAL:
+                        # Долгие задачи не должны считаться брошенными
+                        jobs.heartbeat(worker)
+                        last_heartbeat = timezone.now()
+                    jobs.release_stale()
+
+                    free = threads - len(running)
+                    claimed = jobs.claim(free, worker) if free else []
+                    for job_row in claimed:
+                        running.add(pool.submit(jobs.execute, job_row))
+
+                    if running:
+                        done, running = wait(running, timeout=options['interval'], return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write("Остановка: ждём завершения начатых задач")
+                while running:
+                    _, running = wait(running, timeout=jobs.HEARTBEAT_INTERVAL.total_seconds())
+                    jobs.heartbeat(worker)
+        self.stdout.write(self.style.SUCCESS("Воркер остановлен"))
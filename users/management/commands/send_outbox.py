@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.utils.mail import send_batch, requeue_dead
+
+
+class Command(BaseCommand):
+    help = 'Отправка писем из outbox пачками через одно SMTP-соединение'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь один раз и выйти (для cron)'
+        )
+        parser.add_argument('--batch-size', type=int, default=None, help='Писем в одной пачке')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между опросами пустой очереди, секунд'
+        )
+        parser.add_argument(
+            '--requeue-dead', action='store_true',
+            help='Вернуть недоставленные письма в очередь перед отправкой'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f"Возвращено в очередь: {requeue_dead()}")
+
+        totals = {'sent': 0, 'retried': 0, 'dead': 0}
+        try:
+            while True:
+                stats = send_batch(options['batch_size'])
+                for key, value in stats.items():
+                    totals[key] += value
+                if any(stats.values()):
+                    self.stdout.write(
+                        f"Отправлено {stats['sent']}, на повтор {stats['retried']}, недоставлено {stats['dead']}"
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Итого: отправлено {totals['sent']}, на повтор {totals['retried']}, недоставлено {totals['dead']}"
+        ))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:47
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Review = apps.get_model('users', 'Review')
+    for model_name, field in (('Hall', 'hall_id'), ('Club', 'club_id'), ('Trainer', 'trainer_id')):
+        model = apps.get_model('users', model_name)
+        rows = (
+            Review.objects.filter(**{f'{field}__isnull': False})
+            .values(field)
+            .annotate(total=Sum('rating'), count=Count('id'))
+            .order_by()
+        )
+        for row in rows:
+            model.objects.filter(pk=row[field]).update(
+                rating_sum=row['total'],
+                review_count=row['count'],
+                average_rating=row['total'] / row['count'],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_club_advantages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='club',
+            name='average_rating',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hall',
+            name='average_rating',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hall',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hall',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trainer',
+            name='average_rating',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='trainer',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trainer',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:48
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def drop_duplicate_attendance(apps, schema_editor):
+    # Перед добавлением уникальности оставляем самую свежую отметку за день
+    Attendance = apps.get_model('users', 'Attendance')
+    duplicates = (
+        Attendance.objects.values('joinclub_id', 'attendance_date')
+        .annotate(rows=Count('id'), keep_id=Max('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        Attendance.objects.filter(
+            joinclub_id=row['joinclub_id'],
+            attendance_date=row['attendance_date'],
+        ).exclude(pk=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together={('joinclub', 'attendance_date')},
+        ),
+    ]
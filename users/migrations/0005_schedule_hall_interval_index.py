@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_attendance_unique_per_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='classschedule',
+            index=models.Index(fields=['hall', 'day_of_week', 'start_time'], name='schedule_hall_day_start_idx'),
+        ),
+    ]
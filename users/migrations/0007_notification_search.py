@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS notification_message_fts_idx ON users_notification "
+    "USING gin (to_tsvector('russian'::regconfig, COALESCE(message, '')))",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS notification_message_fts_idx",
+]
+
+# Внешняя FTS5-таблица поверх users_notification, синхронизируется триггерами
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_notification_fts USING fts5("
+    "message, content='users_notification', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS users_notification_fts_ai AFTER INSERT ON users_notification BEGIN "
+    "INSERT INTO users_notification_fts(rowid, message) VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS users_notification_fts_ad AFTER DELETE ON users_notification BEGIN "
+    "INSERT INTO users_notification_fts(users_notification_fts, rowid, message) "
+    "VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS users_notification_fts_au AFTER UPDATE OF message ON users_notification BEGIN "
+    "INSERT INTO users_notification_fts(users_notification_fts, rowid, message) "
+    "VALUES ('delete', old.id, old.message); "
+    "INSERT INTO users_notification_fts(rowid, message) VALUES (new.id, new.message); END",
+    "INSERT INTO users_notification_fts(users_notification_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS users_notification_fts_ai",
+    "DROP TRIGGER IF EXISTS users_notification_fts_ad",
+    "DROP TRIGGER IF EXISTS users_notification_fts_au",
+    "DROP TABLE IF EXISTS users_notification_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgres, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:54
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS searchdocument_vector_idx ON users_searchdocument USING gin (vector)",
+    "CREATE INDEX IF NOT EXISTS searchdocument_title_trgm_idx ON users_searchdocument "
+    "USING gin (title gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS searchdocument_vector_idx",
+    "DROP INDEX IF EXISTS searchdocument_title_trgm_idx",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_searchdocument_fts USING fts5("
+    "title, keywords, body, content='users_searchdocument', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS users_searchdocument_fts_ai AFTER INSERT ON users_searchdocument BEGIN "
+    "INSERT INTO users_searchdocument_fts(rowid, title, keywords, body) "
+    "VALUES (new.id, new.title, new.keywords, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS users_searchdocument_fts_ad AFTER DELETE ON users_searchdocument BEGIN "
+    "INSERT INTO users_searchdocument_fts(users_searchdocument_fts, rowid, title, keywords, body) "
+    "VALUES ('delete', old.id, old.title, old.keywords, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS users_searchdocument_fts_au AFTER UPDATE ON users_searchdocument BEGIN "
+    "INSERT INTO users_searchdocument_fts(users_searchdocument_fts, rowid, title, keywords, body) "
+    "VALUES ('delete', old.id, old.title, old.keywords, old.body); "
+    "INSERT INTO users_searchdocument_fts(rowid, title, keywords, body) "
+    "VALUES (new.id, new.title, new.keywords, new.body); END",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS users_searchdocument_fts_ai",
+    "DROP TRIGGER IF EXISTS users_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS users_searchdocument_fts_au",
+    "DROP TABLE IF EXISTS users_searchdocument_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgres, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def build_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('users', 'SearchDocument')
+    Hall = apps.get_model('users', 'Hall')
+    Club = apps.get_model('users', 'Club')
+    Trainer = apps.get_model('users', 'Trainer')
+
+    documents = [
+        SearchDocument(
+            kind='hall', object_id=hall.pk, title=hall.title[:255],
+            keywords=_join(hall.sport, hall.type, hall.coating)[:255],
+            body=_join(hall.description, hall.address, hall.inventory),
+        )
+        for hall in Hall.objects.iterator()
+    ]
+    documents += [
+        SearchDocument(
+            kind='club', object_id=club.pk, title=club.title[:255],
+            keywords=_join(club.sport, club.coach)[:255],
+            body=_join(club.description, club.address, club.age_groups),
+        )
+        for club in Club.objects.iterator()
+    ]
+    documents += [
+        SearchDocument(
+            kind='trainer', object_id=trainer.pk,
+            title=_join(trainer.first_name, trainer.last_name)[:255],
+            keywords=(trainer.sport or '')[:255],
+        )
+        for trainer in Trainer.objects.iterator()
+    ]
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        SearchDocument.objects.update(vector=(
+            SearchVector('title', weight='A', config='russian')
+            + SearchVector('keywords', weight='B', config='russian')
+            + SearchVector('body', weight='C', config='russian')
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_inbox_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('hall', 'Зал'), ('club', 'Клуб'), ('trainer', 'Тренер')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('keywords', models.CharField(blank=True, default='', max_length=255)),
+                ('body', models.TextField(blank=True, default='')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        TrigramExtension(),
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+
+
+def deduplicate_emails(apps, schema_editor):
+    """
+    Адреса, совпадающие без учёта регистра, не дадут построить уникальный индекс.
+    Пользователи не удаляются: email остаётся у активного аккаунта с последним
+    входом, у остальных к адресу дописывается .duplicate-<id>.
+    """
+    User = apps.get_model('auth', 'User')
+    with_lower = User.objects.exclude(email='').annotate(email_lower=Lower('email'))
+    duplicates = (
+        with_lower.values('email_lower')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    for email in list(duplicates):
+        users = list(
+            with_lower.filter(email_lower=email)
+            .order_by('-is_active', F('last_login').desc(nulls_last=True), 'id')
+        )
+        for user in users[1:]:
+            suffix = f'.duplicate-{user.pk}'
+            user.email = user.email[:254 - len(suffix)] + suffix
+            user.save(update_fields=['email'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_revoked_tokens'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_emails, migrations.RunPython.noop),
+        # Поиск: выражение совпадает с Lower('email') в users.utils.accounts
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_email_lower_idx ON auth_user (LOWER(email));',
+            'DROP INDEX auth_user_email_lower_idx;',
+        ),
+        # Уникальность без учёта регистра; пустой email (createsuperuser) не ограничивается
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_lower_uniq ON auth_user (LOWER(email)) WHERE email <> '';",
+            'DROP INDEX auth_user_email_lower_uniq;',
+        ),
+    ]
@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import SearchVectorField
+
+from .utils.geo import encode_geohash
 
 # Роли пользователей
 class UserRole:
@@ -16,6 +19,58 @@ class UserRole:
         (USER, 'Пользователь'),
     ]
 
+# --- Агрегаты рейтинга ---
+class RatingAggregate(models.Model):
+    """
+    Хранимые сумма, количество и среднее оценок отзывов.
+    Обновляются сигналами Review (см. users/signals.py), пересчитываются
+    командой recompute_ratings.
+    """
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(null=True, blank=True, editable=False)
+
+    AGGREGATE_FIELDS = ('rating_sum', 'review_count', 'average_rating')
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # Агрегаты меняются только UPDATE из сигналов: полное сохранение объекта,
+        # загруженного раньше, не должно затирать их устаревшими значениями
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+# --- Координаты ---
+class GeoLocated(models.Model):
+    """
+    Широта/долгота и geohash для поиска «рядом со мной» без PostGIS.
+    geohash пересчитывается при сохранении; индекс по нему служит
+    для префиксного отбора кандидатов (см. users/utils/geo.py).
+    """
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.geohash = (
+            encode_geohash(self.latitude, self.longitude)
+            if self.latitude is not None and self.longitude is not None else None
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
 # --- Пользовательский профиль ---
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='userprofile')
@@ -79,9 +134,28 @@ class ClassSchedule(models.Model):
     club = models.ForeignKey('Club', on_delete=models.CASCADE, null=True, blank=True)
     hall = models.ForeignKey('Hall', on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Интервальный поиск занятий зала за день: конфликты и свободные окна
+            models.Index(fields=['hall', 'day_of_week', 'start_time'], name='schedule_hall_day_start_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.day_of_week}, {self.start_time}-{self.end_time})"
 
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .utils.schedule import find_conflicts
+
+        if self.start_time and self.end_time and self.start_time >= self.end_time:
+            raise ValidationError({'end_time': 'Время окончания должно быть позже времени начала'})
+        if self.hall_id and self.start_time and self.end_time:
+            conflict = find_conflicts(
+                self.hall_id, self.day_of_week, self.start_time, self.end_time, exclude_pk=self.pk
+            ).first()
+            if conflict:
+                raise ValidationError(f'Зал уже занят в это время: {conflict}')
+
 
 # --- Объявления (Ad) ---
 class Ad(models.Model):
@@ -106,7 +180,7 @@ class Ad(models.Model):
         return self.title
 
 
-class Hall(models.Model):
+class Hall(RatingAggregate, GeoLocated):
     title = models.CharField(max_length=100)
     sport = models.CharField(max_length=50)
     description = models.TextField(blank=True, null=True)
@@ -125,7 +199,7 @@ class Hall(models.Model):
 
 
 # --- Клубы (Club) ---
-class Club(models.Model):
+class Club(RatingAggregate, GeoLocated):
     title = models.CharField(max_length=100)
     sport = models.CharField(max_length=50)
     hall = models.ForeignKey(Hall, on_delete=models.SET_NULL, null=True, blank=True)
@@ -164,21 +238,14 @@ class Joinclub(models.Model):
     def __str__(self):
         return f"{self.user} - {self.schedule.title} ({self.age_group})"
 
-    # Correct placement of the attendance summary method
+    # Сводка за последние 30 дней; для набора записей используйте summarize_attendance
     @property
     def get_attendance_summary(self):
-        one_month_ago = timezone.now() - timedelta(days=30)
-        attendances = Attendance.objects.filter(joinclub=self, attendance_date__gte=one_month_ago)
-        present_count = attendances.filter(is_present=True).count()
-        absent_count = attendances.filter(is_present=False).count()
-        return {
-            'present': present_count,
-            'absent': absent_count,
-            'total': present_count + absent_count
-        }
+        from .utils.attendance import summarize_attendance
+        return summarize_attendance([self.pk])[self.pk]
 
 # --- Тренеры (Trainer) ---
-class Trainer(models.Model):
+class Trainer(RatingAggregate):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
@@ -199,6 +266,8 @@ class Attendance(models.Model):
 
     class Meta:
         verbose_name_plural = "Attendances"
+        # Одна отметка на запись в день — повторная отправка перезаписывает её
+        unique_together = ('joinclub', 'attendance_date')
 
     def __str__(self):
         return f"{self.joinclub.user} - {self.joinclub.schedule.title} on {self.attendance_date}"
@@ -209,17 +278,65 @@ class Notification(models.Model):
     MESSAGE_TYPES = (
         ('review', 'Отзыв'), ('payment', 'Оплата'),
         ('registration', 'Регистрация'), ('login', 'Вход в аккаунт'),
+        ('announcement', 'Объявление'),
     )
 
+    # user = NULL — рассылка всем пользователям: хранится одной строкой,
+    # состояние прочтения у каждого пользователя — в NotificationReceipt
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     message = models.TextField()
     type = models.CharField(max_length=20, choices=MESSAGE_TYPES)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Ключ курсорной пагинации ленты пользователя
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"[{self.get_type_display()}] - {self.message}"
 
+    @property
+    def is_broadcast(self):
+        return self.user_id is None
+
+
+# --- Счётчик непрочитанных (InboxCounter) ---
+class InboxCounter(models.Model):
+    """
+    Счётчики ленты пользователя для бейджа непрочитанных.
+    unread_count — непрочитанные личные уведомления,
+    broadcasts_seen — рассылки, которые пользователь прочитал или скрыл.
+    Непрочитанных всего = unread_count + (всего рассылок - broadcasts_seen).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='inbox_counter')
+    unread_count = models.IntegerField(default=0)
+    broadcasts_seen = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} - {self.unread_count}"
+
+
+# --- Отметки пользователя по уведомлениям (NotificationReceipt) ---
+class NotificationReceipt(models.Model):
+    """
+    Прочтение/скрытие уведомления конкретным пользователем.
+    Создаётся только когда пользователь совершил действие, поэтому
+    рассылка не требует строки на каждого получателя.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_receipts')
+    read_at = models.DateTimeField(null=True, blank=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'notification')
+
+    def __str__(self):
+        return f"{self.user} - {self.notification_id}"
+
 class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     trainer = models.ForeignKey(Trainer, on_delete=models.CASCADE, null=True, blank=True)
@@ -234,6 +351,190 @@ class Review(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        indexes = [
+            # Ключи курсорной пагинации: общий список и отзывы зала/клуба
+            models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+            models.Index(fields=['hall', '-created_at', '-id'], name='review_hall_created_idx'),
+            models.Index(fields=['club', '-created_at', '-id'], name='review_club_created_idx'),
+        ]
 
     def __str__(self):
         return f"Отзыв от {self.user.username}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_rating_state()
+        return instance
+
+    def remember_rating_state(self):
+        """Запоминает оценку и цели отзыва, чтобы при изменении пересчитать только разницу."""
+        fields = ('rating', 'hall_id', 'club_id', 'trainer_id')
+        if all(name in self.__dict__ for name in fields):
+            self._rating_state = tuple(self.__dict__[name] for name in fields)
+        else:
+            # Поля отложены (.only/.defer) — прежнее состояние прочитаем из БД при сохранении
+            self._rating_state = None
+
+    def save(self, *args, **kwargs):
+        # Отзыв и агрегаты рейтинга сохраняются в одной транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+# --- Поисковый документ каталога (SearchDocument) ---
+class SearchDocument(models.Model):
+    """
+    Взвешенный поисковый документ зала, клуба или тренера.
+    Поддерживается сигналами моделей каталога (users/signals.py); индексы —
+    GIN по vector и триграммы по title в PostgreSQL, FTS5 в SQLite (см. миграцию).
+    """
+    HALL = 'hall'
+    CLUB = 'club'
+    TRAINER = 'trainer'
+    KINDS = (
+        (HALL, 'Зал'), (CLUB, 'Клуб'), (TRAINER, 'Тренер'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)        # вес A
+    keywords = models.CharField(max_length=255, blank=True, default='')  # вес B
+    body = models.TextField(blank=True, default='')  # вес C
+    vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+# --- Исходящие письма (outbox) ---
+class OutboxEmail(models.Model):
+    """
+    Письмо, записанное в транзакции запроса и отправляемое воркером send_outbox.
+    Неудачные попытки повторяются с экспоненциальной задержкой, после
+    MAX_ATTEMPTS письмо переводится в DEAD и больше не отправляется.
+    На время отправки письмо помечается SENDING (locked_by, locked_at).
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (DEAD, 'Не доставлено'),
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Выборка воркера: status = pending AND next_attempt_at <= now ORDER BY next_attempt_at
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to}: {self.subject} ({self.status})"
+
+
+# --- Фоновые задачи ---
+class Job(models.Model):
+    """
+    Задача фоновой очереди (см. users/jobs.py и команду runworker).
+    Воркеры забирают строки через SELECT ... FOR UPDATE SKIP LOCKED,
+    время выполнения сохраняется в самой строке для метрик.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Ключ периодической задачи (имя:слот) — один запуск на слот при любом числе воркеров
+    dedupe_key = models.CharField(max_length=150, unique=True, null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    duration_ms = models.PositiveIntegerField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at'], name='job_status_priority_run_idx'),
+            models.Index(fields=['name', 'finished_at'], name='job_name_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# --- Отозванные JWT ---
+class RevokedToken(models.Model):
+    """
+    Отозванный access- или refresh-токен. Таблица только дописывается:
+    процессы подгружают новые строки по id и revoked_at (users.utils.revocation).
+    """
+    ACCESS = 'access'
+    REFRESH = 'refresh'
+    TYPE_CHOICES = [
+        (ACCESS, 'Access'),
+        (REFRESH, 'Refresh'),
+    ]
+
+    jti = models.CharField(max_length=255, unique=True)
+    token_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='revoked_tokens')
+    # После истечения запись не нужна: просроченный токен отклоняется и так
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.token_type} {self.jti}"
+
+
+# --- Ограничение частоты запросов (users.throttling) ---
+class ThrottleBucket(models.Model):
+    """
+    Состояние ведра одного ключа (scope:хэш IP или email). Хранится
+    «теоретическое время прихода» следующего запроса (GCRA) в секундах Unix:
+    одна строка и один атомарный upsert на запрос, общие для всех воркеров.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    tat = models.FloatField()
+
+    def __str__(self):
+        return self.key
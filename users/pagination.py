@@ -0,0 +1,22 @@
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """
+    Постраничная навигация по умолчанию для всех списков API.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация для растущих таблиц (уведомления, отзывы).
+    Страница выбирается условием по created_at, а не OFFSET, поэтому
+    глубокие страницы стоят столько же, сколько первая.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
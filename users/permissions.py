@@ -1,6 +1,45 @@
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from .models import UserRole
+from .identity import fetch
+from .models import Trainer, UserProfile, UserRole
+
+
+def get_user_profile(user):
+    """
+    Профиль пользователя или None. CachedJWTAuthentication уже кладёт профиль
+    с ролью в request.user; иначе профиль загружается через карту объектов
+    запроса, и представление, которое потом возьмёт его через fetch(), получит
+    тот же экземпляр без второго запроса.
+    """
+    if not (user and user.is_authenticated):
+        return None
+    if UserProfile.user.field.remote_field.is_cached(user):
+        return user.userprofile
+    try:
+        return fetch(UserProfile, user=user)
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def has_role(user, *roles):
+    profile = get_user_profile(user)
+    return profile is not None and profile.role in roles
+
+
+def is_admin(user):
+    """Сотрудник Django (is_staff) или пользователь с ролью администратора."""
+    return bool(user and user.is_authenticated) and (user.is_staff or has_role(user, UserRole.ADMIN))
+
+
+def get_trainer(user):
+    """
+    Карточка Trainer пользователя с ролью тренера или None. Trainer не ссылается
+    на пользователя, поэтому связь — по email (он уникален у тренеров),
+    без учёта регистра, как и вход в систему.
+    """
+    if not has_role(user, UserRole.TRAINER) or not user.email:
+        return None
+    return Trainer.objects.filter(email__iexact=user.email).first()
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -23,12 +62,7 @@ class IsAdmin(permissions.BasePermission):
     Разрешение только для администраторов
     """
     def has_permission(self, request, view):
-        return bool(
-            request.user and 
-            request.user.is_authenticated and 
-            hasattr(request.user, 'userprofile') and 
-            request.user.userprofile.role == UserRole.ADMIN
-        )
+        return has_role(request.user, UserRole.ADMIN)
 
 
 class IsTrainer(permissions.BasePermission):
@@ -36,12 +70,7 @@ class IsTrainer(permissions.BasePermission):
     Разрешение только для тренеров
     """
     def has_permission(self, request, view):
-        return bool(
-            request.user and 
-            request.user.is_authenticated and 
-            hasattr(request.user, 'userprofile') and 
-            request.user.userprofile.role == UserRole.TRAINER
-        )
+        return has_role(request.user, UserRole.TRAINER)
 
 
 class IsUser(permissions.BasePermission):
@@ -49,12 +78,7 @@ class IsUser(permissions.BasePermission):
     Разрешение только для обычных пользователей
     """
     def has_permission(self, request, view):
-        return bool(
-            request.user and 
-            request.user.is_authenticated and 
-            hasattr(request.user, 'userprofile') and 
-            request.user.userprofile.role == UserRole.USER
-        )
+        return has_role(request.user, UserRole.USER)
 
 
 class IsAdminOrTrainer(permissions.BasePermission):
@@ -62,13 +86,7 @@ class IsAdminOrTrainer(permissions.BasePermission):
     Разрешение для администраторов и тренеров
     """
     def has_permission(self, request, view):
-        if not (request.user and request.user.is_authenticated):
-            return False
-            
-        if not hasattr(request.user, 'userprofile'):
-            return False
-            
-        return request.user.userprofile.role in [UserRole.ADMIN, UserRole.TRAINER]
+        return has_role(request.user, UserRole.ADMIN, UserRole.TRAINER)
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -79,9 +97,4 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
             
-        return bool(
-            request.user and 
-            request.user.is_authenticated and 
-            hasattr(request.user, 'userprofile') and 
-            request.user.userprofile.role == UserRole.ADMIN
-        )
+        return has_role(request.user, UserRole.ADMIN)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.contrib.auth import get_user_model
-from django.contrib.auth import authenticate
 from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
@@ -9,6 +9,11 @@ from .models import (
     Review, Notification, ClassSchedule, Joinclub, Attendance
 )
 from .utils import generate_and_send_code
+from .utils.attendance import mark_attendance
+from .utils.schedule import find_conflicts, DAY_START, DAY_END
+from .utils.tokens import LazyRefreshToken
+from .utils.accounts import normalize_email, get_user_by_email, email_taken, check_credentials
+from .exceptions import AuthenticationFailed, PermissionDenied
 
 User = get_user_model()
 
@@ -26,6 +31,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = LazyRefreshToken
+
     def validate(self, attrs):
         data = super().validate(attrs)
 
@@ -81,26 +88,32 @@ class RegisterSerializer(serializers.Serializer):
     def validate(self, data):
         if data['password'] != data['confirmPassword']:
             raise ValidationError({"confirmPassword": "Пароли не совпадают"})
-        if User.objects.filter(email=data['email']).exists():
+        if email_taken(data['email']):
             raise ValidationError({"email": "Пользователь с таким email уже существует"})
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
+        email = normalize_email(validated_data['email'])
         user = User.objects.create_user(
-            username=validated_data['email'],
-            email=validated_data['email'],
+            username=email,
+            email=email,
             password=validated_data['password'],
             first_name=validated_data['firstName'],
             last_name=validated_data['lastName'],
             is_active=False
         )
-        UserProfile.objects.create(
+        # Профиль уже создан сигналом post_save пользователя
+        UserProfile.objects.update_or_create(
             user=user,
-            phone_number=validated_data.get('phone_number'),
-            birth_date=validated_data.get('birth_date'),
-            gender=validated_data.get('gender', ''),
-            address=validated_data.get('address', '')
+            defaults={
+                'phone_number': validated_data.get('phone_number'),
+                'birth_date': validated_data.get('birth_date'),
+                'gender': validated_data.get('gender', ''),
+                'address': validated_data.get('address', ''),
+            }
         )
+        # Письмо с кодом ставится в outbox в этой же транзакции
         generate_and_send_code(user)
         return user
 
@@ -157,7 +170,7 @@ class VerifyCodeSerializer(serializers.Serializer):
 
     def validate(self, data):
         try:
-            user = User.objects.get(email=data['email'])
+            user = get_user_by_email(data['email'])
         except User.DoesNotExist:
             raise ValidationError({"email": "Пользователь не найден"})
 
@@ -193,18 +206,12 @@ class LoginSerializer(serializers.Serializer):
         if not email or not password:
             raise ValidationError("Необходимо ввести email и пароль.")
 
-        user = authenticate(request=self.context.get('request'), username=email, password=password)
-
-        if not user:
-            try:
-                user = User.objects.get(email=email)
-                if not user.check_password(password):
-                    raise ValidationError("Неверный пароль.")
-            except User.DoesNotExist:
-                raise ValidationError("Пользователь с таким email не найден.")
+        user = check_credentials(email, password)
+        if user is None:
+            raise AuthenticationFailed('Неверный email или пароль')
 
         if not user.is_active:
-            raise ValidationError("Аккаунт не активирован. Проверьте почту.")
+            raise PermissionDenied('Аккаунт не активирован. Пожалуйста, подтвердите email.')
 
         data['user'] = user
         return data
@@ -214,7 +221,7 @@ class ForgotPasswordSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
     def validate_email(self, value):
-        if not User.objects.filter(email=value).exists():
+        if not email_taken(value):
             raise ValidationError("Пользователь с таким email не найден.")
         return value
 
@@ -230,7 +237,7 @@ class ResetPasswordSerializer(serializers.Serializer):
             raise ValidationError({"confirm_new_password": "Пароли не совпадают"})
 
         try:
-            user = User.objects.get(email=data['email'])
+            user = get_user_by_email(data['email'])
         except User.DoesNotExist:
             raise ValidationError({"email": "Пользователь не найден"})
 
@@ -272,19 +279,66 @@ class HallSerializer(serializers.ModelSerializer):
     class Meta:
         model = Hall
         fields = '__all__'
+        read_only_fields = ['rating_sum', 'review_count', 'average_rating']
         ref_name = 'UserHall'  # добавлено уникальное имя
 
 
 class ClassScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClassSchedule
-        fields = ['id', 'title', 'day_of_week', 'start_time', 'end_time']
+        fields = ['id', 'title', 'day_of_week', 'start_time', 'end_time', 'hall', 'club']
+
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and start_time >= end_time:
+            raise ValidationError({"end_time": "Время окончания должно быть позже времени начала"})
+        return data
+
+    def _check_hall_is_free(self, data):
+        hall = data.get('hall', getattr(self.instance, 'hall', None))
+        if hall is None:
+            return
+        # Блокируем строку зала, чтобы параллельные записи в один зал проверялись по очереди
+        Hall.objects.select_for_update().filter(pk=hall.pk).first()
+        conflict = find_conflicts(
+            hall,
+            data.get('day_of_week', getattr(self.instance, 'day_of_week', None)),
+            data.get('start_time', getattr(self.instance, 'start_time', None)),
+            data.get('end_time', getattr(self.instance, 'end_time', None)),
+            exclude_pk=getattr(self.instance, 'pk', None),
+        ).first()
+        if conflict:
+            raise ValidationError({"hall": [f"Зал уже занят в это время: {conflict}"]})
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self._check_hall_is_free(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self._check_hall_is_free(validated_data)
+            return super().update(instance, validated_data)
+
+
+class FreeWindowsQuerySerializer(serializers.Serializer):
+    hall = serializers.PrimaryKeyRelatedField(queryset=Hall.objects.all())
+    day_of_week = serializers.ChoiceField(choices=ClassSchedule._meta.get_field('day_of_week').choices)
+    open_time = serializers.TimeField(required=False, default=DAY_START)
+    close_time = serializers.TimeField(required=False, default=DAY_END)
+
+    def validate(self, data):
+        if data['open_time'] >= data['close_time']:
+            raise ValidationError({"close_time": "Время закрытия должно быть позже времени открытия"})
+        return data
 
 
 class ClubSerializer(serializers.ModelSerializer):
     class Meta:
         model = Club
         fields = '__all__'
+        read_only_fields = ['rating_sum', 'review_count', 'average_rating']
         ref_name = 'UserClub'
 
 
@@ -298,6 +352,7 @@ class TrainerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Trainer
         fields = '__all__'
+        read_only_fields = ['rating_sum', 'review_count', 'average_rating']
 
 
 class TrainerNameSerializer(serializers.ModelSerializer):
@@ -323,6 +378,38 @@ class AttendanceSerializer(serializers.ModelSerializer):
         fields = ['id', 'joinclub', 'attendance_date', 'is_present', 'notes']
 
 
+class AttendanceEntrySerializer(serializers.Serializer):
+    joinclub = serializers.IntegerField(help_text="ID записи на занятие")
+    is_present = serializers.BooleanField(default=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class AttendanceRosterSerializer(serializers.Serializer):
+    schedule = serializers.PrimaryKeyRelatedField(queryset=ClassSchedule.objects.all())
+    date = serializers.DateField(help_text="Дата занятия в формате ГГГГ-ММ-ДД")
+    entries = AttendanceEntrySerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate(self, data):
+        ids = [entry['joinclub'] for entry in data['entries']]
+        if len(ids) != len(set(ids)):
+            raise ValidationError({"entries": "Запись указана несколько раз"})
+
+        enrolled = set(
+            Joinclub.objects.filter(schedule=data['schedule'], pk__in=ids).values_list('pk', flat=True)
+        )
+        unknown = sorted(set(ids) - enrolled)
+        if unknown:
+            raise ValidationError({"entries": f"Записи не относятся к этому занятию: {unknown}"})
+        return data
+
+    def save(self):
+        return mark_attendance(
+            self.validated_data['schedule'],
+            self.validated_data['date'],
+            self.validated_data['entries'],
+        )
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     user_info = serializers.SerializerMethodField()
     trainer_name = serializers.CharField(source='trainer.first_name', read_only=True)
@@ -342,10 +429,18 @@ class ReviewSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user_info', 'trainer_name', 'club_name', 'created_at']
         ref_name = 'UserReview'  # добавлено уникальное имя
+        # Что читают методы сериализатора (для OptimizedQuerysetMixin)
+        field_sources = {'user_info': ('user.username', 'user.email')}
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     user_info = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
+    is_broadcast = serializers.BooleanField(read_only=True)
+
+    def get_is_read(self, obj):
+        # Для рассылок прочтение хранится в NotificationReceipt (аннотация из inbox)
+        return obj.is_read or getattr(obj, 'read_by_user', False)
 
     def get_user_info(self, obj):
         if obj.user:
@@ -357,5 +452,26 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'user_info', 'message', 'type', 'is_read', 'created_at']
+        fields = ['id', 'user', 'user_info', 'message', 'type', 'is_read', 'is_broadcast', 'created_at']
         read_only_fields = ['id', 'user', 'user_info', 'message', 'type', 'created_at']
+        # Что читают методы и свойства (для OptimizedQuerysetMixin); read_by_user — аннотация inbox()
+        field_sources = {
+            'user_info': ('user.username', 'user.email'),
+            'is_read': ('is_read', 'read_by_user'),
+            'is_broadcast': ('user_id',),
+        }
+
+
+class MarkNotificationsReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=1000,
+        help_text="ID уведомлений. Если не указаны — все уведомления (или все до before)."
+    )
+    before = serializers.DateTimeField(
+        required=False, help_text="Отметить все уведомления, созданные не позже этого момента."
+    )
+
+
+class BroadcastNotificationSerializer(serializers.Serializer):
+    message = serializers.CharField()
+    type = serializers.ChoiceField(choices=Notification.MESSAGE_TYPES, default='announcement')
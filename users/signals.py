@@ -1,7 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Review, Notification, Hall, Club, Trainer, Ad
+from .utils.ratings import apply_review_change
+from .utils.notifications import shift_counter, reset_broadcast_total, forget_broadcast
+from .utils.search import index_object, unindex_object
+from .utils.http_cache import bump_version
+from .authentication import forget_user
+from .identity import fetch
+from .utils.revocation import record_revocation
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 
 @receiver(post_save, sender=User)
 def create_or_save_user_profile(sender, instance, created, **kwargs):
@@ -14,8 +22,136 @@ def create_or_save_user_profile(sender, instance, created, **kwargs):
     else:
         # Проверяем, существует ли профиль
         try:
-            user_profile = UserProfile.objects.get(user=instance)
+            # Через карту объектов: представление профиля уже загрузило его в этом запросе
+            user_profile = fetch(UserProfile, user=instance)
             user_profile.save()  # Сохраняем существующий профиль
         except UserProfile.DoesNotExist:
             # Если профиль не существует, создаём его
-            UserProfile.objects.create(user=instance)
\ No newline at end of file
+            UserProfile.objects.create(user=instance)
+
+@receiver(pre_save, sender=Review)
+@receiver(pre_delete, sender=Review)
+def load_review_rating_state(sender, instance, **kwargs):
+    """
+        Для отзывов с отложенными полями читает прежнюю оценку из БД перед сохранением или удалением.
+    """
+    if instance.pk and getattr(instance, '_rating_state', None) is None:
+        instance._rating_state = Review.objects.filter(pk=instance.pk).values_list(
+            'rating', 'hall_id', 'club_id', 'trainer_id'
+        ).first()
+
+
+@receiver(post_save, sender=Review)
+def update_ratings_on_review_save(sender, instance, created, **kwargs):
+    """
+        Обновляет агрегаты рейтинга зала, клуба и тренера при создании или изменении отзыва.
+    """
+    old_state = None if created else getattr(instance, '_rating_state', None)
+    new_state = (instance.rating, instance.hall_id, instance.club_id, instance.trainer_id)
+    if old_state != new_state:
+        apply_review_change(old_state, new_state)
+    instance.remember_rating_state()
+
+
+@receiver(post_delete, sender=Review)
+def update_ratings_on_review_delete(sender, instance, **kwargs):
+    """
+        Вычитает оценку удалённого отзыва из агрегатов.
+    """
+    apply_review_change(getattr(instance, '_rating_state', None), None)
+
+
+@receiver(post_save, sender=Notification)
+def update_inbox_on_notification_save(sender, instance, created, **kwargs):
+    """
+        Поддерживает счётчик непрочитанных: новая личная запись или новая рассылка.
+    """
+    if not created:
+        return
+    if instance.user_id is None:
+        reset_broadcast_total()
+    elif not instance.is_read:
+        shift_counter(instance.user_id, unread=1)
+
+
+@receiver(pre_delete, sender=Notification)
+def forget_broadcast_receipts(sender, instance, **kwargs):
+    """
+        Отметки удаляемой рассылки уходят каскадом — вычитаем их из счётчиков до удаления.
+    """
+    if instance.user_id is None:
+        forget_broadcast(instance)
+
+
+@receiver(post_delete, sender=Notification)
+def update_inbox_on_notification_delete(sender, instance, **kwargs):
+    """
+        Удалённое непрочитанное личное уведомление уменьшает счётчик, удалённая рассылка сбрасывает общее число.
+    """
+    if instance.user_id is None:
+        reset_broadcast_total()
+    elif not instance.is_read:
+        shift_counter(instance.user_id, unread=-1)
+
+
+@receiver(post_save, sender=Hall)
+@receiver(post_save, sender=Club)
+@receiver(post_save, sender=Trainer)
+def index_catalog_object(sender, instance, **kwargs):
+    """
+        Обновляет поисковый документ зала, клуба или тренера.
+    """
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Hall)
+@receiver(post_delete, sender=Club)
+@receiver(post_delete, sender=Trainer)
+def unindex_catalog_object(sender, instance, **kwargs):
+    """
+        Удаляет поисковый документ удалённого объекта каталога.
+    """
+    unindex_object(instance)
+
+
+@receiver(post_save, sender=Hall)
+@receiver(post_save, sender=Club)
+@receiver(post_save, sender=Trainer)
+@receiver(post_save, sender=Ad)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Hall)
+@receiver(post_delete, sender=Club)
+@receiver(post_delete, sender=Trainer)
+@receiver(post_delete, sender=Ad)
+@receiver(post_delete, sender=Review)
+def bump_catalog_cache_version(sender, instance, **kwargs):
+    """
+        Увеличивает версию модели: закэшированные ответы каталога с ней перестают использоваться.
+    """
+    bump_version(sender)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """
+        Сбрасывает снимок пользователя в кэше аутентификации.
+    """
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def forget_cached_profile_user(sender, instance, **kwargs):
+    """
+        Смена роли или удаление профиля сбрасывает снимок его пользователя.
+    """
+    forget_user(instance.user_id)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def mirror_blacklisted_token(sender, instance, created, **kwargs):
+    """Любой token.blacklist() попадает и в список отозванных jti."""
+    if created:
+        token = instance.token
+        record_revocation(token.jti, 'refresh', token.expires_at, token.user_id)
@@ -0,0 +1,29 @@
+from django.core.management import call_command
+
+from .jobs import job, periodic
+from .utils.mail import send_batch
+from .utils.ratings import recompute_ratings
+from .utils.retention import purge_all
+
+
+@periodic('* * * * *', name='mail.send_outbox', max_attempts=1)
+def send_outbox():
+    """Разбирает outbox, пока в нём есть готовые к отправке письма."""
+    while any(send_batch().values()):
+        pass
+
+
+@periodic('0 3 * * *', name='ratings.recompute')
+def recompute_rating_aggregates():
+    recompute_ratings()
+
+
+@periodic('30 3 * * *', name='retention.purge')
+def purge_expired_data():
+    """Токены, коды, прочитанные уведомления, письма и задачи по политикам хранения."""
+    purge_all()
+
+
+@job(name='search.rebuild')
+def rebuild_search():
+    call_command('rebuild_search_index')
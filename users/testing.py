@@ -0,0 +1,69 @@
+"""Общие фабрики и базовые классы тестов приложений."""
+from datetime import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from users.models import Hall, Club, Trainer, ClassSchedule
+
+
+def make_user(email='client@example.com', password='password123', **extra):
+    return User.objects.create_user(username=email, email=email, password=password, **extra)
+
+
+def make_hall(title='Зал', **extra):
+    return Hall.objects.create(**{
+        'title': title, 'sport': 'Волейбол', 'address': 'ул. Тестовая, 1', 'price_per_hour': 1000, **extra,
+    })
+
+
+def make_club(title='Клуб', **extra):
+    return Club.objects.create(**{'title': title, 'sport': 'Волейбол', 'address': 'ул. Тестовая, 1', **extra})
+
+
+def make_trainer(email='trainer@example.com', **extra):
+    return Trainer.objects.create(first_name='Иван', last_name='Иванов', email=email, sport='Волейбол', **extra)
+
+
+def make_schedule(hall=None, day='Monday', start=time(10), end=time(11), title='Тренировка', **extra):
+    return ClassSchedule.objects.create(
+        title=title, day_of_week=day, start_time=start, end_time=end, hall=hall, **extra
+    )
+
+
+# Дешёвый хэш паролей: тестам не нужна стойкость, нужна скорость
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class CacheIsolatedTestCase(TestCase):
+    """Кэш общий для процессов хоста — перед каждым тестом он очищается."""
+
+    def setUp(self):
+        cache.clear()
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class CacheIsolatedAPITestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+
+class QueryCountMixin:
+    """Проверки того, что число запросов ответа не растёт вместе с числом строк."""
+
+    def count_queries(self, url):
+        # Ответы каталога кэшируются — каждый замер идёт мимо кэша
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def assertConstantQueries(self, url, add_row):
+        add_row(0)
+        single = self.count_queries(url)
+        for number in range(1, 6):
+            add_row(number)
+        self.assertEqual(self.count_queries(url), single, url)
@@ -0,0 +1,1627 @@
+import csv
+import json
+import math
+import os
+import random
+from importlib import import_module
+import tempfile
+from contextlib import nullcontext
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import IntegrityError, connection, transaction
+from django.apps import apps
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import jobs
+from .authentication import CachedJWTAuthentication, build_user, load_snapshot, user_cache
+from .cache import SQLiteCache
+from .hashers import CalibratedPBKDF2PasswordHasher
+from .models import (
+    Hall, Club, Review, ClassSchedule, Joinclub, Attendance, UserProfile, UserRole,
+    Notification, NotificationReceipt, InboxCounter, OutboxEmail, Job, RevokedToken, ThrottleBucket, SearchDocument,
+    PasswordResetCode,
+)
+from .permissions import IsAdminOrTrainer, has_role
+from .serializers import ClassScheduleSerializer
+from .throttling import bucket_key, consume, parse_rate
+from .utils.accounts import email_taken, find_user, get_user_by_email
+from .utils.attendance import mark_attendance, summarize_attendance, with_attendance_summary
+from .utils.geo import (
+    KM_PER_DEGREE, decode_geohash, encode_geohash, haversine_km, nearest, neighbours, within_radius,
+)
+from .utils.http_cache import cache_stats
+from .utils.imports import ClientImporter
+from .utils.mail import enqueue_email, send_batch, release_stale_claims, requeue_dead, _claim
+from .utils.notifications import inbox, unread_count, send_broadcast, mark_read, dismiss, mark_many_read
+from .utils.ratings import recompute_ratings
+from .utils.retention import get_policies, purge
+from .utils.revocation import REFRESH_MARGIN, RevocationSet, jti_hash, record_revocation, revoke, revoked
+from .utils.tokens import LazyRefreshToken, create_jwt_tokens_for_user
+from .utils.schedule import find_conflicts, free_windows
+from .utils.search import rebuild_search_index, search_documents, search_notifications
+from .testing import (
+    CacheIsolatedAPITestCase, CacheIsolatedTestCase, QueryCountMixin,
+    make_club, make_hall, make_schedule, make_trainer, make_user,
+)
+
+
+class RatingAggregateTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.hall = make_hall()
+        self.club = make_club()
+        self.trainer = make_trainer()
+
+    def assertAggregate(self, obj, rating_sum, review_count, average):
+        obj.refresh_from_db()
+        self.assertEqual((obj.rating_sum, obj.review_count), (rating_sum, review_count))
+        if average is None:
+            self.assertIsNone(obj.average_rating)
+        else:
+            self.assertAlmostEqual(obj.average_rating, average)
+
+    def test_create_update_delete_shift_aggregates(self):
+        first = Review.objects.create(user=self.user, hall=self.hall, trainer=self.trainer, text='a', rating=5)
+        Review.objects.create(user=self.user, hall=self.hall, text='b', rating=2)
+        self.assertAggregate(self.hall, 7, 2, 3.5)
+        self.assertAggregate(self.trainer, 5, 1, 5.0)
+
+        first.rating = 3
+        first.save()
+        self.assertAggregate(self.hall, 5, 2, 2.5)
+        self.assertAggregate(self.trainer, 3, 1, 3.0)
+
+        first.delete()
+        self.assertAggregate(self.hall, 2, 1, 2.0)
+        self.assertAggregate(self.trainer, 0, 0, None)
+
+    def test_moving_review_between_targets(self):
+        review = Review.objects.create(user=self.user, hall=self.hall, text='a', rating=4)
+        review.hall = None
+        review.club = self.club
+        review.save()
+        self.assertAggregate(self.hall, 0, 0, None)
+        self.assertAggregate(self.club, 4, 1, 4.0)
+
+    def test_full_save_of_stale_instance_keeps_aggregates(self):
+        stale = Hall.objects.get(pk=self.hall.pk)
+        Review.objects.create(user=self.user, hall=self.hall, text='a', rating=4)
+        stale.title = 'Новое название'
+        stale.save()
+        self.assertAggregate(self.hall, 4, 1, 4.0)
+        self.assertEqual(Hall.objects.get(pk=self.hall.pk).title, 'Новое название')
+
+    def test_recompute_fixes_drift(self):
+        Review.objects.create(user=self.user, club=self.club, text='a', rating=5)
+        Club.objects.filter(pk=self.club.pk).update(rating_sum=100, review_count=9, average_rating=1.0)
+
+        stats = recompute_ratings(dry_run=True)
+        self.assertEqual(stats['Club'], (1, 1))
+        self.assertAggregate(self.club, 100, 9, 1.0)
+
+        recompute_ratings()
+        self.assertAggregate(self.club, 5, 1, 5.0)
+        self.assertEqual(recompute_ratings()['Club'], (1, 0))
+
+
+class MarkAttendanceTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.schedule = make_schedule(hall=make_hall())
+        self.joinclub = Joinclub.objects.create(user=make_user().userprofile, schedule=self.schedule)
+        self.day = date(2025, 10, 6)
+
+    def test_resubmit_without_notes_keeps_them(self):
+        mark_attendance(self.schedule, self.day, [{'joinclub': self.joinclub.pk, 'notes': 'Опоздал'}])
+        summary = mark_attendance(self.schedule, self.day, [{'joinclub': self.joinclub.pk, 'is_present': False}])
+
+        attendance = Attendance.objects.get(joinclub=self.joinclub, attendance_date=self.day)
+        self.assertEqual((attendance.is_present, attendance.notes), (False, 'Опоздал'))
+        self.assertEqual((summary['present'], summary['absent'], summary['unmarked']), (0, 1, 0))
+
+    def test_explicit_notes_overwrite(self):
+        mark_attendance(self.schedule, self.day, [{'joinclub': self.joinclub.pk, 'notes': 'Опоздал'}])
+        mark_attendance(self.schedule, self.day, [{'joinclub': self.joinclub.pk, 'notes': None}])
+        self.assertIsNone(Attendance.objects.get(joinclub=self.joinclub).notes)
+
+
+class AttendanceSummaryTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        schedule = make_schedule(hall=make_hall())
+        self.regular, self.newcomer = (
+            Joinclub.objects.create(user=make_user(email).userprofile, schedule=schedule)
+            for email in ('regular@example.com', 'newcomer@example.com')
+        )
+        today = timezone.localdate()
+        for days_ago, is_present in ((1, True), (2, True), (3, False), (45, True)):
+            Attendance.objects.create(
+                joinclub=self.regular, attendance_date=today - timedelta(days=days_ago), is_present=is_present,
+            )
+
+    def test_summary_counts_window_and_zero_enrollments(self):
+        expected = {
+            self.regular.pk: {'present': 2, 'absent': 1, 'total': 3},
+            # Запись без посещений тоже есть в сводке — с нулями
+            self.newcomer.pk: {'present': 0, 'absent': 0, 'total': 0},
+        }
+        for joinclubs in (Joinclub.objects.all(), [self.regular, self.newcomer], [self.regular.pk, self.newcomer.pk]):
+            with self.subTest(joinclubs=type(joinclubs).__name__), self.assertNumQueries(1):
+                summaries = summarize_attendance(joinclubs)
+                self.assertEqual({pk: summaries[pk] for pk in expected}, expected)
+
+        self.assertEqual(summarize_attendance([self.regular], days=60)[self.regular.pk]['total'], 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(summarize_attendance([])[self.regular.pk]['total'], 0)
+
+    def test_explicit_range_overrides_days(self):
+        today = timezone.localdate()
+        summary = summarize_attendance(
+            [self.regular], days=1, date_from=today - timedelta(days=3), date_to=today - timedelta(days=2),
+        )[self.regular.pk]
+        self.assertEqual(summary, {'present': 1, 'absent': 1, 'total': 2})
+
+    def test_annotated_queryset(self):
+        rows = with_attendance_summary(Joinclub.objects.order_by('pk'))
+        self.assertEqual(
+            [(row.attendance_present, row.attendance_absent) for row in rows],
+            [(2, 1), (0, 0)],
+        )
+
+
+class HallScheduleTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hall = make_hall()
+        self.lesson = make_schedule(hall=self.hall, start=time(10), end=time(12))
+
+    def schedule_data(self, start, end, hall=None, day='Monday'):
+        return {
+            'title': 'Новое занятие', 'day_of_week': day,
+            'start_time': start, 'end_time': end, 'hall': (hall or self.hall).pk,
+        }
+
+    def test_overlap_is_rejected(self):
+        serializer = ClassScheduleSerializer(data=self.schedule_data('11:00', '13:00'))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.assertEqual(ClassSchedule.objects.count(), 1)
+
+    def test_adjacent_other_day_and_other_hall_are_allowed(self):
+        for data in (
+            self.schedule_data('12:00', '13:00'),
+            self.schedule_data('10:00', '12:00', day='Tuesday'),
+            self.schedule_data('10:00', '12:00', hall=make_hall('Другой зал')),
+        ):
+            serializer = ClassScheduleSerializer(data=data)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            serializer.save()
+        self.assertEqual(ClassSchedule.objects.count(), 4)
+
+    def test_update_does_not_conflict_with_itself(self):
+        serializer = ClassScheduleSerializer(self.lesson, data={'end_time': '12:30'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertFalse(find_conflicts(self.hall, 'Monday', time(12, 30), time(13)).exists())
+
+    def test_model_clean_rejects_overlap(self):
+        overlapping = ClassSchedule(
+            title='Пересекается', day_of_week='Monday', start_time=time(9), end_time=time(10, 30), hall=self.hall
+        )
+        with self.assertRaises(DjangoValidationError):
+            overlapping.clean()
+
+    def test_free_windows(self):
+        make_schedule(hall=self.hall, start=time(11), end=time(13))
+        make_schedule(hall=self.hall, start=time(15), end=time(16))
+        self.assertEqual(
+            free_windows(self.hall, 'Monday', time(8), time(18)),
+            [(time(8), time(10)), (time(13), time(15)), (time(16), time(18))],
+        )
+        self.assertEqual(free_windows(self.hall, 'Sunday', time(8), time(18)), [(time(8), time(18))])
+
+
+class NotificationSearchTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def notify(self, message):
+        return Notification.objects.create(user=self.user, message=message, type='payment')
+
+    def found(self, query):
+        return list(search_notifications(Notification.objects.all(), query).values_list('pk', flat=True))
+
+    def test_relevance_order(self):
+        # Более релевантное уведомление создано первым: порядок задаёт ранг, а не -pk
+        relevant = self.notify('Оплата не прошла, повторите оплата')
+        mention = self.notify('Спасибо! Оплата абонемента в клуб на следующий месяц получена, ждём на тренировках')
+        self.notify('Тренировка перенесена на пятницу')
+        self.assertEqual(self.found('оплата'), [relevant.pk, mention.pk])
+        self.assertEqual(self.found('  '), [])
+
+    def test_index_follows_insert_update_delete(self):
+        first = self.notify('Оплата получена')
+        second = self.notify('Тренировка перенесена')
+        self.assertEqual(self.found('оплата'), [first.pk])
+
+        # Триггеры обновляют индекс вместе с сообщением и при update() queryset
+        second.message = 'Оплата за тренировку'
+        second.save(update_fields=['message'])
+        Notification.objects.filter(pk=first.pk).update(message='Клуб закрыт')
+        self.assertEqual(self.found('оплата'), [second.pk])
+        self.assertEqual(self.found('закрыт'), [first.pk])
+
+        second.delete()
+        self.assertEqual(self.found('оплата'), [])
+
+    def test_sqlite_prefix_and_special_characters(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Поиск по префиксу — FTS5')
+        match = self.notify('Оплата абонемента')
+        self.assertEqual(self.found('абонем'), [match.pk])
+        # Синтаксис FTS5 во вводе не ломает запрос
+        self.assertEqual(self.found('"оплата" OR NEAR(*'), [])
+        self.assertEqual(self.found('оплата*'), [match.pk])
+
+    def test_endpoint_searches_own_inbox(self):
+        own = self.notify('Оплата получена')
+        Notification.objects.create(user=make_user('other@example.com'), message='Оплата получена', type='payment')
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/notifications/', {'search': 'оплата'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([item['id'] for item in response.data['results']], [own.pk])
+
+
+class UnreadCounterTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def assertBadgeMatchesInbox(self, expected):
+        unread = sum(not (n.is_read or n.read_by_user) for n in inbox(self.user))
+        self.assertEqual(unread, expected)
+        self.assertEqual(unread_count(self.user), expected)
+
+    def test_personal_and_broadcast_counts(self):
+        personal = Notification.objects.create(user=self.user, message='Оплата', type='payment')
+        broadcast = send_broadcast('Открытие сезона')
+        self.assertBadgeMatchesInbox(2)
+
+        mark_read(self.user, personal)
+        mark_read(self.user, broadcast)
+        mark_read(self.user, broadcast)
+        self.assertBadgeMatchesInbox(0)
+
+    def test_deleted_read_broadcast_does_not_hide_new_one(self):
+        first = send_broadcast('Первая рассылка')
+        mark_read(self.user, first)
+        self.assertBadgeMatchesInbox(0)
+
+        first.delete()
+        send_broadcast('Вторая рассылка')
+        self.assertBadgeMatchesInbox(1)
+        self.assertEqual(InboxCounter.objects.get(user=self.user).broadcasts_seen, 0)
+
+    def test_queryset_delete_of_broadcasts(self):
+        for message in ('a', 'b'):
+            dismiss(self.user, send_broadcast(message))
+        Notification.objects.filter(user__isnull=True).delete()
+        send_broadcast('c')
+        self.assertBadgeMatchesInbox(1)
+
+    def test_mark_many_read_counts_only_inserted_receipts(self):
+        already_read = send_broadcast('Прочитана раньше')
+        send_broadcast('Новая')
+        Notification.objects.create(user=self.user, message='Оплата', type='payment')
+        unread_count(self.user)  # строка счётчика создаётся до отметок
+        # Отметка, вставленная мимо счётчика (как параллельный mark_read до своего shift),
+        # не должна засчитываться пачкой
+        NotificationReceipt.objects.create(notification=already_read, user=self.user)
+
+        self.assertEqual(mark_many_read(self.user), 2)
+        self.assertEqual(InboxCounter.objects.get(user=self.user).broadcasts_seen, 1)
+        self.assertIsNotNone(NotificationReceipt.objects.exclude(notification=already_read).get().read_at)
+        self.assertEqual(mark_many_read(self.user), 0)
+
+    def test_mark_many_read_skips_receipt_inserted_concurrently(self):
+        racing = send_broadcast('Прочитана параллельно')
+        send_broadcast('Новая')
+        unread_count(self.user)
+        bulk_create = NotificationReceipt.objects.bulk_create
+
+        def race(objs, **kwargs):
+            # mark_read из другого запроса успел между выборкой id и вставкой
+            mark_read(self.user, racing)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(NotificationReceipt.objects, 'bulk_create', side_effect=race):
+            self.assertEqual(mark_many_read(self.user), 1)
+        self.assertEqual(InboxCounter.objects.get(user=self.user).broadcasts_seen, 2)
+        self.assertBadgeMatchesInbox(0)
+
+
+class CatalogSearchTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # Упоминание в описании создано раньше: порядок задаёт ранг, а не pk
+        self.mention = make_hall('Спорткомплекс', description='Бывшая арена городского клуба')
+        self.arena = make_hall('Арена Север', description='Большой зал')
+        make_trainer()
+
+    def found(self, query, kind=SearchDocument.HALL):
+        return list(search_documents(query, kinds=[kind]).values_list('object_id', flat=True))
+
+    def test_title_outranks_body(self):
+        self.assertEqual(self.found('арена'), [self.arena.pk, self.mention.pk])
+        self.assertEqual(self.found('арена', SearchDocument.TRAINER), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.arena.title = 'Центр'
+        self.arena.save()
+        self.assertEqual(self.found('арена'), [self.mention.pk])
+        self.assertEqual(self.found('центр'), [self.arena.pk])
+
+        self.mention.delete()
+        self.assertEqual(self.found('арена'), [])
+        self.assertFalse(SearchDocument.objects.filter(object_id=self.mention.pk, kind=SearchDocument.HALL).exists())
+
+    def test_search_filter_orders_by_relevance(self):
+        response = self.client.get('/api/halls/', {'search': 'арена'})
+        self.assertEqual([hall['id'] for hall in response.data['results']], [self.arena.pk, self.mention.pk])
+        response = self.client.get('/api/search/', {'q': 'арена', 'kind': 'hall'})
+        self.assertEqual([hit['id'] for hit in response.data['results']], [self.arena.pk, self.mention.pk])
+
+    def test_rebuild_restores_index(self):
+        SearchDocument.objects.all().delete()
+        stats = rebuild_search_index()
+        self.assertEqual(stats, {SearchDocument.HALL: 2, SearchDocument.CLUB: 0, SearchDocument.TRAINER: 1})
+        self.assertEqual(self.found('арена'), [self.arena.pk, self.mention.pk])
+
+    def test_failed_rebuild_keeps_old_index(self):
+        with mock.patch.object(SearchDocument.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                rebuild_search_index()
+        self.assertEqual(self.found('арена'), [self.arena.pk, self.mention.pk])
+
+
+class GeohashTests(SimpleTestCase):
+    def test_encode_and_decode(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        latitude, longitude = decode_geohash(encode_geohash(55.7558, 37.6173))
+        self.assertAlmostEqual(latitude, 55.7558, places=5)
+        self.assertAlmostEqual(longitude, 37.6173, places=5)
+
+    def test_neighbours_wrap_around_antimeridian(self):
+        cells = neighbours(encode_geohash(0.5, 179.99, 4))
+        self.assertEqual(len(cells), 9)
+        self.assertIn(encode_geohash(0.5, 179.99, 4), cells)
+        self.assertIn(encode_geohash(0.5, -179.99, 4), cells)
+
+    def test_haversine(self):
+        # Москва — Санкт-Петербург
+        self.assertAlmostEqual(haversine_km(55.7558, 37.6173, 59.9343, 30.3351), 634, delta=2)
+
+
+class NearbyTests(CacheIsolatedTestCase):
+    CENTER = (55.7558, 37.6173)
+
+    def hall_at(self, north_km, east_km, title='Зал'):
+        latitude = self.CENTER[0] + north_km / KM_PER_DEGREE
+        longitude = self.CENTER[1] + east_km / (KM_PER_DEGREE * math.cos(math.radians(self.CENTER[0])))
+        return make_hall(title, latitude=latitude, longitude=longitude)
+
+    def brute_force(self, limit):
+        halls = Hall.objects.filter(geohash__isnull=False)
+        return sorted(halls, key=lambda hall: haversine_km(*self.CENTER, hall.latitude, hall.longitude))[:limit]
+
+    def test_within_radius_boundary(self):
+        near, edge, far = self.hall_at(1, 0), self.hall_at(0, 9.9), self.hall_at(10.5, 0)
+        make_hall('Без координат')
+        found = within_radius(Hall.objects.all(), *self.CENTER, 10)
+        self.assertEqual(found, [near, edge])
+        self.assertAlmostEqual(found[1].distance_km, 9.9, places=1)
+        self.assertNotIn(far, within_radius(Hall.objects.all(), *self.CENTER, 10))
+
+    def test_small_catalog_loads_once(self):
+        halls = [self.hall_at(km, km) for km in (300, 1, 40)]
+        make_hall('Без координат')
+        # Объектов с координатами меньше limit: подсчёт и одна выборка, без укрупнения ячеек
+        with self.assertNumQueries(2):
+            found = nearest(Hall.objects.all(), *self.CENTER, limit=20)
+        self.assertEqual(found, [halls[1], halls[2], halls[0]])
+
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        for number in range(40):
+            self.hall_at(generator.uniform(-30, 30), generator.uniform(-30, 30), f'Зал {number}')
+        self.hall_at(2000, 0, 'Далеко')
+        for limit in (1, 5, 41):
+            with self.subTest(limit=limit):
+                self.assertEqual(nearest(Hall.objects.all(), *self.CENTER, limit=limit), self.brute_force(limit))
+        self.assertEqual(
+            nearest(Hall.objects.all(), *self.CENTER, limit=3, radius_km=1000),
+            self.brute_force(3),
+        )
+
+
+class BackfillCoordinatesTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.gazetteer = os.path.join(directory.name, 'addresses.csv')
+        with open(self.gazetteer, 'w', encoding='utf-8') as stream:
+            stream.write('address,lat,lng\nТверская улица,55.7649,37.6057\nул. Арбат 10,55.7507,37.5938\n')
+        self.street = make_hall('Тверская', address='г. Москва, Тверская улица, д. 7')
+        self.exact = make_club('Арбат', address='Ул. Арбат, 10')
+        self.unknown = make_hall('Нет в справочнике', address='пр. Мира, 1')
+
+    def test_fills_coordinates_and_geohash(self):
+        call_command('backfill_coordinates', self.gazetteer, stdout=StringIO())
+        self.street.refresh_from_db()
+        self.exact.refresh_from_db()
+        self.assertEqual((self.street.latitude, self.street.longitude), (55.7649, 37.6057))
+        self.assertEqual(self.street.geohash, encode_geohash(55.7649, 37.6057))
+        self.assertEqual((self.exact.latitude, self.exact.longitude), (55.7507, 37.5938))
+        self.assertIsNone(Hall.objects.get(pk=self.unknown.pk).geohash)
+
+    def test_dry_run_and_existing_coordinates(self):
+        Hall.objects.filter(pk=self.street.pk).update(latitude=1.0, longitude=1.0)
+        call_command('backfill_coordinates', self.gazetteer, '--dry-run', stdout=StringIO())
+        self.assertIsNone(Club.objects.get(pk=self.exact.pk).latitude)
+
+        call_command('backfill_coordinates', self.gazetteer, '--model', 'hall', stdout=StringIO())
+        # Заполненные координаты без --overwrite не трогаются
+        self.assertEqual(Hall.objects.get(pk=self.street.pk).latitude, 1.0)
+        self.assertIsNone(Club.objects.get(pk=self.exact.pk).latitude)
+
+
+class CatalogResponseCacheTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # Счётчики, накопленные процессом в других тестах
+        cache_stats(reset=True)
+        make_hall('Первый зал')
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get('/halls/')
+        second = self.client.get('/halls/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(first.json(), second.json())
+
+    def test_matching_etag_gets_304_without_queries(self):
+        etag = self.client.get('/halls/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/halls/', HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(cache_stats()['users.halls'], {'hit': 0, 'miss': 1, 'not_modified': 1, 'hit_ratio': 0.5})
+
+    def test_model_change_bumps_version_after_commit(self):
+        etag = self.client.get('/halls/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            make_hall('Второй зал')
+
+        response = self.client.get('/halls/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get('/halls/')
+        self.assertEqual(self.client.get('/halls/', {'page': 1})['X-Cache'], 'MISS')
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_host_and_scheme_are_part_of_the_key(self):
+        self.client.get('/halls/', {'page_size': 1})
+        make_hall('Второй зал')  # версия не меняется: on_commit в тесте не выполняется
+        other_host = self.client.get('/halls/', {'page_size': 1}, HTTP_HOST='api.example.com')
+        self.assertEqual(other_host['X-Cache'], 'MISS')
+        self.assertTrue(other_host.json()['next'].startswith('http://api.example.com/'))
+        secure = self.client.get('/halls/', {'page_size': 1}, HTTP_HOST='api.example.com', secure=True)
+        self.assertEqual(secure['X-Cache'], 'MISS')
+        self.assertTrue(secure.json()['next'].startswith('https://api.example.com/'))
+
+    def test_stats_are_counted_in_memory_and_flushed(self):
+        self.client.get('/halls/')
+        with mock.patch.object(type(caches['default']), 'incr') as incr, \
+                mock.patch('users.utils.http_cache.STATS_FLUSH_INTERVAL', 3600):
+            for _ in range(3):
+                self.client.get('/halls/')
+        # Попадания не пишут в кэш на каждом запросе
+        incr.assert_not_called()
+        self.assertEqual(cache_stats()['users.halls']['hit'], 3)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SQLiteCache(os.path.join(directory.name, 'cache.sqlite3'), {})
+
+    def test_incr(self):
+        self.cache.set('hits', 1)
+        self.assertEqual(self.cache.incr('hits'), 2)
+        self.assertEqual(self.cache.incr('hits', 10), 12)
+        self.assertEqual(self.cache.get('hits'), 12)
+
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('text', 'not a number')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+
+    def test_incr_of_expired_key_fails(self):
+        self.cache.set('hits', 1, timeout=0.05)
+        clock.sleep(0.1)
+        with self.assertRaises(ValueError):
+            self.cache.incr('hits')
+
+    def test_add_keeps_live_value_and_replaces_expired(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+
+        self.cache.set('short', 'old', timeout=0.05)
+        clock.sleep(0.1)
+        self.assertTrue(self.cache.add('short', 'new'))
+        self.assertEqual(self.cache.get('short'), 'new')
+
+    def test_values_survive_round_trip(self):
+        self.cache.set_many({'int': 7, 'dict': {'a': [1, 2]}, 'none': None})
+        self.assertEqual(self.cache.get_many(['int', 'dict', 'none', 'missing']), {
+            'int': 7, 'dict': {'a': [1, 2]}, 'none': None,
+        })
+
+    def test_get_or_compute_runs_once_for_concurrent_callers(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            clock.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_compute('report', compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+        self.assertFalse(self.cache.has_key('report:lock'))
+
+    def test_stale_value_is_served_while_another_process_recomputes(self):
+        key = self.cache.make_and_validate_key('report')
+        self.cache._write(key, 'stale', 60, delta=1000)
+        self.cache.add('report:lock', 'other process', 60)
+        compute = mock.Mock(return_value='fresh')
+
+        # Долгий прошлый пересчёт делает ранний пересчёт гарантированным
+        with mock.patch('users.cache.random.random', return_value=0.5):
+            self.assertEqual(self.cache.get_or_compute('report', compute, 60), 'stale')
+        compute.assert_not_called()
+
+        self.cache.delete('report:lock')
+        with mock.patch('users.cache.random.random', return_value=0.5):
+            self.assertEqual(self.cache.get_or_compute('report', compute, 60), 'fresh')
+        self.assertEqual(self.cache.get('report'), 'fresh')
+
+    def test_timed_out_waiter_keeps_owners_lock(self):
+        self.cache.add('report:lock', 'other process', 60)
+        with mock.patch('users.cache.SINGLE_FLIGHT_WAIT', 0.1):
+            self.assertEqual(self.cache.get_or_compute('report', lambda: 'value', 60), 'value')
+        # Следующие вызовы по-прежнему ждут владельца, а не считают параллельно
+        self.assertEqual(self.cache.get('report:lock'), 'other process')
+
+    def test_expired_lock_taken_by_another_process_is_not_released(self):
+        def compute():
+            # Своя блокировка истекла, её взял другой процесс
+            self.cache.set('report:lock', 'other process', 60)
+            return 'value'
+
+        self.assertEqual(self.cache.get_or_compute('report', compute, 60), 'value')
+        self.assertEqual(self.cache.get('report:lock'), 'other process')
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Не доставляет письма на адреса из домена fail.example.com."""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@fail.example.com') for address in message.to):
+                raise ConnectionError('Получатель недоступен')
+            mail.outbox.append(message)
+        return len(messages)
+
+
+class HookedEmailBackend(BaseEmailBackend):
+    """Перед доставкой каждого письма вызывает on_send(message) — для гонок с другими воркерами."""
+    on_send = None
+
+    def send_messages(self, messages):
+        for message in messages:
+            if HookedEmailBackend.on_send:
+                HookedEmailBackend.on_send(message)
+            mail.outbox.append(message)
+        return len(messages)
+
+
+class OutboxTests(CacheIsolatedTestCase):
+    backend = 'users.tests.FailingEmailBackend'
+
+    def test_batch_is_sent_and_released(self):
+        for index in range(3):
+            enqueue_email(f'user{index}@example.com', 'Код', '1234')
+        self.assertEqual(send_batch(backend=self.backend), {'sent': 3, 'retried': 0, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        self.assertFalse(OutboxEmail.objects.filter(locked_by__isnull=False).exists())
+        self.assertEqual(send_batch(backend=self.backend), {'sent': 0, 'retried': 0, 'dead': 0})
+
+    def test_failure_is_retried_later(self):
+        email = enqueue_email('user@fail.example.com', 'Код', '1234')
+        self.assertEqual(send_batch(backend=self.backend), {'sent': 0, 'retried': 1, 'dead': 0})
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn('ConnectionError', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # Повтор ещё не наступил
+        self.assertEqual(send_batch(backend=self.backend)['retried'], 0)
+
+    def test_last_attempt_goes_to_dead_letter_and_can_be_requeued(self):
+        email = enqueue_email('user@fail.example.com', 'Код', '1234')
+        OutboxEmail.objects.filter(pk=email.pk).update(attempts=settings.OUTBOX_MAX_ATTEMPTS - 1)
+        self.assertEqual(send_batch(backend=self.backend)['dead'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.DEAD)
+
+        self.assertEqual(requeue_dead(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 0))
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        for index in range(3):
+            enqueue_email(f'user{index}@example.com', 'Код', '1234')
+        first = _claim(2)
+        second = _claim(10)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+        self.assertEqual(_claim(10), [])
+
+    def test_stale_claim_is_returned_to_queue(self):
+        enqueue_email('user@example.com', 'Код', '1234')
+        _claim(10)
+        self.assertEqual(send_batch(backend=self.backend)['sent'], 0)
+
+        OutboxEmail.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(send_batch(backend=self.backend)['sent'], 1)
+
+    def hook(self, on_send):
+        HookedEmailBackend.on_send = on_send
+        self.addCleanup(setattr, HookedEmailBackend, 'on_send', None)
+        return 'users.tests.HookedEmailBackend'
+
+    def test_long_batch_extends_its_claims(self):
+        for index in range(3):
+            enqueue_email(f'user{index}@example.com', 'Код', '1234')
+
+        def on_send(message):
+            if message.to == ['user0@example.com']:
+                # Пачка идёт дольше CLAIM_TIMEOUT: метки всех её писем устарели
+                OutboxEmail.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+            else:
+                # Другой воркер чистит зависшие метки посреди пачки
+                self.assertEqual(release_stale_claims(), 0)
+
+        with mock.patch('users.utils.mail.CLAIM_EXTEND_INTERVAL', timedelta(0)):
+            self.assertEqual(send_batch(backend=self.hook(on_send))['sent'], 3)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_result_is_not_written_over_a_lost_claim(self):
+        first = enqueue_email('user0@example.com', 'Код', '1234')
+        second = enqueue_email('user1@example.com', 'Код', '1234')
+
+        def on_send(message):
+            if message.to == ['user0@example.com']:
+                # Метка второго письма истекла, его взял другой отправитель
+                OutboxEmail.objects.filter(pk=second.pk).update(locked_by='other', locked_at=timezone.now())
+
+        with self.assertLogs('users.utils.mail', 'WARNING'):
+            send_batch(backend=self.hook(on_send))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, OutboxEmail.SENT)
+        self.assertEqual((second.status, second.locked_by, second.attempts), (OutboxEmail.SENDING, 'other', 0))
+
+    def test_interrupted_batch_returns_unsent_emails(self):
+        for index in range(3):
+            enqueue_email(f'user{index}@example.com', 'Код', '1234')
+
+        def on_send(message):
+            if message.to == ['user1@example.com']:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            send_batch(backend=self.hook(on_send))
+        self.assertEqual(
+            dict(OutboxEmail.objects.values_list('to', 'status')),
+            {'user0@example.com': OutboxEmail.SENT, 'user1@example.com': OutboxEmail.PENDING,
+             'user2@example.com': OutboxEmail.PENDING},
+        )
+        self.assertFalse(OutboxEmail.objects.filter(locked_by__isnull=False).exists())
+
+
+class CronScheduleTests(SimpleTestCase):
+    def test_fields(self):
+        schedule = jobs.CronSchedule('*/15 9-17 * * 1-5')
+        # 2025-10-06 — понедельник, 2025-10-05 — воскресенье
+        self.assertTrue(schedule.matches(datetime(2025, 10, 6, 9, 45)))
+        self.assertFalse(schedule.matches(datetime(2025, 10, 6, 9, 50)))
+        self.assertFalse(schedule.matches(datetime(2025, 10, 6, 18, 0)))
+        self.assertFalse(schedule.matches(datetime(2025, 10, 5, 10, 0)))
+
+    def test_day_of_month_or_weekday(self):
+        # Как в cron: заданы оба поля — достаточно совпадения любого
+        schedule = jobs.CronSchedule('0 3 1 * 0')
+        self.assertTrue(schedule.matches(datetime(2025, 10, 1, 3, 0)))
+        self.assertTrue(schedule.matches(datetime(2025, 10, 5, 3, 0)))
+        self.assertFalse(schedule.matches(datetime(2025, 10, 6, 3, 0)))
+
+    def test_lists_and_invalid_expressions(self):
+        schedule = jobs.CronSchedule('0,30 * * 1,7 *')
+        self.assertTrue(schedule.matches(datetime(2025, 7, 2, 11, 30)))
+        self.assertFalse(schedule.matches(datetime(2025, 8, 2, 11, 30)))
+        for expression in ('* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *'):
+            with self.assertRaises(ValueError):
+                jobs.CronSchedule(expression)
+
+
+def failing_job():
+    raise RuntimeError('boom')
+
+
+failing_job.job_options = {'max_attempts': 2, 'priority': 0}
+
+
+class JobQueueTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        registry = mock.patch.dict(jobs.REGISTRY, {'tests.fail': failing_job})
+        registry.start()
+        self.addCleanup(registry.stop)
+
+    def test_claim_takes_ready_jobs_by_priority(self):
+        low = jobs.enqueue('tests.fail')
+        high = jobs.enqueue('tests.fail', priority=5)
+        jobs.enqueue('tests.fail', run_at=timezone.now() + timedelta(hours=1))
+
+        claimed = jobs.claim(10, 'worker-1')
+        self.assertEqual([job.pk for job in claimed], [high.pk, low.pk])
+        self.assertEqual(jobs.claim(10, 'worker-2'), [])
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING, locked_by='worker-1').count(), 2)
+
+    def test_enqueue_due_is_deduplicated_per_slot(self):
+        since = timezone.now().replace(second=0, microsecond=0)
+        with mock.patch.object(jobs, 'SCHEDULES', [(jobs.CronSchedule('* * * * *'), 'tests.fail')]):
+            jobs.enqueue_due(since, since + timedelta(minutes=3))
+            jobs.enqueue_due(since, since + timedelta(minutes=3))
+        self.assertEqual(Job.objects.count(), 3)
+
+    def test_failed_job_is_retried_then_fails(self):
+        job = jobs.enqueue('tests.fail')
+        with self.assertLogs('users.jobs', 'ERROR'):
+            self.assertEqual(jobs.execute(jobs.claim(1)[0]), Job.QUEUED)
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            self.assertEqual(jobs.execute(jobs.claim(1)[0]), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('RuntimeError', job.last_error)
+
+    def test_heartbeat_keeps_long_job_leased(self):
+        job = jobs.enqueue('tests.fail')
+        jobs.claim(1, 'worker-1')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - jobs.LEASE_TIMEOUT * 2)
+
+        self.assertEqual(jobs.heartbeat('worker-1'), 1)
+        self.assertEqual(jobs.release_stale(), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+
+    def test_abandoned_job_counts_attempts_until_failed(self):
+        job = jobs.enqueue('tests.fail')
+        for expected in (Job.QUEUED, Job.FAILED):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            jobs.claim(1, 'worker-1')
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - jobs.LEASE_TIMEOUT * 2)
+            self.assertEqual(jobs.release_stale(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, expected)
+            self.assertIsNone(job.locked_by)
+        self.assertEqual(job.attempts, 2)
+
+
+@override_settings(
+    RETENTION_CODE_DAYS=1, RETENTION_NOTIFICATION_DAYS=90, RETENTION_OUTBOX_DAYS=30, RETENTION_JOB_DAYS=30,
+    RETENTION_PAUSE_SECONDS=0,
+)
+class RetentionTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.user = make_user()
+
+    def purge(self, name, **options):
+        [policy] = get_policies([name])
+        return purge(policy, now=self.now, **options)
+
+    def assertPurged(self, name, stale, kept):
+        model = stale[0]._meta.model
+        stats = self.purge(name)
+        self.assertEqual(stats['matched'], len(stale))
+        self.assertEqual(stats['deleted'][model._meta.label], len(stale))
+        remaining = set(model.objects.values_list('pk', flat=True))
+        self.assertFalse(remaining & {row.pk for row in stale})
+        self.assertEqual(remaining, {row.pk for row in kept})
+
+    def backdate(self, row, **fields):
+        # auto_now_add не даёт задать время при создании
+        type(row).objects.filter(pk=row.pk).update(**fields)
+        return row
+
+    def outstanding(self, jti, expires_at):
+        return OutstandingToken.objects.create(user=self.user, jti=jti, token=jti, expires_at=expires_at)
+
+    def revoked_token(self, jti, expires_at):
+        return RevokedToken.objects.create(jti=jti, token_type=RevokedToken.ACCESS, expires_at=expires_at)
+
+    def notification(self, age, user=True, is_read=True):
+        row = Notification.objects.create(
+            user=self.user if user else None, message='Тест', type='announcement', is_read=is_read,
+        )
+        return self.backdate(row, created_at=self.now - age)
+
+    def outbox(self, age, status=OutboxEmail.SENT):
+        return OutboxEmail.objects.create(
+            to='client@example.com', subject='Тема', body='Текст', status=status, sent_at=self.now - age,
+        )
+
+    def job(self, age, status=Job.DONE):
+        return Job.objects.create(name='noop', status=status, finished_at=self.now - age)
+
+    def test_expired_tokens_are_removed_with_blacklist_entries(self):
+        stale = self.outstanding('old', self.now - timedelta(seconds=1))
+        BlacklistedToken.objects.create(token=stale)
+        kept = self.outstanding('boundary', self.now)
+        stats = self.purge('tokens')
+        self.assertEqual(stats['deleted'][BlacklistedToken._meta.label], 1)
+        self.assertEqual(list(OutstandingToken.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_revoked_tokens(self):
+        self.assertPurged(
+            'revoked_tokens',
+            stale=[self.revoked_token('old', self.now - timedelta(seconds=1))],
+            kept=[self.revoked_token('boundary', self.now), self.revoked_token('valid', self.now + timedelta(hours=1))],
+        )
+
+    def test_codes(self):
+        code = lambda age: self.backdate(
+            PasswordResetCode.objects.create(user=self.user, code='1234'), created_at=self.now - age,
+        )
+        self.assertPurged(
+            'codes',
+            stale=[code(timedelta(days=1, seconds=1))],
+            kept=[code(timedelta(days=1)), code(timedelta(hours=1))],
+        )
+
+    def test_read_personal_notifications(self):
+        self.assertPurged(
+            'notifications',
+            stale=[self.notification(timedelta(days=90, seconds=1))],
+            kept=[
+                self.notification(timedelta(days=90)),
+                self.notification(timedelta(days=200), is_read=False),
+                # Рассылки нужны для счётчика непрочитанных
+                self.notification(timedelta(days=200), user=False),
+            ],
+        )
+
+    def test_sent_outbox(self):
+        self.assertPurged(
+            'outbox',
+            stale=[self.outbox(timedelta(days=30, seconds=1))],
+            kept=[self.outbox(timedelta(days=30)), self.outbox(timedelta(days=60), status=OutboxEmail.DEAD)],
+        )
+
+    def test_recovered_throttle_buckets(self):
+        bucket = lambda key, tat: ThrottleBucket.objects.create(key=key, tat=tat)
+        self.assertPurged(
+            'throttle',
+            stale=[bucket('old', self.now.timestamp() - 1)],
+            kept=[bucket('boundary', self.now.timestamp()), bucket('busy', self.now.timestamp() + 60)],
+        )
+
+    def test_finished_jobs(self):
+        self.assertPurged(
+            'jobs',
+            stale=[self.job(timedelta(days=31)), self.job(timedelta(days=31), status=Job.FAILED)],
+            kept=[self.job(timedelta(days=30)), self.job(timedelta(days=31), status=Job.RUNNING)],
+        )
+
+    def test_batches_walk_past_kept_rows(self):
+        old = timedelta(days=100)
+        stale, kept = [], []
+        for index in range(7):
+            stale.append(self.notification(old))
+            # Неподходящие строки между пачками не должны останавливать обход
+            if index % 2:
+                kept.append(self.notification(old, is_read=False))
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.purge('notifications', batch_size=3)
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(stats['deleted'][Notification._meta.label], 7)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {row.pk for row in kept})
+        self.assertEqual(sum('"id" >' in query['sql'] for query in queries), 3)
+
+    def test_row_changed_after_selection_is_kept(self):
+        rows = [self.notification(timedelta(days=100)) for _ in range(3)]
+        atomic = transaction.atomic
+
+        def reopen_then_atomic(*args, **kwargs):
+            # Между выборкой ключей и удалением уведомление снова стало непрочитанным
+            Notification.objects.filter(pk=rows[1].pk).update(is_read=False)
+            return atomic(*args, **kwargs)
+
+        with mock.patch('users.utils.retention.transaction.atomic', side_effect=reopen_then_atomic):
+            stats = self.purge('notifications')
+        self.assertEqual(stats['matched'], 3)
+        self.assertEqual(stats['deleted'][Notification._meta.label], 2)
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [rows[1].pk])
+
+    def test_dry_run_deletes_nothing(self):
+        for _ in range(5):
+            self.notification(timedelta(days=100))
+        # Только выборки ключей: три пачки и пустая, завершающая обход
+        with self.assertNumQueries(4):
+            stats = self.purge('notifications', batch_size=2, dry_run=True)
+        self.assertEqual((stats['matched'], stats['batches']), (5, 3))
+        self.assertFalse(stats['deleted'])
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_command(self):
+        self.notification(timedelta(days=100))
+        output = StringIO()
+        call_command('purge_data', 'notifications', '--dry-run', stdout=output)
+        self.assertIn('будет удалено 1', output.getvalue())
+        self.assertEqual(Notification.objects.count(), 1)
+
+        call_command('purge_data', 'notifications', stdout=output)
+        self.assertFalse(Notification.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command('purge_data', 'unknown', stdout=output)
+
+
+class CachedAuthenticationTests(CacheIsolatedAPITestCase):
+    """Снимок пользователя в кэше процесса сбрасывается сигналами сразу, не по USER_CACHE_TTL."""
+
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = make_user()
+        self.access = create_jwt_tokens_for_user(self.user)['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        # Первый запрос кладёт снимок в кэш
+        self.assertStatus('/profile/', 200)
+        self.assertIsNotNone(user_cache.get(self.user.pk))
+
+    def assertStatus(self, url, expected):
+        if expected < 400:
+            self.assertEqual(self.client.get(url).status_code, expected)
+            return
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(url).status_code, expected)
+
+    def change(self, update):
+        with self.captureOnCommitCallbacks(execute=True):
+            update(User.objects.get(pk=self.user.pk))
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+    def test_cache_hit_skips_user_query(self):
+        hits = user_cache.hits
+        # Периодическое обновление списка отзыва здесь не проверяется
+        with self.assertNumQueries(0), mock.patch('users.authentication.is_revoked', return_value=False):
+            self.assertEqual(CachedJWTAuthentication().authenticate(
+                mock.Mock(META={'HTTP_AUTHORIZATION': f'Bearer {self.access}'})
+            )[0].pk, self.user.pk)
+        self.assertEqual(user_cache.hits, hits + 1)
+
+    def test_deactivation_applies_on_next_request(self):
+        def deactivate(user):
+            user.is_active = False
+            user.save()
+        self.change(deactivate)
+        self.assertStatus('/profile/', 401)
+
+    def test_deletion_applies_on_next_request(self):
+        self.change(lambda user: user.delete())
+        self.assertStatus('/profile/', 401)
+
+    def test_role_change_applies_on_next_request(self):
+        url = '/schedules/attendance/export/'
+        self.assertStatus(url, 403)
+
+        def promote(user):
+            profile = user.userprofile
+            profile.role = UserRole.TRAINER
+            profile.save()
+        self.change(promote)
+        self.assertStatus(url, 200)
+
+    def test_password_change_applies_on_next_request(self):
+        # override_settings(SIMPLE_JWT) не доходит до уже импортированного api_settings
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            access = create_jwt_tokens_for_user(self.user)['access']
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+            self.assertStatus('/profile/', 200)
+
+            def change_password(user):
+                user.set_password('new-password123')
+                user.save()
+            self.change(change_password)
+            self.assertStatus('/profile/', 401)
+
+    def test_revocation_is_checked_on_cache_hit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke(AccessToken(self.access))
+        # Снимок пользователя по-прежнему в кэше, а токен уже не принимается
+        self.assertIsNotNone(user_cache.get(self.user.pk))
+        self.assertStatus('/profile/', 401)
+
+
+class IdentityMapTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user(first_name='Анна')
+        UserProfile.objects.filter(user=self.user).update(role=UserRole.TRAINER)
+
+    def test_profile_update_reuses_loaded_profile(self):
+        # Представление и сигнал сохранения пользователя берут один и тот же профиль
+        access = create_jwt_tokens_for_user(self.user)['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.put('/profile/', {'phone_number': '+79990000000', 'first_name': 'Мария'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response['X-Identity-Map-Hits'], '1')
+        self.assertEqual(UserProfile.objects.get(user=self.user).phone_number, '+79990000000')
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Мария')
+
+    def test_role_check_on_cached_principal_costs_no_queries(self):
+        principal = build_user(load_snapshot(self.user.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(has_role(principal, UserRole.TRAINER, UserRole.ADMIN))
+            self.assertFalse(has_role(principal, UserRole.ADMIN))
+
+    def test_role_check_loads_missing_profile_once(self):
+        request = mock.Mock(user=User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(1):
+            self.assertTrue(IsAdminOrTrainer().has_permission(request, None))
+            self.assertEqual(request.user.userprofile.role, UserRole.TRAINER)
+
+    def test_missing_profile_is_404(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/profile/').status_code, 404)
+            self.assertEqual(self.client.get('/schedules/join/').status_code, 404)
+
+
+class RevocationTests(CacheIsolatedTestCase):
+    def revoke_row(self, pk, jti, revoked_at=None):
+        row = RevokedToken.objects.create(
+            id=pk, jti=jti, token_type=RevokedToken.ACCESS, expires_at=timezone.now() + timedelta(hours=1)
+        )
+        if revoked_at is not None:
+            RevokedToken.objects.filter(pk=pk).update(revoked_at=revoked_at)
+        return row
+
+    def test_row_committed_behind_high_water_is_picked_up(self):
+        revocations = RevocationSet()
+        self.revoke_row(1000, 'first')
+        revocations.refresh(force=True)
+        self.assertEqual(revocations.high_water, 1000)
+
+        # id выдан давно, но строка стала видна только сейчас
+        self.revoke_row(10, 'late')
+        self.assertNotIn('late', revocations)
+        revocations.refresh(force=True)
+        self.assertIn('late', revocations)
+        self.assertIn('first', revocations)
+
+    def test_row_older_than_margin_waits_for_full_reload(self):
+        revocations = RevocationSet()
+        self.revoke_row(1000, 'first')
+        revocations.refresh(force=True)
+
+        self.revoke_row(10, 'stale', revoked_at=timezone.now() - REFRESH_MARGIN * 2)
+        revocations.refresh(force=True)
+        self.assertNotIn('stale', revocations)
+
+        revocations._next_reload = 0
+        revocations.refresh(force=True)
+        self.assertIn('stale', revocations)
+
+    def test_check_waits_for_initial_load(self):
+        revocations = RevocationSet()
+        results = []
+        revocations._lock.acquire()
+        # Другой поток уже загружает копию: проверка не должна идти по пустому множеству
+        waiter = threading.Thread(target=lambda: results.append(revocations.refresh()))
+        waiter.start()
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())
+
+        revocations.load([jti_hash('revoked')], 1)
+        revocations.refreshed_at = timezone.now()
+        revocations._next_refresh = clock.monotonic() + 60
+        revocations._lock.release()
+        waiter.join(5)
+        self.assertEqual(results, [False])
+        self.assertIn('revoked', revocations)
+
+    def test_check_skips_busy_refresh_after_initial_load(self):
+        revocations = RevocationSet()
+        revocations.refresh(force=True)
+        revocations._next_refresh = 0
+        with revocations._lock:
+            self.assertFalse(revocations.refresh())
+
+    def test_revocation_applies_in_process_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_revocation('jti-1', RevokedToken.REFRESH, timezone.now() + timedelta(days=1))
+        self.assertIn('jti-1', revoked)
+        self.assertNotIn('jti-2', revoked)
+
+    def test_many_hashes_are_merged_into_sorted_array(self):
+        revocations = RevocationSet()
+        jtis = [f'jti-{index}' for index in range(5000)]
+        for jti in jtis:
+            revocations.add(jti)
+        self.assertEqual(len(revocations), 5000)
+        self.assertTrue(all(jti in revocations for jti in jtis[::97]))
+        self.assertNotIn('other', revocations)
+
+
+class LazyRefreshTokenTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def test_access_only_writes_nothing(self):
+        token = LazyRefreshToken.for_user(self.user)
+        with self.assertNumQueries(0):
+            str(token.access_token)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_refresh_is_recorded_once_when_issued(self):
+        token = LazyRefreshToken.for_user(self.user)
+        encoded = str(token)
+        self.assertEqual(str(token), encoded)
+
+        outstanding = OutstandingToken.objects.get()
+        self.assertEqual((outstanding.jti, outstanding.token, outstanding.user), (token['jti'], encoded, self.user))
+
+    def test_refresh_and_logout_flow(self):
+        tokens = create_jwt_tokens_for_user(self.user)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+        response = self.client.post('/auth/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/auth/logout/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/profile/').status_code, 401)
+            self.client.credentials()
+            response = self.client.post('/auth/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 400, response.content)
+
+
+class EmailLookupTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('Anna.Petrova@Example.com')
+
+    def test_lookup_ignores_case_and_spaces(self):
+        self.assertEqual(get_user_by_email('  anna.petrova@EXAMPLE.com '), self.user)
+        self.assertTrue(email_taken('ANNA.PETROVA@example.com'))
+        self.assertEqual(find_user('anna.petrova@example.com'), self.user)
+        self.assertIsNone(find_user('other@example.com'))
+
+    def test_login_hashes_password_once(self):
+        encode = CalibratedPBKDF2PasswordHasher.encode
+        for email, status in (('ANNA.PETROVA@example.com', 200), ('nobody@example.com', 401)):
+            with self.subTest(email=email), \
+                    mock.patch.object(CalibratedPBKDF2PasswordHasher, 'encode', autospec=True,
+                                      side_effect=encode) as hashed, \
+                    self.assertLogs('django.request', 'WARNING') if status != 200 else nullcontext():
+                response = self.client.post('/auth/login/', {'email': email, 'password': 'password123'})
+            self.assertEqual(response.status_code, status, response.content)
+            # Неизвестный адрес стоит столько же: один холостой хэш
+            self.assertEqual(hashed.call_count, 1)
+
+    def test_lookup_uses_expression_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется на SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN SELECT id FROM auth_user WHERE LOWER(email) = %s', ['a@example.com'])
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('auth_user_email_lower', plan)
+
+    def test_case_variant_cannot_be_inserted(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_user('anna.petrova@example.com'.upper())
+        # Пустой email (createsuperuser без адреса) не ограничивается
+        User.objects.create_user(username='first', email='')
+        User.objects.create_user(username='second', email='')
+
+    def test_register_rejects_case_variant(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/auth/register/', {
+                'email': 'ANNA.PETROVA@example.com', 'password': 'password123', 'confirmPassword': 'password123',
+                'firstName': 'Анна', 'lastName': 'Петрова', 'phone_number': '+79990000000', 'birth_date': '2000-01-01',
+            })
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('email', response.content.decode())
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_migration_deduplicates_existing_emails(self):
+        migration = import_module('users.migrations.0015_user_email_lower_index')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX auth_user_email_lower_uniq')
+        stale = make_user('ANNA.PETROVA@example.com', is_active=False)
+        newer = make_user('anna.petrova@example.com')
+        User.objects.filter(pk=newer.pk).update(last_login=timezone.now())
+
+        migration.deduplicate_emails(apps, None)
+
+        emails = dict(User.objects.values_list('pk', 'email'))
+        self.assertEqual(emails[newer.pk], 'anna.petrova@example.com')
+        self.assertEqual(emails[self.user.pk], f'Anna.Petrova@example.com.duplicate-{self.user.pk}')
+        self.assertEqual(emails[stale.pk], f'ANNA.PETROVA@example.com.duplicate-{stale.pk}')
+
+
+class AuthThrottleTests(CacheIsolatedAPITestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('5/15m'), (5, 900))
+        self.assertEqual(parse_rate('30/m'), (30, 60))
+        self.assertEqual(parse_rate('2/d'), (2, 86400))
+        with self.assertRaises(ValueError):
+            parse_rate('5 per minute')
+
+    def test_bucket_allows_burst_then_refills(self):
+        key = bucket_key('login', 'a@example.com')
+        self.assertEqual(consume(key, 2, 60, now=1000), (True, 0))
+        self.assertEqual(consume(key, 2, 60, now=1000), (True, 0))
+        # Ведро пусто: следующий маркер появится через period / count
+        self.assertEqual(consume(key, 2, 60, now=1000), (False, 30))
+        self.assertEqual(consume(key, 2, 60, now=1010), (False, 20))
+        self.assertEqual(consume(key, 2, 60, now=1030), (True, 0))
+        # Отказы не сдвигают ведро и не трогают чужие ключи
+        self.assertEqual(ThrottleBucket.objects.get(key=key).tat, 1090)
+        self.assertEqual(consume(bucket_key('login', 'b@example.com'), 2, 60, now=1030), (True, 0))
+
+    @override_settings(AUTH_THROTTLE_RATES={**settings.AUTH_THROTTLE_RATES, 'ip': '100/m', 'login': '2/m'})
+    def test_login_limited_per_email(self):
+        make_user('anna@example.com')
+
+        def login(email):
+            return self.client.post('/auth/login/', {'email': email, 'password': 'wrong-password'})
+
+        with self.assertLogs('django.request', 'WARNING'):
+            statuses = [login(email).status_code for email in ('anna@example.com', 'ANNA@example.com ')]
+            blocked = login('anna@example.com')
+            other = login('boris@example.com')
+        self.assertEqual(statuses, [401, 401])
+        # Регистр и пробелы не дают новое ведро
+        self.assertEqual(blocked.status_code, 429, blocked.content)
+        self.assertGreater(int(blocked['Retry-After']), 0)
+        self.assertEqual(other.status_code, 401)
+
+    @override_settings(AUTH_THROTTLE_RATES={**settings.AUTH_THROTTLE_RATES, 'ip': '1/m'})
+    def test_ip_limit_applies_before_body(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.client.post('/auth/login/', {'email': 'a@example.com', 'password': 'x'})
+            response = self.client.post('/auth/login/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 429, response.content)
+
+    def login_from(self, forwarded_for):
+        return self.client.post(
+            '/auth/login/', {'email': 'a@example.com', 'password': 'x'}, HTTP_X_FORWARDED_FOR=forwarded_for,
+        ).status_code
+
+    @override_settings(AUTH_THROTTLE_RATES={**settings.AUTH_THROTTLE_RATES, 'ip': '1/m', 'login': '100/m'})
+    def test_forwarded_for_is_ignored_without_proxy(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            statuses = [self.login_from(address) for address in ('203.0.113.1', '203.0.113.2')]
+        self.assertEqual(statuses, [401, 429])
+
+    @override_settings(
+        AUTH_THROTTLE_RATES={**settings.AUTH_THROTTLE_RATES, 'ip': '1/m', 'login': '100/m'},
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1},
+    )
+    def test_client_address_is_taken_from_proxy(self):
+        # Прокси дописывает адрес клиента в конец: подставленные клиентом адреса не учитываются
+        with self.assertLogs('django.request', 'WARNING'):
+            statuses = [
+                self.login_from(forwarded_for)
+                for forwarded_for in ('203.0.113.1', '10.0.0.1, 203.0.113.1', '203.0.113.2')
+            ]
+        self.assertEqual(statuses, [401, 429, 401])
+
+
+class ImportClientsTests(CacheIsolatedTestCase):
+    HEADER = 'email,password,first_name,last_name,birth_date,gender,trainer,has_paid\n'
+
+    def setUp(self):
+        super().setUp()
+        self.trainer = make_trainer()
+        make_user('taken@example.com')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(text)
+        return path
+
+    def import_file(self, path, *args):
+        call_command('import_clients', path, '--workers', '1', *args, stdout=StringIO())
+
+    def read_rejects(self, path):
+        with open(path + '.rejects', newline='', encoding='utf-8') as stream:
+            return {int(row['line']): row['error'] for row in csv.DictReader(stream)}
+
+    def test_csv_import_rejects_bad_rows(self):
+        path = self.write('clients.csv', self.HEADER + '\n'.join([
+            f'Anna@Example.com,secret123,Анна,Петрова,2000-01-31,Female,{self.trainer.pk},да',
+            'boris@example.com,,Борис,,,,,',
+            'ANNA@example.com,secret123,Анна,Дубль,,,,',
+            'TAKEN@example.com,secret123,Занят,,,,,',
+            'not-an-email,secret123,,,,,,',
+            'vera@example.com,secret123,Вера,,31.01.2000,,,',
+            f'gleb@example.com,secret123,Глеб,,,,{self.trainer.pk + 100},',
+            'dina@example.com,secret123,Дина,,,,,может быть',
+            'egor@example.com,secret123,Егор,,,,,,лишнее',
+        ]) + '\n')
+
+        self.import_file(path, '--batch-size', '2')
+
+        anna = User.objects.get(username='anna@example.com')
+        self.assertTrue(anna.check_password('secret123'))
+        self.assertEqual(anna.email, 'anna@example.com')
+        self.assertEqual(anna.userprofile.trainer, self.trainer)
+        self.assertEqual(anna.userprofile.birth_date, date(2000, 1, 31))
+        self.assertTrue(anna.userprofile.has_paid)
+        # Без пароля клиент входит только через сброс пароля
+        self.assertFalse(User.objects.get(username='boris@example.com').has_usable_password())
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(UserProfile.objects.count(), 3)
+
+        rejects = self.read_rejects(path)
+        self.assertEqual(sorted(rejects), [4, 5, 6, 7, 8, 9, 10])
+        self.assertIn('повторяется', rejects[4])
+        self.assertIn('уже существует', rejects[5])
+        self.assertTrue(rejects[6].startswith('email'))
+        self.assertTrue(rejects[7].startswith('birth_date'))
+        self.assertTrue(rejects[8].startswith('trainer'))
+        self.assertTrue(rejects[9].startswith('has_paid'))
+        self.assertIn('лишние столбцы', rejects[10])
+
+    def test_jsonl_dry_run_creates_nothing(self):
+        path = self.write('clients.jsonl', '\n'.join([
+            '{"email": "anna@example.com", "password": "secret123"}',
+            '{"email": "anna@example.com"',
+            '["boris@example.com"]',
+            '',
+            '{"email": "boris@example.com", "trainer": "абв"}',
+        ]) + '\n')
+
+        self.import_file(path, '--dry-run')
+
+        self.assertFalse(User.objects.filter(username='anna@example.com').exists())
+        with open(path + '.rejects', encoding='utf-8') as stream:
+            rejects = [json.loads(line) for line in stream]
+        self.assertEqual([reject['line'] for reject in rejects], [2, 3, 5])
+        self.assertIn('неверный JSON', rejects[0]['error'])
+        self.assertEqual(rejects[2]['row'], {'email': 'boris@example.com', 'trainer': 'абв'})
+
+    def test_conflicting_row_rejected_without_losing_batch(self):
+        importer = ClientImporter(batch_size=10)
+        rows = [
+            (1, {'email': 'anna@example.com'}, None),
+            (2, {'email': 'raced@example.com'}, None),
+        ]
+        # Адрес занят между проверкой и вставкой: пачка повторяется по строкам
+        with mock.patch('users.utils.imports.existing_emails', return_value=set()):
+            make_user('raced@example.com')
+            stats = importer.run(rows)
+        self.assertEqual((stats['imported'], stats['rejected']), (1, 1))
+        self.assertTrue(User.objects.filter(username='anna@example.com', userprofile__isnull=False).exists())
+
+
+class ExportScopeTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.trainer = make_trainer('Coach@Example.com')
+        other = make_trainer('other.coach@example.com')
+        schedule = make_schedule()
+        for email, trainer in (('mine@example.com', self.trainer), ('theirs@example.com', other)):
+            profile = make_user(email).userprofile
+            UserProfile.objects.filter(pk=profile.pk).update(trainer=trainer)
+            joinclub = Joinclub.objects.create(user=profile, schedule=schedule)
+            Attendance.objects.create(joinclub=joinclub, attendance_date=date(2025, 10, 1))
+
+    def login(self, email, role):
+        user = make_user(email)
+        UserProfile.objects.filter(user=user).update(role=role)
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_trainer_exports_only_own_clients(self):
+        # Карточка тренера находится по email аккаунта без учёта регистра
+        self.login('coach@example.com', UserRole.TRAINER)
+        for url in ('/clients/export/', '/schedules/attendance/export/'):
+            with self.subTest(url=url):
+                content = self.export(url)
+                self.assertIn('mine@example.com', content)
+                self.assertNotIn('theirs@example.com', content)
+        self.assertEqual(self.client.get('/clients/').data['count'], 1)
+
+    def test_admin_role_without_staff_exports_everything(self):
+        self.login('admin@example.com', UserRole.ADMIN)
+        for url in ('/clients/export/', '/schedules/attendance/export/'):
+            with self.subTest(url=url):
+                content = self.export(url)
+                self.assertIn('mine@example.com', content)
+                self.assertIn('theirs@example.com', content)
+
+    def test_trainer_without_card_exports_nothing(self):
+        self.login('stranger@example.com', UserRole.TRAINER)
+        content = self.export('/schedules/attendance/export/')
+        self.assertEqual(content.splitlines()[1:], [])
+
+    def test_plain_user_is_forbidden(self):
+        self.login('user@example.com', UserRole.USER)
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/clients/export/')
+        self.assertEqual(response.status_code, 403)
+
+
+class ConstantQueryTests(QueryCountMixin, CacheIsolatedAPITestCase):
+    """Число запросов списка не зависит от числа строк на странице."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('admin@example.com', is_staff=True)
+        self.hall = make_hall()
+        self.club = make_club(hall=self.hall)
+        self.trainer = make_trainer()
+
+    def add_client(self, number):
+        profile = make_user(f'client{number}@example.com').userprofile
+        UserProfile.objects.filter(pk=profile.pk).update(trainer=self.trainer)
+        Review.objects.create(
+            user=profile.user, hall=self.hall, club=self.club, trainer=self.trainer, text='Отлично', rating=5,
+        )
+
+    def test_reviews(self):
+        self.client.force_authenticate(self.admin)
+        self.assertConstantQueries('/reviews/', self.add_client)
+
+    def test_clients(self):
+        self.client.force_authenticate(self.admin)
+        self.assertConstantQueries('/clients/', self.add_client)
+
+    def test_clubs(self):
+        self.assertConstantQueries('/clubs/', lambda number: make_club(f'Клуб {number}', hall=self.hall))
+
+    def test_trainers(self):
+        self.assertConstantQueries('/trainers/', lambda number: make_trainer(f'trainer{number}@example.com'))
+
+    def test_notifications(self):
+        user = make_user()
+        self.client.force_authenticate(user)
+
+        def notify(number):
+            Notification.objects.create(user=user, message=f'Оплата {number}', type='payment')
+            send_broadcast(f'Объявление {number}')
+
+        self.assertConstantQueries('/notifications/', notify)
+
+
+class PaginationTests(CacheIsolatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.hall = make_hall()
+
+    def walk(self, url):
+        """Все id списка, проходя по ссылкам next."""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_review_cursor_with_tied_created_at(self):
+        reviews = [Review.objects.create(user=self.user, hall=self.hall, text=str(n), rating=5) for n in range(5)]
+        # Одинаковое время создания: порядок и границы страниц держатся на -id
+        Review.objects.update(created_at=timezone.now())
+        expected = sorted((review.pk for review in reviews), reverse=True)
+        self.assertEqual(self.walk('/api/reviews/?page_size=2'), expected)
+
+    def test_review_cursor_ignores_rows_added_between_pages(self):
+        for n in range(4):
+            Review.objects.create(user=self.user, hall=self.hall, text=str(n), rating=5)
+        first = self.client.get('/api/reviews/?page_size=2').data
+        Review.objects.create(user=self.user, hall=self.hall, text='новый', rating=1)
+        rest = self.walk(first['next'])
+        seen = [item['id'] for item in first['results']] + rest
+        # Новый отзыв — в начале списка, страницы после курсора не сдвигаются
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_notification_cursor_with_tied_created_at(self):
+        for n in range(3):
+            Notification.objects.create(user=self.user, message=f'Оплата {n}', type='payment')
+            send_broadcast(f'Объявление {n}')
+        Notification.objects.update(created_at=timezone.now())
+        self.client.force_authenticate(self.user)
+        ids = self.walk('/notifications/?page_size=2')
+        self.assertEqual(ids, sorted(Notification.objects.values_list('pk', flat=True), reverse=True))
+
+    def test_page_number_lists(self):
+        for n in range(2):
+            make_hall(f'Зал {n}')
+        response = self.client.get('/halls/?page_size=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(self.walk('/halls/?page_size=2'), sorted(Hall.objects.values_list('pk', flat=True)))
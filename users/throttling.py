@@ -0,0 +1,111 @@
+"""
+Ограничение частоты запросов к auth-эндпоинтам.
+
+Ведро маркеров реализовано как GCRA: для ключа хранится одно число — время,
+к которому ведро «опустеет» (tat). Запрос разрешён, если после него tat
+уходит вперёд не дальше, чем на ёмкость ведра. Проверка и списание — один
+INSERT ... ON CONFLICT DO UPDATE ... WHERE в общей БД, поэтому лимиты общие
+для всех воркеров gunicorn и для всех серверов.
+"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.throttling import BaseThrottle
+
+from .models import ThrottleBucket
+from .utils.accounts import normalize_email
+
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/15m' -> (5, 900): не больше 5 запросов за 15 минут."""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Неверный формат лимита: {rate!r}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def _consume_sql():
+    table = connection.ops.quote_name(ThrottleBucket._meta.db_table)
+    key = connection.ops.quote_name('key')
+    # next_tat = max(tat, now) + interval; разрешено, если next_tat <= now + period
+    return (
+        f"INSERT INTO {table} ({key}, tat) VALUES (%s, %s) "
+        f"ON CONFLICT ({key}) DO UPDATE SET "
+        f"tat = (CASE WHEN {table}.tat > %s THEN {table}.tat ELSE %s END) + %s "
+        f"WHERE (CASE WHEN {table}.tat > %s THEN {table}.tat ELSE %s END) + %s <= %s "
+        f"RETURNING tat"
+    )
+
+
+def consume(key, count, period, now=None):
+    """
+    Списывает один маркер с ведра `key` (ёмкость count, пополнение count за period).
+    Возвращает (разрешено, через сколько секунд повторить).
+    """
+    now = time.time() if now is None else now
+    interval = period / count
+    limit = now + period
+    with connection.cursor() as cursor:
+        cursor.execute(_consume_sql(), [
+            key, now + interval,
+            now, now, interval,
+            now, now, interval, limit,
+        ])
+        if cursor.fetchone() is not None:
+            return True, 0
+        # Отказ ничего не пишет; время ожидания — по текущему состоянию ведра
+        tat = ThrottleBucket.objects.filter(key=key).values_list('tat', flat=True).first()
+    wait = (max(tat, now) + interval - limit) if tat is not None else interval
+    return False, max(wait, 0)
+
+
+def bucket_key(scope, value):
+    # В таблице — хэш, а не сам IP или email
+    return f"{scope}:{hashlib.sha1(value.encode()).hexdigest()}"
+
+
+class AuthThrottle(BaseThrottle):
+    """
+    Лимиты из settings.AUTH_THROTTLE_RATES по правилам представления
+    `auth_throttle`, например ('ip', 'login').
+
+    'ip' проверяется первым и не читает тело запроса, поэтому массовые запросы
+    отбиваются до разбора JSON. Остальные scope считаются по email из тела
+    (поле email или username) и проверяются до валидации сериализатора.
+    """
+
+    def __init__(self):
+        self._wait = None
+
+    def get_identity(self, scope, request):
+        if scope == 'ip':
+            return self.get_ident(request)
+        data = request.data
+        if not hasattr(data, 'get'):
+            return None
+        email = data.get('email') or data.get('username')
+        if not isinstance(email, str):
+            return None
+        return normalize_email(email) or None
+
+    def allow_request(self, request, view):
+        rates = settings.AUTH_THROTTLE_RATES
+        for scope in getattr(view, 'auth_throttle', ('ip',)):
+            identity = self.get_identity(scope, request)
+            if identity is None:
+                continue
+            allowed, wait = consume(bucket_key(scope, identity), *parse_rate(rates[scope]))
+            if not allowed:
+                self._wait = wait
+                return False
+        return True
+
+    def wait(self):
+        return self._wait
@@ -7,8 +7,8 @@ from .views import (
     HallViewSet, ClubViewSet, TrainerViewSet, AdViewSet,
     ReviewViewSet, NotificationViewSet,
     ForgotPasswordView, ResetPasswordView, ResendCodeView,
-    ClassScheduleView, JoinclubView, AttendanceView, GetRoleTokenView,
-    MyLoginView,
+    ClassScheduleView, HallFreeWindowsView, JoinclubView, AttendanceView, AttendanceMarkView, AttendanceExportView, GetRoleTokenView,
+    MyLoginView, RefreshTokenView, LogoutView, JWKSView,
 )
 
 router = DefaultRouter()
@@ -26,14 +26,20 @@ urlpatterns = [
         path('register/', RegisterView.as_view(), name='register'),
         path('verify-code/', VerifyCodeView.as_view(), name='verify_code'),
         path('login/', LoginView.as_view(), name='login'),
+        path('refresh/', RefreshTokenView.as_view(), name='token_refresh'),
+        path('logout/', LogoutView.as_view(), name='logout'),
+        path('jwks/', JWKSView.as_view(), name='jwks'),
         path('forgot-password/', ForgotPasswordView.as_view(), name='forgot_password'),
         path('reset-password/', ResetPasswordView.as_view(), name='reset_password'),
         path('resend-code/', ResendCodeView.as_view(), name='resend_code'),
     ])),
     path('schedules/', include([
         path('', ClassScheduleView.as_view(), name='class_schedule'),
+        path('free-windows/', HallFreeWindowsView.as_view(), name='hall_free_windows'),
         path('join/', JoinclubView.as_view(), name='joinclub'),
         path('attendance/', AttendanceView.as_view(), name='attendance_view'),
+        path('attendance/mark/', AttendanceMarkView.as_view(), name='attendance_mark'),
+        path('attendance/export/', AttendanceExportView.as_view(), name='attendance_export'),
     ])),
     path('', include(router.urls)),
     path('profile/', UserProfileViewSet.as_view({'get': 'retrieve', 'put': 'update'}), name='profile'),
@@ -0,0 +1,56 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+
+
+def normalize_email(email):
+    """Email для сравнения и хранения: без пробелов по краям и в нижнем регистре."""
+    return (email or '').strip().lower()
+
+
+def users_by_email(email):
+    """
+    Пользователи с этим email без учёта регистра. Условие LOWER(email) = %s
+    совпадает с выражением индекса auth_user_email_lower_idx (миграция 0015),
+    поэтому поиск идёт по индексу, а не полным просмотром таблицы.
+    """
+    return User.objects.annotate(email_lower=Lower('email')).filter(email_lower=normalize_email(email))
+
+
+def get_user_by_email(email):
+    """User по email без учёта регистра; User.DoesNotExist, если такого нет."""
+    return users_by_email(email).get()
+
+
+def email_taken(email):
+    return users_by_email(email).exists()
+
+
+def find_user(login):
+    """Пользователь по email (без учёта регистра) или username; None, если нет."""
+    if '@' in login:
+        try:
+            return get_user_by_email(login)
+        except User.DoesNotExist:
+            pass
+    try:
+        return User._default_manager.get_by_natural_key(login)
+    except User.DoesNotExist:
+        return None
+
+
+def check_credentials(login, password):
+    """
+    Единственная проверка пароля при входе: поиск по индексу и ровно один хэш.
+    Для неизвестного логина считается холостой хэш той же стоимости, чтобы
+    время ответа не выдавало, зарегистрирован ли адрес. Если параметры хэшера
+    изменились, check_password пересохраняет пароль с новыми.
+    Активность аккаунта не проверяется — это решает вызывающий код.
+    """
+    user = find_user(login)
+    if user is None:
+        make_password(password)
+        return None
+    if not user.check_password(password):
+        return None
+    return user
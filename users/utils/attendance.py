@@ -0,0 +1,143 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from users.models import Attendance, Joinclub
+
+# Окно сводки посещаемости по умолчанию (дней)
+DEFAULT_WINDOW_DAYS = 30
+
+
+def attendance_window(days=None, date_from=None, date_to=None):
+    """
+    Возвращает (date_from, date_to) для сводки.
+    Явный диапазон имеет приоритет, иначе берутся последние `days` дней.
+    """
+    if date_from is None and date_to is None:
+        days = DEFAULT_WINDOW_DAYS if days is None else days
+        date_from = timezone.localdate() - timedelta(days=days)
+    return date_from, date_to
+
+
+def _empty_summary():
+    return {'present': 0, 'absent': 0, 'total': 0}
+
+
+def _window_filter(prefix, date_from, date_to):
+    lookup = {}
+    if date_from is not None:
+        lookup[f'{prefix}attendance_date__gte'] = date_from
+    if date_to is not None:
+        lookup[f'{prefix}attendance_date__lte'] = date_to
+    return Q(**lookup)
+
+
+def summarize_attendance(joinclubs, days=None, date_from=None, date_to=None):
+    """
+    Сводка посещаемости для набора записей одним агрегирующим запросом.
+
+    `joinclubs` — queryset Joinclub, список объектов или их id.
+    Возвращает {joinclub_id: {'present': N, 'absent': N, 'total': N}};
+    для записей без посещений в окне возвращаются нули.
+    """
+    date_from, date_to = attendance_window(days, date_from, date_to)
+
+    if isinstance(joinclubs, QuerySet):
+        scope = Q(joinclub__in=joinclubs.values('pk'))
+    else:
+        ids = [getattr(joinclub, 'pk', joinclub) for joinclub in joinclubs]
+        if not ids:
+            return defaultdict(_empty_summary)
+        scope = Q(joinclub_id__in=ids)
+
+    rows = (
+        Attendance.objects.filter(scope, _window_filter('', date_from, date_to))
+        .values('joinclub_id')
+        .annotate(
+            present=Count('id', filter=Q(is_present=True)),
+            absent=Count('id', filter=Q(is_present=False)),
+        )
+        .order_by()
+    )
+
+    summaries = defaultdict(_empty_summary)
+    for row in rows:
+        summaries[row['joinclub_id']] = {
+            'present': row['present'],
+            'absent': row['absent'],
+            'total': row['present'] + row['absent'],
+        }
+    return summaries
+
+
+def with_attendance_summary(queryset, days=None, date_from=None, date_to=None):
+    """
+    Аннотирует queryset Joinclub полями attendance_present и attendance_absent
+    (для админки и отчётов, где нужен сам queryset, а не словарь).
+    """
+    date_from, date_to = attendance_window(days, date_from, date_to)
+    window = _window_filter('attendance__', date_from, date_to)
+    return queryset.annotate(
+        attendance_present=Count('attendance', filter=window & Q(attendance__is_present=True)),
+        attendance_absent=Count('attendance', filter=window & Q(attendance__is_present=False)),
+    )
+
+
+def session_summary(schedule, date):
+    """
+    Итог одного занятия за дату: записано, присутствовало, отсутствовало, не отмечено.
+    Считается одним запросом по записям расписания.
+    """
+    on_date = Q(attendance__attendance_date=date)
+    counts = Joinclub.objects.filter(schedule=schedule).aggregate(
+        enrolled=Count('id', distinct=True),
+        present=Count('attendance', filter=on_date & Q(attendance__is_present=True)),
+        absent=Count('attendance', filter=on_date & Q(attendance__is_present=False)),
+    )
+    marked = counts['present'] + counts['absent']
+    return {
+        'schedule_id': schedule.pk,
+        'date': date,
+        'enrolled': counts['enrolled'],
+        'present': counts['present'],
+        'absent': counts['absent'],
+        'total': marked,
+        'unmarked': max(counts['enrolled'] - marked, 0),
+    }
+
+
+def mark_attendance(schedule, date, entries):
+    """
+    Отмечает посещаемость всей группы одной транзакцией.
+
+    `entries` — список словарей {'joinclub': id, 'is_present': bool, 'notes': str}.
+    Отметки вставляются пачкой с ON CONFLICT (joinclub, attendance_date) DO UPDATE,
+    поэтому повторная отправка перезаписывает прежние строки. Заметка
+    перезаписывается, только если ключ 'notes' передан: иначе прежняя сохраняется.
+    """
+    with_notes, without_notes = [], []
+    for entry in entries:
+        row = Attendance(
+            joinclub_id=entry['joinclub'],
+            attendance_date=date,
+            is_present=entry.get('is_present', True),
+            notes=entry.get('notes'),
+        )
+        (with_notes if 'notes' in entry else without_notes).append(row)
+
+    with transaction.atomic():
+        # Для ON CONFLICT список обновляемых столбцов общий на запрос — две пачки
+        for rows, update_fields in ((with_notes, ['is_present', 'notes']), (without_notes, ['is_present'])):
+            if rows:
+                Attendance.objects.bulk_create(
+                    rows,
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=['joinclub', 'attendance_date'],
+                    update_fields=update_fields,
+                )
+        return session_summary(schedule, date)
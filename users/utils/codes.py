@@ -1,9 +1,36 @@
 import random
 
-def generate_and_send_code(user):
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .accounts import get_user_by_email
+
+CODE_SUBJECTS = {
+    'verify': 'Код подтверждения SportHub',
+    'reset': 'Код для сброса пароля SportHub',
+}
+
+
+def generate_and_send_code(user, purpose='verify'):
     """
-    Генерирует 6-значный код и отправляет пользователю (пока просто выводим в консоль).
+    Генерирует 4-значный код, сохраняет его и ставит письмо в outbox.
+    SMTP в запросе не используется: письмо отправит воркер send_outbox.
+    `user` — объект User или email.
     """
-    code = str(random.randint(100000, 999999))
-    print(f"Код для {user.email if hasattr(user, 'email') else user}: {code}")
+    # users.models импортирует users.utils, поэтому модели берутся при вызове
+    from users.models import PasswordResetCode
+    from users.utils.mail import enqueue_email
+
+    if not isinstance(user, User):
+        user = get_user_by_email(user)
+
+    code = f"{random.randint(1000, 9999)}"
+    with transaction.atomic():
+        PasswordResetCode.objects.filter(user=user, is_used=False).update(is_used=True)
+        PasswordResetCode.objects.create(user=user, code=code)
+        enqueue_email(
+            to=user.email,
+            subject=CODE_SUBJECTS[purpose],
+            body=f"Ваш код: {code}\n\nКод действителен 10 минут.",
+        )
     return code
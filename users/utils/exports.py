@@ -0,0 +1,162 @@
+"""
+Потоковые выгрузки клиентов и посещаемости в CSV и JSONL.
+
+Строки читаются через values_list(...).iterator(chunk_size=...) — в
+PostgreSQL это серверный курсор, — и сразу превращаются в текст кусками по
+ROWS_PER_CHUNK строк. Ни queryset, ни ответ целиком в памяти не собираются,
+поэтому память постоянна при любом числе строк, а первые байты уходят
+клиенту сразу (заголовок CSV — ещё до запроса к базе).
+"""
+import csv
+import io
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+
+from users.models import Attendance, Joinclub, UserProfile
+
+# Строк, которые БД отдаёт за одно обращение к курсору
+EXPORT_CHUNK_SIZE = 2000
+# Строк в одном куске ответа
+ROWS_PER_CHUNK = 500
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Столбцы клиентов совпадают с полями import_clients: выгрузку можно загрузить обратно
+CLIENT_COLUMNS = (
+    ('id', 'id'),
+    ('email', 'user__email'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('phone_number', 'phone_number'),
+    ('birth_date', 'birth_date'),
+    ('gender', 'gender'),
+    ('address', 'address'),
+    ('sport', 'sport'),
+    ('trainer', 'trainer_id'),
+    ('trainer_first_name', 'trainer__first_name'),
+    ('trainer_last_name', 'trainer__last_name'),
+    ('has_paid', 'has_paid'),
+    ('is_active', 'user__is_active'),
+    ('date_joined', 'user__date_joined'),
+)
+
+ATTENDANCE_COLUMNS = (
+    ('id', 'id'),
+    ('date', 'attendance_date'),
+    ('is_present', 'is_present'),
+    ('notes', 'notes'),
+    ('client', 'joinclub__user_id'),
+    ('email', 'joinclub__user__user__email'),
+    ('first_name', 'joinclub__user__user__first_name'),
+    ('last_name', 'joinclub__user__user__last_name'),
+    ('trainer', 'joinclub__user__trainer_id'),
+    ('schedule', 'joinclub__schedule_id'),
+    ('schedule_title', 'joinclub__schedule__title'),
+    ('club', 'joinclub__schedule__club_id'),
+    ('club_title', 'joinclub__schedule__club__title'),
+)
+
+
+def filter_clients(queryset, club=None, trainer=None, date_from=None, date_to=None):
+    """
+    Клиенты, записанные на занятия клуба, закреплённые за тренером и
+    зарегистрированные в диапазоне дат (включительно).
+    """
+    if club is not None:
+        # EXISTS вместо JOIN: клиент с несколькими занятиями клуба не дублируется
+        queryset = queryset.filter(Exists(
+            Joinclub.objects.filter(user=OuterRef('pk'), schedule__club_id=club)
+        ))
+    if trainer is not None:
+        queryset = queryset.filter(trainer_id=trainer)
+    if date_from is not None:
+        queryset = queryset.filter(user__date_joined__date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(user__date_joined__date__lte=date_to)
+    return queryset
+
+
+def filter_attendance(queryset, club=None, trainer=None, date_from=None, date_to=None):
+    """Отметки по занятиям клуба, по клиентам тренера и за диапазон дат (включительно)."""
+    if club is not None:
+        queryset = queryset.filter(joinclub__schedule__club_id=club)
+    if trainer is not None:
+        queryset = queryset.filter(joinclub__user__trainer_id=trainer)
+    if date_from is not None:
+        queryset = queryset.filter(attendance_date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(attendance_date__lte=date_to)
+    return queryset
+
+
+class Export:
+    def __init__(self, name, model, columns, apply_filters, ordering):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.apply_filters = apply_filters
+        self.ordering = ordering
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def rows(self, queryset=None, **filters):
+        """Ленивый поток кортежей значений; запрос выполняется при первой итерации."""
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        queryset = self.apply_filters(queryset, **filters)
+        # select_related/only исходного queryset не нужны: values_list сам делает JOIN
+        return (
+            queryset.select_related(None).order_by(*self.ordering)
+            .values_list(*(lookup for _, lookup in self.columns))
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+
+
+EXPORTS = {
+    'clients': Export('clients', UserProfile, CLIENT_COLUMNS, filter_clients, ('id',)),
+    'attendance': Export(
+        'attendance', Attendance, ATTENDANCE_COLUMNS, filter_attendance, ('attendance_date', 'id'),
+    ),
+}
+
+
+def _chunks(rows):
+    while True:
+        chunk = list(islice(rows, ROWS_PER_CHUNK))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_csv(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield buffer.getvalue()
+    for chunk in _chunks(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def render_jsonl(headers, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in _chunks(rows):
+        yield ''.join(encoder.encode(dict(zip(headers, row))) + '\n' for row in chunk)
+
+
+RENDERERS = {'csv': render_csv, 'jsonl': render_jsonl}
+
+
+def stream_export(name, fmt, queryset=None, **filters):
+    """Генератор текста выгрузки `name` в формате fmt ('csv' или 'jsonl')."""
+    export = EXPORTS[name]
+    return RENDERERS[fmt](export.headers, export.rows(queryset, **filters))
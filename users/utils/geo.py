@@ -0,0 +1,165 @@
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+# Точность geohash, хранимая в БД (12 символов ≈ 4 см)
+GEOHASH_PRECISION = 12
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Кодирует координаты в geohash заданной длины."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            middle = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= middle:
+                bits = (bits << 1) | 1
+                lon_range[0] = middle
+            else:
+                bits <<= 1
+                lon_range[1] = middle
+        else:
+            middle = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= middle:
+                bits = (bits << 1) | 1
+                lat_range[0] = middle
+            else:
+                bits <<= 1
+                lat_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Размер ячейки geohash в градусах: (широта, долгота)."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def decode_geohash(geohash):
+    """Центр ячейки geohash: (широта, долгота)."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            middle = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = middle
+            else:
+                target[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def neighbours(geohash):
+    """Ячейка и восемь соседних ячеек той же точности."""
+    precision = len(geohash)
+    latitude, longitude = decode_geohash(geohash)
+    lat_step, lon_step = cell_size(precision)
+    cells = set()
+    for dlat in (-lat_step, 0, lat_step):
+        for dlon in (-lon_step, 0, lon_step):
+            lat = max(min(latitude + dlat, 90.0), -90.0)
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return cells
+
+
+def coverage_km(latitude, precision):
+    """
+    Радиус вокруг точки, гарантированно покрытый блоком 3×3 ячеек данной точности:
+    точка лежит в центральной ячейке, значит соседние выходят от неё минимум на одну ячейку.
+    """
+    lat_step, lon_step = cell_size(precision)
+    return min(lat_step * KM_PER_DEGREE, lon_step * KM_PER_DEGREE * math.cos(math.radians(latitude)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cells(queryset, latitude, longitude, precision):
+    """Объекты в блоке 3×3 ячеек вокруг точки (precision 0 — все с координатами)."""
+    located = queryset.filter(geohash__isnull=False)
+    if precision == 0:
+        return located
+    cells = neighbours(encode_geohash(latitude, longitude, precision))
+    # geohash__startswith — префиксный диапазон по индексу geohash
+    return located.filter(reduce(or_, (Q(geohash__startswith=cell) for cell in cells)))
+
+
+def _candidates(queryset, latitude, longitude, precision):
+    return list(_cells(queryset, latitude, longitude, precision))
+
+
+def _with_distance(objects, latitude, longitude):
+    for obj in objects:
+        obj.distance_km = haversine_km(latitude, longitude, obj.latitude, obj.longitude)
+    return sorted(objects, key=lambda obj: obj.distance_km)
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Объекты не дальше radius_km, по возрастанию расстояния.
+    Предварительный отбор — 9 ячеек geohash самой мелкой точности, покрывающей радиус.
+    """
+    precision = 0
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        if coverage_km(latitude, candidate) >= radius_km:
+            precision = candidate
+            break
+    objects = _with_distance(_candidates(queryset, latitude, longitude, precision), latitude, longitude)
+    return [obj for obj in objects if obj.distance_km <= radius_km]
+
+
+def nearest(queryset, latitude, longitude, limit=20, radius_km=None):
+    """
+    Ближайшие `limit` объектов (необязательно в пределах radius_km).
+    Блок 3×3 ячеек укрупняется, пока в гарантированно покрытом радиусе
+    не окажется `limit` объектов, затем кандидаты сортируются по точному расстоянию.
+    На каждом шаге сначала считается число кандидатов (по индексу), а строки
+    загружаются только когда их хватает; если объектов с координатами не больше
+    limit или блок уже содержит их все, ответ точен без дальнейшего укрупнения.
+    """
+    if radius_km is not None:
+        return within_radius(queryset, latitude, longitude, radius_km)[:limit]
+
+    located = _cells(queryset, latitude, longitude, 0).count()
+    if located > limit:
+        for precision in range(8, 0, -1):
+            cells = _cells(queryset, latitude, longitude, precision)
+            found = cells.count()
+            if found < limit:
+                continue
+            objects = _with_distance(list(cells), latitude, longitude)
+            if found == located or objects[limit - 1].distance_km <= coverage_km(latitude, precision):
+                return objects[:limit]
+    return _with_distance(_candidates(queryset, latitude, longitude, 0), latitude, longitude)[:limit]
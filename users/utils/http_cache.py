@@ -0,0 +1,182 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# Кэш ответов публичного каталога. Ключ ответа включает номера версий моделей,
+# от которых он зависит; сигналы моделей увеличивают версию, и старые ключи
+# просто перестают запрашиваться (и вытесняются по таймауту).
+VERSION_KEY = 'http_cache:version:{}'
+RESPONSE_KEY = 'http_cache:response:{}:{}:{}'
+STATS_KEY = 'http_cache:stats:{}:{}'
+RESPONSE_TIMEOUT = 60 * 60 * 24
+
+OUTCOMES = ('hit', 'miss', 'not_modified')
+# Как часто процесс сбрасывает свои счётчики в общий кэш (секунды)
+STATS_FLUSH_INTERVAL = 10
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+# Пространства имён вьюсетов с кэшем — для отчёта по статистике
+NAMESPACES = set()
+
+
+def _version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def model_versions(models):
+    """Текущие версии моделей одним обращением к кэшу."""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # Начальное значение — время: после очистки кэша версии не повторяются
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions[key] for key in keys]
+
+
+def _bump(models):
+    for model in models:
+        key = _version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_version(*models):
+    """
+    Увеличивает версии моделей после фиксации транзакции: до неё читатели
+    видят старые данные и должны кэшировать их под старой версией.
+    """
+    transaction.on_commit(lambda: _bump(models))
+
+
+def record(namespace, outcome):
+    """
+    Счётчики копятся в памяти процесса и сбрасываются в общий кэш не чаще
+    раза в STATS_FLUSH_INTERVAL секунд: попадание не должно стоить двух записей
+    в кэш. Отчёт из другого процесса отстаёт не больше чем на этот интервал.
+    """
+    with _pending_lock:
+        _pending[namespace, outcome] += 1
+        due = time.monotonic() - _flushed_at >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Добавляет накопленные в процессе счётчики в общий кэш."""
+    global _flushed_at
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _flushed_at = time.monotonic()
+    for (namespace, outcome), count in pending.items():
+        key = STATS_KEY.format(namespace, outcome)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            pass
+
+
+def cache_stats(reset=False):
+    """{namespace: {'hit': N, 'miss': N, 'not_modified': N, 'hit_ratio': float}}"""
+    flush_stats()
+    keys = [STATS_KEY.format(namespace, outcome) for namespace in sorted(NAMESPACES) for outcome in OUTCOMES]
+    values = cache.get_many(keys)
+    stats = {}
+    for namespace in sorted(NAMESPACES):
+        row = {outcome: values.get(STATS_KEY.format(namespace, outcome), 0) for outcome in OUTCOMES}
+        served = row['hit'] + row['not_modified']
+        total = served + row['miss']
+        row['hit_ratio'] = served / total if total else 0.0
+        stats[namespace] = row
+    if reset:
+        cache.delete_many(keys)
+    return stats
+
+
+def compute_etag(data):
+    """Сильный ETag: хэш сериализованного JSON-представления."""
+    return '"{}"'.format(hashlib.sha1(JSONRenderer().render(data)).hexdigest())
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    return '*' in candidates or any(value.removeprefix('W/') == etag for value in candidates)
+
+
+class CachedResponseMixin:
+    """
+    Кэширует ответы list/retrieve вьюсета по схеме, хосту, пути, параметрам запроса и версиям
+    моделей из cache_models. If-None-Match с актуальным ETag получает 304
+    без обращения к БД. Ответы одинаковы для всех пользователей, поэтому
+    примешивается только к публичным вьюсетам.
+    """
+    cache_namespace = None
+    cache_models = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.cache_namespace:
+            NAMESPACES.add(cls.cache_namespace)
+
+    def get_cache_models(self):
+        return self.cache_models
+
+    def get_response_cache_key(self, request):
+        query = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+        # Ссылки пагинации next/previous абсолютные: схема и хост — часть ответа
+        origin = (request.scheme, request.get_host())
+        fingerprint = hashlib.sha1(repr((origin, request.path, query)).encode()).hexdigest()
+        versions = '.'.join(str(version) for version in model_versions(self.get_cache_models()))
+        return RESPONSE_KEY.format(self.cache_namespace, fingerprint, versions)
+
+    def cached_response(self, request, render):
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        outcome = 'hit'
+        if entry is None:
+            response = render()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {'data': response.data, 'etag': compute_etag(response.data)}
+            cache.set(key, entry, RESPONSE_TIMEOUT)
+            outcome = 'miss'
+
+        if etag_matches(request, entry['etag']):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            outcome = 'not_modified' if outcome == 'hit' else outcome
+        elif outcome == 'hit':
+            response = Response(entry['data'])
+
+        record(self.cache_namespace, outcome)
+        response['ETag'] = entry['etag']
+        response['X-Cache'] = 'MISS' if outcome == 'miss' else 'HIT'
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,307 @@
+"""
+Массовый импорт клиентов из CSV или JSONL.
+
+Строки читаются потоком и обрабатываются пачками: проверка, хэширование
+паролей в пуле процессов, затем bulk_create пользователей и их профилей в
+одной транзакции на пачку. bulk_create не отправляет post_save, поэтому
+профиль создаётся здесь же, а не сигналом create_or_save_user_profile
+(остальные обработчики post_save пользователя для новых строк ничего не делают).
+"""
+import csv
+import json
+import time
+from datetime import date
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from users.models import UserProfile, Trainer
+from users.utils.accounts import normalize_email
+
+# Пачка по умолчанию: строк на одну транзакцию
+DEFAULT_BATCH_SIZE = 1000
+
+USER_FIELDS = ('first_name', 'last_name')
+PROFILE_FIELDS = ('phone_number', 'address', 'sport')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'нет'}
+
+
+class RowError(Exception):
+    """Строку нельзя импортировать; текст попадает в файл отказов."""
+
+
+def detect_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Строки файла по одной: (номер строки, dict, ошибка разбора или None).
+    CSV — с заголовком, JSONL — один объект на строку.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Лишние ячейки без заголовка DictReader кладёт под ключ None
+            extra = row.pop(None, None)
+            yield reader.line_num, row, 'лишние столбцы без заголовка' if extra else None
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, {'raw': line.rstrip('\n')}, f'неверный JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield number, {'raw': line.rstrip('\n')}, 'ожидался JSON-объект'
+            continue
+        yield number, row, None
+
+
+def _text(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def _check_length(model, name, value):
+    max_length = model._meta.get_field(name).max_length
+    if max_length and len(value) > max_length:
+        raise RowError(f'{name}: длиннее {max_length} символов')
+    return value
+
+
+def _gender(value):
+    if not value:
+        return None
+    for stored, label in UserProfile._meta.get_field('gender').choices:
+        if value.lower() in (stored.lower(), label.lower()):
+            return stored
+    raise RowError(f'gender: неизвестное значение {value!r}')
+
+
+def _boolean(value, name):
+    lowered = value.lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    raise RowError(f'{name}: ожидалось да/нет, получено {value!r}')
+
+
+def clean_row(row, trainer_ids):
+    """Проверяет и приводит строку файла к полям User и UserProfile."""
+    email = normalize_email(_text(row, 'email'))
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError(f'email: неверный адрес {email!r}')
+    _check_length(User, 'username', email)
+
+    cleaned = {'email': email, 'password': _text(row, 'password') or None}
+    for name in USER_FIELDS:
+        cleaned[name] = _check_length(User, name, _text(row, name))
+    for name in PROFILE_FIELDS:
+        cleaned[name] = _check_length(UserProfile, name, _text(row, name)) or None
+
+    birth_date = _text(row, 'birth_date')
+    try:
+        cleaned['birth_date'] = date.fromisoformat(birth_date) if birth_date else None
+    except ValueError:
+        raise RowError(f'birth_date: ожидалась дата ГГГГ-ММ-ДД, получено {birth_date!r}')
+
+    cleaned['gender'] = _gender(_text(row, 'gender'))
+    cleaned['has_paid'] = _boolean(_text(row, 'has_paid'), 'has_paid')
+    is_active = _text(row, 'is_active')
+    # Импортированные клиенты по умолчанию активны: код подтверждения им не отправляется
+    cleaned['is_active'] = _boolean(is_active, 'is_active') if is_active else True
+
+    trainer = _text(row, 'trainer')
+    if trainer:
+        if not trainer.isdigit() or int(trainer) not in trainer_ids:
+            raise RowError(f'trainer: тренер {trainer!r} не найден')
+        cleaned['trainer_id'] = int(trainer)
+    else:
+        cleaned['trainer_id'] = None
+    return cleaned
+
+
+def existing_emails(emails):
+    """Какие из адресов уже заняты (email без учёта регистра или username)."""
+    found = (
+        User.objects.annotate(email_lower=Lower('email'))
+        .filter(Q(email_lower__in=emails) | Q(username__in=emails))
+        .values_list('email_lower', 'username')
+    )
+    return {value for pair in found for value in pair} & set(emails)
+
+
+def setup_worker():
+    # При spawn/forkserver дочерний процесс начинает без настроенного Django
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def hash_passwords(passwords, executor=None, workers=1):
+    """
+    Хэши паролей в исходном порядке. Пустой пароль — непригодный для входа
+    хэш (клиент задаст пароль через «забыли пароль»), его считать не нужно.
+    """
+    plain = [password for password in passwords if password]
+    if executor is None:
+        hashed = iter([make_password(password) for password in plain])
+    else:
+        chunksize = max(1, len(plain) // (workers * 4))
+        hashed = executor.map(make_password, plain, chunksize=chunksize)
+    return [next(hashed) if password else make_password(None) for password in passwords]
+
+
+def _users(rows):
+    return [
+        User(
+            username=row['email'],
+            email=row['email'],
+            password=row['password'],
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            is_active=row['is_active'],
+        )
+        for row in rows
+    ]
+
+
+def _profiles(users, rows):
+    return [
+        UserProfile(
+            user=user,
+            trainer_id=row['trainer_id'],
+            phone_number=row['phone_number'],
+            birth_date=row['birth_date'],
+            gender=row['gender'],
+            address=row['address'],
+            sport=row['sport'],
+            has_paid=row['has_paid'],
+        )
+        for user, row in zip(users, rows)
+    ]
+
+
+def insert_clients(rows):
+    """
+    Создаёт пользователей и профили пачки одной транзакцией.
+    Возвращает список (строка, текст ошибки) для строк, которые не вставились.
+    """
+    try:
+        with transaction.atomic():
+            # Первичные ключи возвращаются из bulk_create (RETURNING в PostgreSQL и SQLite)
+            users = User.objects.bulk_create(_users(rows))
+            UserProfile.objects.bulk_create(_profiles(users, rows))
+        return []
+    except IntegrityError:
+        pass
+    # Адрес заняли параллельно (регистрация между проверкой и вставкой):
+    # пачка повторяется по одной строке, чтобы отбросить только конфликтующие
+    failed = []
+    for row in rows:
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create(_users([row]))
+                UserProfile.objects.bulk_create(_profiles(users, [row]))
+        except IntegrityError as e:
+            failed.append((row, f'конфликт при вставке: {e}'))
+    return failed
+
+
+class ClientImporter:
+    """
+    Импорт потока строк read_rows пачками по batch_size. Отказы передаются в
+    on_reject(номер строки, исходная строка, причина), после каждой пачки
+    вызывается on_batch(stats).
+    """
+
+    def __init__(self, batch_size=None, executor=None, workers=1, dry_run=False,
+                 on_reject=None, on_batch=None):
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.executor = executor
+        self.workers = workers
+        self.dry_run = dry_run
+        self.on_reject = on_reject or (lambda number, row, reason: None)
+        self.on_batch = on_batch or (lambda stats: None)
+        self.trainer_ids = set(Trainer.objects.values_list('id', flat=True))
+        self.seen = set()
+        self.stats = {
+            'read': 0, 'imported': 0, 'rejected': 0,
+            'hash_seconds': 0.0, 'insert_seconds': 0.0, 'seconds': 0.0,
+        }
+
+    def reject(self, number, row, reason):
+        self.stats['rejected'] += 1
+        self.on_reject(number, row, reason)
+
+    def run(self, records):
+        started = time.monotonic()
+        batch = []
+        for number, row, error in records:
+            self.stats['read'] += 1
+            if error:
+                self.reject(number, row, error)
+                continue
+            try:
+                cleaned = clean_row(row, self.trainer_ids)
+            except RowError as e:
+                self.reject(number, row, str(e))
+                continue
+            if cleaned['email'] in self.seen:
+                self.reject(number, row, 'email: повторяется в файле')
+                continue
+            self.seen.add(cleaned['email'])
+            batch.append((number, row, cleaned))
+            if len(batch) >= self.batch_size:
+                self.flush(batch, started)
+                batch = []
+        if batch:
+            self.flush(batch, started)
+        self.stats['seconds'] = time.monotonic() - started
+        return self.stats
+
+    def flush(self, batch, started):
+        taken = existing_emails([cleaned['email'] for _, _, cleaned in batch])
+        fresh = []
+        for number, row, cleaned in batch:
+            if cleaned['email'] in taken:
+                self.reject(number, row, 'email: пользователь уже существует')
+            else:
+                fresh.append((number, row, cleaned))
+
+        if fresh and not self.dry_run:
+            moment = time.monotonic()
+            hashes = hash_passwords(
+                [cleaned['password'] for _, _, cleaned in fresh], self.executor, self.workers
+            )
+            for (_, _, cleaned), hashed in zip(fresh, hashes):
+                cleaned['password'] = hashed
+            self.stats['hash_seconds'] += time.monotonic() - moment
+
+            moment = time.monotonic()
+            failed = insert_clients([cleaned for _, _, cleaned in fresh])
+            self.stats['insert_seconds'] += time.monotonic() - moment
+            if failed:
+                by_email = {cleaned['email']: (number, row) for number, row, cleaned in fresh}
+                for cleaned, reason in failed:
+                    self.reject(*by_email[cleaned['email']], reason)
+            self.stats['imported'] += len(fresh) - len(failed)
+        elif self.dry_run:
+            self.stats['imported'] += len(fresh)
+
+        self.stats['seconds'] = time.monotonic() - started
+        self.on_batch(self.stats)
@@ -0,0 +1,179 @@
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Сколько письмо может висеть в SENDING без продления метки, прежде чем его вернут в очередь
+CLAIM_TIMEOUT = timedelta(minutes=10)
+# Как часто отправитель продлевает метку ещё не отправленных писем пачки.
+# Одно письмо ограничено EMAIL_TIMEOUT, поэтому метка живых писем не истекает.
+CLAIM_EXTEND_INTERVAL = timedelta(minutes=1)
+
+
+def enqueue_email(to, subject, body, from_email=None):
+    """
+    Записывает письмо в outbox. Вызывается внутри транзакции запроса:
+    если она откатится, письмо не уйдёт. Отправляет воркер send_outbox.
+    """
+    return OutboxEmail.objects.create(to=to, subject=subject, body=body, from_email=from_email)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка с разбросом: base * 2^(attempts-1) ± 20%, не больше суток."""
+    delay = min(settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 24 * 60 * 60)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _claim(batch_size):
+    """
+    Помечает до batch_size готовых писем SENDING коротким запросом и возвращает их.
+    Условие status = pending в UPDATE отдаёт каждое письмо только одному
+    отправителю даже без SKIP LOCKED (SQLite): второй процесс его уже не обновит.
+    """
+    now = timezone.now()
+    token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    due = OutboxEmail.objects.filter(
+        status=OutboxEmail.PENDING, next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'id')
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    # В SQLite чтение и запись в одной транзакции конфликтуют с соседним писателем,
+    # а сериализует запись сама база — там каждый запрос идёт отдельно
+    with transaction.atomic() if skip_locked else nullcontext():
+        if skip_locked:
+            # Несколько воркеров разбирают разные письма, не ожидая друг друга
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return []
+        OutboxEmail.objects.filter(pk__in=ids, status=OutboxEmail.PENDING).update(
+            status=OutboxEmail.SENDING, locked_by=token, locked_at=now
+        )
+    return list(OutboxEmail.objects.filter(locked_by=token).order_by('next_attempt_at', 'id'))
+
+
+def release_stale_claims(timeout=CLAIM_TIMEOUT):
+    """
+    Возвращает в очередь письма, отправитель которых пропал посреди пачки.
+    Письмо, ушедшее до падения, уйдёт повторно: доставка — не реже одного раза.
+    """
+    return OutboxEmail.objects.filter(
+        status=OutboxEmail.SENDING, locked_at__lt=timezone.now() - timeout
+    ).update(status=OutboxEmail.PENDING, locked_by=None, locked_at=None)
+
+
+def send_batch(batch_size=None, backend=None):
+    """
+    Отправляет одну пачку писем через одно SMTP-соединение.
+    Письма сначала помечаются SENDING, а отправка идёт вне транзакции:
+    блокировки БД не держатся на время SMTP. Результат каждого письма
+    записывается сразу после отправки и только пока письмо за этим
+    отправителем; метка остальных продлевается по ходу пачки, поэтому
+    release_stale_claims не вернёт их в очередь посреди долгой пачки.
+    Повтор возможен, лишь если процесс упал между отправкой и записью результата.
+    Возвращает {'sent': N, 'retried': N, 'dead': N}.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    stats = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    release_stale_claims()
+    emails = _claim(batch_size)
+    if not emails:
+        return stats
+    token = emails[0].locked_by
+
+    mail_connection = get_connection(backend=backend)
+    try:
+        mail_connection.open()
+    except Exception as e:
+        # Сервер недоступен — вся пачка уходит на повтор
+        for email in emails:
+            _fail(email, e, stats)
+            _save_result(email, token)
+        return stats
+
+    extended = time.monotonic()
+    try:
+        for index, email in enumerate(emails):
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=[email.to],
+                connection=mail_connection,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                _fail(email, e, stats)
+            else:
+                email.status = OutboxEmail.SENT
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = None
+                stats['sent'] += 1
+            _save_result(email, token)
+
+            if time.monotonic() - extended >= CLAIM_EXTEND_INTERVAL.total_seconds():
+                OutboxEmail.objects.filter(
+                    pk__in=[rest.pk for rest in emails[index + 1:]], locked_by=token
+                ).update(locked_at=timezone.now())
+                extended = time.monotonic()
+    finally:
+        # Прерванная пачка: неотправленные письма сразу возвращаются в очередь
+        OutboxEmail.objects.filter(locked_by=token, status=OutboxEmail.SENDING).update(
+            status=OutboxEmail.PENDING, locked_by=None, locked_at=None
+        )
+        mail_connection.close()
+    return stats
+
+
+def _save_result(email, token):
+    """
+    Записывает результат письма, если оно всё ещё за этим отправителем.
+    Иначе метка истекла и письмо уже у другого отправителя — его состояние не трогается.
+    """
+    saved = OutboxEmail.objects.filter(pk=email.pk, locked_by=token).update(
+        status=email.status,
+        attempts=email.attempts,
+        next_attempt_at=email.next_attempt_at,
+        last_error=email.last_error,
+        sent_at=email.sent_at,
+        locked_by=None,
+        locked_at=None,
+    )
+    if not saved:
+        logger.warning("Результат письма %s не записан: метка %s уже потеряна", email.pk, token)
+    return saved
+
+
+def _fail(email, error, stats):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboxEmail.DEAD
+        stats['dead'] += 1
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        stats['retried'] += 1
+
+
+def requeue_dead(ids=None):
+    """Возвращает недоставленные письма в очередь (после починки SMTP)."""
+    queryset = OutboxEmail.objects.filter(status=OutboxEmail.DEAD)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset.update(status=OutboxEmail.PENDING, attempts=0, next_attempt_at=timezone.now())
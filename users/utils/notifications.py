@@ -0,0 +1,171 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from users.cache import get_or_compute
+from users.models import Notification, NotificationReceipt, InboxCounter
+
+# Общее число рассылок кэшируется: бейдж не должен считать строки уведомлений.
+# Кэш общий для воркеров и сбрасывается сигналами, таймаут — лишь страховка.
+BROADCAST_TOTAL_CACHE_KEY = 'notifications:broadcast_total'
+BROADCAST_TOTAL_TIMEOUT = 60 * 60
+
+
+def inbox(user):
+    """
+    Лента пользователя: личные уведомления и рассылки одним упорядоченным запросом.
+    Скрытые пользователем уведомления исключаются, прочтение рассылок
+    берётся из NotificationReceipt (аннотация read_by_user).
+    """
+    receipts = NotificationReceipt.objects.filter(notification=OuterRef('pk'), user=user)
+    return (
+        Notification.objects.filter(Q(user=user) | Q(user__isnull=True))
+        .filter(~Exists(receipts.filter(dismissed_at__isnull=False)))
+        .annotate(read_by_user=Exists(receipts.filter(read_at__isnull=False)))
+        .order_by('-created_at', '-id')
+    )
+
+
+# -------------------- Счётчики непрочитанных --------------------
+
+def broadcast_total():
+    return get_or_compute(
+        BROADCAST_TOTAL_CACHE_KEY,
+        lambda: Notification.objects.filter(user__isnull=True).count(),
+        BROADCAST_TOTAL_TIMEOUT,
+    )
+
+
+def reset_broadcast_total():
+    cache.delete(BROADCAST_TOTAL_CACHE_KEY)
+
+
+def recount_inbox(user_id):
+    """
+    Пересчитывает счётчики пользователя по таблицам уведомлений (редкий путь:
+    первый запрос бейджа или согласование после расхождений).
+    """
+    unread = Notification.objects.filter(user_id=user_id, is_read=False).count()
+    seen = NotificationReceipt.objects.filter(user_id=user_id, notification__user__isnull=True).count()
+    counter, _ = InboxCounter.objects.update_or_create(
+        user_id=user_id, defaults={'unread_count': unread, 'broadcasts_seen': seen}
+    )
+    return counter
+
+
+def shift_counter(user_id, unread=0, seen=0):
+    """
+    Атомарно сдвигает счётчики одним UPDATE. Если строки ещё нет — пересчитывает её целиком.
+    """
+    if not unread and not seen:
+        return
+    updated = InboxCounter.objects.filter(user_id=user_id).update(
+        unread_count=F('unread_count') + unread,
+        broadcasts_seen=F('broadcasts_seen') + seen,
+    )
+    if not updated:
+        transaction.on_commit(lambda: _recount_if_user_exists(user_id))
+
+
+def _recount_if_user_exists(user_id):
+    # Уведомления удаляются и каскадом вместе с пользователем: счётчик ему уже не нужен
+    if User.objects.filter(pk=user_id).exists():
+        recount_inbox(user_id)
+
+
+def forget_broadcast(notification):
+    """
+    Перед удалением рассылки: её отметки удалятся каскадом, поэтому у всех,
+    кто её прочитал или скрыл, broadcasts_seen уменьшается на одну.
+    """
+    InboxCounter.objects.filter(
+        user__notification_receipts__notification=notification
+    ).update(broadcasts_seen=F('broadcasts_seen') - 1)
+
+
+def unread_count(user):
+    """
+    Число непрочитанных для бейджа: одна строка InboxCounter и кэшированное число рассылок.
+    """
+    counter = InboxCounter.objects.filter(user=user).first() or recount_inbox(user.pk)
+    broadcasts_unread = max(broadcast_total() - counter.broadcasts_seen, 0)
+    return max(counter.unread_count, 0) + broadcasts_unread
+
+
+# -------------------- Действия пользователя --------------------
+
+def send_broadcast(message, type='announcement'):
+    """
+    Рассылка всем пользователям — одна вставка независимо от их количества.
+    """
+    return Notification.objects.create(user=None, message=message, type=type)
+
+
+def mark_read(user, notification):
+    if notification.is_broadcast:
+        receipt, created = NotificationReceipt.objects.get_or_create(
+            notification=notification, user=user, defaults={'read_at': timezone.now()}
+        )
+        if created:
+            shift_counter(user.pk, seen=1)
+        elif receipt.read_at is None:
+            receipt.read_at = timezone.now()
+            receipt.save(update_fields=['read_at'])
+    elif Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+        shift_counter(user.pk, unread=-1)
+
+
+def dismiss(user, notification):
+    now = timezone.now()
+    receipt, created = NotificationReceipt.objects.get_or_create(
+        notification=notification, user=user,
+        defaults={'read_at': now, 'dismissed_at': now},
+    )
+    if created and notification.is_broadcast:
+        shift_counter(user.pk, seen=1)
+    if not created and receipt.dismissed_at is None:
+        receipt.dismissed_at = now
+        receipt.read_at = receipt.read_at or now
+        receipt.save(update_fields=['read_at', 'dismissed_at'])
+    if not notification.is_broadcast:
+        mark_read(user, notification)
+
+
+def mark_many_read(user, ids=None, before=None):
+    """
+    Отмечает прочитанными уведомления из списка `ids` или все с created_at <= `before`
+    (если не передано ни то, ни другое — все). Личные уведомления — одним UPDATE,
+    рассылки — одним bulk_create отметок для ещё не отмеченных.
+    Возвращает число уведомлений, ставших прочитанными.
+    """
+    filters = {}
+    if ids is not None:
+        filters['pk__in'] = ids
+    if before is not None:
+        filters['created_at__lte'] = before
+
+    now = timezone.now()
+    with transaction.atomic():
+        personal = Notification.objects.filter(user=user, is_read=False, **filters).update(is_read=True)
+
+        broadcast_ids = list(
+            Notification.objects.filter(user__isnull=True, **filters)
+            .exclude(receipts__user=user)
+            .values_list('pk', flat=True)
+        )
+        inserted = 0
+        if broadcast_ids:
+            # Параллельный mark_read или dismiss мог успеть вставить отметку —
+            # такие строки пропускаются (ignore_conflicts), а вставленные этим
+            # вызовом узнаются по своему read_at и только они сдвигают счётчик
+            NotificationReceipt.objects.bulk_create(
+                [NotificationReceipt(notification_id=pk, user=user, read_at=now) for pk in broadcast_ids],
+                ignore_conflicts=True,
+            )
+            inserted = NotificationReceipt.objects.filter(
+                user=user, notification_id__in=broadcast_ids, read_at=now
+            ).count()
+        shift_counter(user.pk, unread=-personal, seen=inserted)
+    return personal + inserted
@@ -0,0 +1,232 @@
+"""
+select_related / prefetch_related / only по полям сериализатора.
+
+План строится один раз на класс сериализатора обходом его полей:
+- source через прямой FK/OneToOne ('user.email', вложенный сериализатор) —
+  select_related и только нужные столбцы связанной таблицы;
+- обратный FK и ManyToMany (many=True) — Prefetch с queryset, который
+  оптимизирован по вложенному сериализатору тем же способом;
+- PrimaryKeyRelatedField читает только столбец *_id, JOIN ему не нужен.
+
+Что читают SerializerMethodField и свойства модели, из кода не узнать — их
+источники перечисляются в Meta.field_sources сериализатора, например
+{'user_info': ('user.username', 'user.email')}. Если для уровня остались
+неизвестные источники, столбцы этой модели не ограничиваются.
+"""
+from functools import wraps
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import RelatedField, SlugRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+class QueryPlan:
+    def __init__(self, model):
+        self.model = model
+        self.select = set()
+        # путь -> (модель, план) для Prefetch; None — простой строковый prefetch
+        self.prefetch = {}
+        self.only = set()
+        # Источники корневого уровня, которых нет среди полей модели:
+        # допустимы, только если это аннотации queryset
+        self.unresolved = set()
+        self.complete = True
+
+    def apply(self, queryset, defer=True, extra_fields=()):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+
+        seen = {getattr(lookup, 'prefetch_to', lookup) for lookup in queryset._prefetch_related_lookups}
+        lookups = []
+        for path, nested in sorted(self.prefetch.items()):
+            if path in seen:
+                continue
+            if nested is None:
+                lookups.append(path)
+            else:
+                model, plan = nested
+                lookups.append(Prefetch(path, queryset=plan.apply(model._default_manager.all())))
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+
+        # only() не трогает queryset, где столбцы уже выбраны вручную (only/defer)
+        if not defer or queryset.query.deferred_loading != (frozenset(), True):
+            return queryset
+        fields = set(self.only)
+        known = self.unresolved <= set(queryset.query.annotations)
+        if not (self.complete and known):
+            fields.update(field.name for field in self.model._meta.concrete_fields)
+        fields.update(name for name in extra_fields if _is_concrete(self.model, name))
+        return queryset.only(*sorted(fields)) if fields else queryset
+
+
+def _is_concrete(model, name):
+    try:
+        return model._meta.get_field(name).concrete
+    except FieldDoesNotExist:
+        return False
+
+
+def _field_sources(serializer):
+    return getattr(getattr(serializer, 'Meta', None), 'field_sources', {})
+
+
+def _walk(serializer, model, prefix, plan):
+    """Добавляет в план поля сериализатора на уровне `model`. False — уровень известен не полностью."""
+    complete = True
+    declared = _field_sources(serializer)
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in declared:
+            for source in declared[name]:
+                complete &= _follow(source.split('.'), None, model, prefix, plan)
+        elif field.source == '*':
+            if isinstance(field, BaseSerializer) and not isinstance(field, ListSerializer):
+                complete &= _walk(field, model, prefix, plan)
+            else:
+                complete = False
+        else:
+            complete &= _follow(field.source_attrs, field, model, prefix, plan)
+
+    if not complete:
+        plan.only.update(prefix + field.name for field in model._meta.concrete_fields)
+    return complete
+
+
+def _follow(attrs, field, model, prefix, plan):
+    """Проходит цепочку source через модели. False — путь упёрся в неизвестный атрибут."""
+    for index, attr in enumerate(attrs):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # Аннотации queryset есть только у корневой модели
+            if index == 0 and not prefix:
+                plan.unresolved.add(attr)
+                return True
+            return False
+        path = prefix + attr
+        last = index == len(attrs) - 1
+
+        if not model_field.is_relation or attr == getattr(model_field, 'attname', None) != model_field.name:
+            # Обычный столбец или сам *_id внешнего ключа
+            plan.only.add(prefix + model_field.name)
+            return True
+        if model_field.one_to_many or model_field.many_to_many:
+            return _to_many(model_field, field if last else None, path, attrs[index + 1:], plan)
+        if model_field.concrete:
+            plan.only.add(path)
+        if last:
+            return _to_one(model_field, field, path, plan)
+        plan.select.add(path)
+        model = model_field.related_model
+        prefix = path + '__'
+    return True
+
+
+def _to_one(model_field, field, path, plan):
+    if isinstance(field, RelatedField) and model_field.concrete:
+        if isinstance(field, SlugRelatedField):
+            plan.select.add(path)
+            plan.only.add(f'{path}__{field.slug_field}')
+            return True
+        if field.use_pk_only_optimization():
+            # Значение — столбец *_id самой таблицы
+            return True
+    plan.select.add(path)
+    if isinstance(field, BaseSerializer):
+        _walk(field, model_field.related_model, path + '__', plan)
+    # Иначе (объект целиком или неизвестно что) столбцы связанной модели не ограничиваются
+    return True
+
+
+def _to_many(model_field, field, path, rest, plan):
+    if isinstance(field, ListSerializer):
+        model = model_field.related_model
+        nested = QueryPlan(model)
+        nested.complete = _walk(field.child, model, '', nested)
+        if model_field.one_to_many:
+            # FK обратно на родителя нужен, чтобы разложить объекты по родителям
+            nested.only.add(model_field.field.name)
+        plan.prefetch[path] = (model, nested)
+    elif rest:
+        plan.prefetch['__'.join([path, *rest])] = None
+    else:
+        plan.prefetch[path] = None
+    return True
+
+
+_plans = {}
+
+
+def query_plan(serializer_class):
+    """План для сериализатора (кэшируется на класс)."""
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        model = serializer_class.Meta.model
+        plan = QueryPlan(model)
+        plan.complete = _walk(serializer_class(), model, '', plan)
+        _plans[serializer_class] = plan
+    return plan
+
+
+def optimize_queryset(queryset, serializer_class, defer=True, extra_fields=()):
+    """
+    queryset с JOIN/prefetch для полей serializer_class. При defer=True
+    загружаются только нужные столбцы (и extra_fields корневой модели).
+    """
+    if not isinstance(queryset, QuerySet) or getattr(getattr(serializer_class, 'Meta', None), 'model', None) is None:
+        return queryset
+    if not issubclass(queryset.model, serializer_class.Meta.model):
+        return queryset
+    return query_plan(serializer_class).apply(queryset, defer=defer, extra_fields=extra_fields)
+
+
+def _ordering_fields(*orderings):
+    for ordering in orderings:
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        for item in ordering or ():
+            if isinstance(item, str) and item != '?':
+                yield item.lstrip('-')
+
+
+class OptimizedQuerysetMixin:
+    """
+    Оптимизирует queryset вьюсета по его сериализатору (get_serializer_class).
+    Срабатывает и для get_queryset, переопределённого во вьюсете, поэтому
+    list, retrieve и собственные действия делают постоянное число запросов
+    при любом размере страницы. only() применяется только к чтению:
+    сохранение модели с отложенными полями записывает лишь загруженные.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        get_queryset = cls.__dict__.get('get_queryset')
+        if get_queryset is not None and not getattr(get_queryset, 'optimizes_queryset', False):
+            @wraps(get_queryset)
+            def optimized(self, *args, **kwargs):
+                return self.optimize_queryset(get_queryset(self, *args, **kwargs))
+            optimized.optimizes_queryset = True
+            cls.get_queryset = optimized
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+    def optimize_queryset(self, queryset):
+        # drf_yasg строит схему на вьюсетах без настоящего запроса
+        if getattr(self, 'swagger_fake_view', False) or getattr(self, 'request', None) is None:
+            return queryset
+        # Поля, которые читает пагинатор курсора, и порядок по умолчанию
+        extra = _ordering_fields(
+            queryset.query.order_by if isinstance(queryset, QuerySet) else (),
+            getattr(self.paginator, 'ordering', None),
+            queryset.model._meta.ordering if isinstance(queryset, QuerySet) else (),
+        )
+        return optimize_queryset(
+            queryset, self.get_serializer_class(),
+            defer=self.request.method in SAFE_METHODS,
+            extra_fields=list(extra),
+        )
@@ -0,0 +1,91 @@
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, NullIf
+
+from users.models import Hall, Club, Trainer, Review
+from users.utils.http_cache import bump_version
+
+# Модель-цель отзыва -> поле внешнего ключа в Review
+RATED_MODELS = (
+    (Hall, 'hall_id'),
+    (Club, 'club_id'),
+    (Trainer, 'trainer_id'),
+)
+
+
+def review_targets(rating, hall_id, club_id, trainer_id):
+    """
+    Возвращает список (модель, pk, оценка) для всех объектов, к которым относится отзыв.
+    """
+    ids = {'hall_id': hall_id, 'club_id': club_id, 'trainer_id': trainer_id}
+    return [(model, ids[field], rating) for model, field in RATED_MODELS if ids[field]]
+
+
+def apply_rating_delta(model, pk, sum_delta, count_delta):
+    """
+    Атомарно сдвигает агрегаты одного объекта одним UPDATE без чтения строки.
+    Среднее считается в том же выражении, поэтому гонок между воркерами нет.
+    """
+    if not sum_delta and not count_delta:
+        return
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('review_count') + count_delta
+    model.objects.filter(pk=pk).update(
+        rating_sum=new_sum,
+        review_count=new_count,
+        average_rating=Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+    )
+    # UPDATE не вызывает сигналов модели — кэш ответов сбрасывается явно
+    bump_version(model)
+
+
+def apply_review_change(old_state, new_state):
+    """
+    Применяет разницу между прежним и новым состоянием отзыва.
+    Состояние — кортеж (rating, hall_id, club_id, trainer_id) или None.
+    """
+    deltas = {}
+    if old_state:
+        for model, pk, rating in review_targets(*old_state):
+            sum_delta, count_delta = deltas.get((model, pk), (0, 0))
+            deltas[(model, pk)] = (sum_delta - rating, count_delta - 1)
+    if new_state:
+        for model, pk, rating in review_targets(*new_state):
+            sum_delta, count_delta = deltas.get((model, pk), (0, 0))
+            deltas[(model, pk)] = (sum_delta + rating, count_delta + 1)
+
+    for (model, pk), (sum_delta, count_delta) in deltas.items():
+        apply_rating_delta(model, pk, sum_delta, count_delta)
+
+
+def recompute_ratings(dry_run=False):
+    """
+    Пересчитывает агрегаты по таблице Review и исправляет расхождения.
+    Возвращает {имя модели: (проверено, исправлено)}.
+    """
+    stats = {}
+    for model, field in RATED_MODELS:
+        actual = {
+            row[field]: (row['total'] or 0, row['count'])
+            for row in Review.objects.filter(**{f'{field}__isnull': False})
+            .values(field)
+            .annotate(total=Sum('rating'), count=Count('id'))
+            .order_by()
+        }
+
+        stale = []
+        checked = 0
+        for obj in model.objects.only('id', 'rating_sum', 'review_count', 'average_rating').iterator():
+            checked += 1
+            rating_sum, review_count = actual.get(obj.pk, (0, 0))
+            average = rating_sum / review_count if review_count else None
+            if (obj.rating_sum, obj.review_count, obj.average_rating) != (rating_sum, review_count, average):
+                obj.rating_sum = rating_sum
+                obj.review_count = review_count
+                obj.average_rating = average
+                stale.append(obj)
+
+        if stale and not dry_run:
+            model.objects.bulk_update(stale, ['rating_sum', 'review_count', 'average_rating'], batch_size=500)
+            bump_version(model)
+        stats[model.__name__] = (checked, len(stale))
+    return stats
@@ -0,0 +1,131 @@
+"""
+Политики хранения для таблиц, которые только растут.
+
+Каждая политика — модель и условие «строка больше не нужна». Удаление идёт
+пачками по первичному ключу (keyset: pk > последнего просмотренного), каждая
+пачка — отдельная короткая транзакция, между пачками пауза.
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from users.models import PasswordResetCode, Notification, OutboxEmail, Job, RevokedToken, ThrottleBucket
+
+
+class RetentionPolicy:
+    def __init__(self, name, model, condition, description=''):
+        self.name = name
+        self.model = model
+        # condition(now) -> Q: какие строки можно удалить
+        self.condition = condition
+        self.description = description
+
+    def queryset(self, now):
+        return self.model._default_manager.filter(self.condition(now))
+
+
+def _days(setting):
+    return timedelta(days=getattr(settings, setting))
+
+
+POLICIES = [
+    RetentionPolicy(
+        'tokens', OutstandingToken,
+        lambda now: Q(expires_at__lt=now),
+        'Просроченные refresh-токены (вместе с записями черного списка)',
+    ),
+    RetentionPolicy(
+        'revoked_tokens', RevokedToken,
+        lambda now: Q(expires_at__lt=now),
+        'Отозванные jti просроченных токенов',
+    ),
+    RetentionPolicy(
+        'codes', PasswordResetCode,
+        lambda now: Q(created_at__lt=now - _days('RETENTION_CODE_DAYS')),
+        'Коды подтверждения и сброса старше RETENTION_CODE_DAYS',
+    ),
+    RetentionPolicy(
+        'notifications', Notification,
+        # Рассылки не трогаем: по их числу считаются непрочитанные у всех пользователей
+        lambda now: Q(
+            user__isnull=False, is_read=True,
+            created_at__lt=now - _days('RETENTION_NOTIFICATION_DAYS'),
+        ),
+        'Прочитанные личные уведомления старше RETENTION_NOTIFICATION_DAYS',
+    ),
+    RetentionPolicy(
+        'outbox', OutboxEmail,
+        lambda now: Q(status=OutboxEmail.SENT, sent_at__lt=now - _days('RETENTION_OUTBOX_DAYS')),
+        'Отправленные письма старше RETENTION_OUTBOX_DAYS',
+    ),
+    RetentionPolicy(
+        'throttle', ThrottleBucket,
+        # Ведро, «опустевшее» в прошлом, ничем не отличается от отсутствующего
+        lambda now: Q(tat__lt=now.timestamp()),
+        'Состояние лимитов запросов, которые уже полностью восстановились',
+    ),
+    RetentionPolicy(
+        'jobs', Job,
+        lambda now: Q(
+            status__in=[Job.DONE, Job.FAILED],
+            finished_at__lt=now - _days('RETENTION_JOB_DAYS'),
+        ),
+        'Завершённые фоновые задачи старше RETENTION_JOB_DAYS',
+    ),
+]
+
+
+def get_policies(names=None):
+    if not names:
+        return list(POLICIES)
+    by_name = {policy.name: policy for policy in POLICIES}
+    unknown = set(names) - set(by_name)
+    if unknown:
+        raise KeyError(', '.join(sorted(unknown)))
+    return [by_name[name] for name in names]
+
+
+def purge(policy, now=None, batch_size=None, pause=None, dry_run=False):
+    """
+    Удаляет строки по политике пачками. Возвращает статистику:
+    matched — подходящих строк, deleted — удалено по моделям (включая каскад),
+    batches — число пачек, seconds — общее время.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    pause = settings.RETENTION_PAUSE_SECONDS if pause is None else pause
+    queryset = policy.queryset(now).order_by('pk')
+
+    stats = {'matched': 0, 'deleted': Counter(), 'batches': 0, 'seconds': 0.0}
+    started = time.monotonic()
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        stats['matched'] += len(pks)
+        stats['batches'] += 1
+        if dry_run:
+            continue
+        # Условие проверяется ещё раз: строка могла измениться после выборки ключей
+        with transaction.atomic():
+            _, per_model = queryset.filter(pk__in=pks).delete()
+        stats['deleted'].update(per_model)
+        if len(pks) == batch_size and pause:
+            time.sleep(pause)
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+
+def purge_all(names=None, **options):
+    """Применяет политики по очереди: {имя политики: статистика}."""
+    now = options.pop('now', None) or timezone.now()
+    return {policy.name: purge(policy, now=now, **options) for policy in get_policies(names)}
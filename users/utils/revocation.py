@@ -0,0 +1,176 @@
+"""
+Отзыв JWT без запроса к БД на каждую проверку.
+
+Отозванные jti хранятся в таблице RevokedToken, а каждый процесс держит их
+компактную копию: отсортированный массив 64-битных хэшей (8 байт на токен)
+плюс небольшое множество свежих хэшей. Новые строки подгружаются не чаще
+раза в REFRESH_INTERVAL секунд: с id выше уже загруженных (high-water mark)
+и, с запасом REFRESH_MARGIN, по времени отзыва.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+from heapq import merge
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import RevokedToken
+
+# Как часто процесс спрашивает БД о новых отзывах, секунд
+REFRESH_INTERVAL = 5
+# Полная перезагрузка выбрасывает из памяти удалённые (просроченные) записи
+FULL_RELOAD_INTERVAL = 6 * 3600
+# id и revoked_at назначаются до коммита: строка с меньшим id может стать
+# видимой позже большей. Поэтому каждое обновление перечитывает и строки,
+# отозванные не раньше прошлого обновления минус REFRESH_MARGIN. Отзыв,
+# транзакция которого шла дольше (или часы серверов разошлись сильнее),
+# другие процессы увидят только при полной перезагрузке.
+REFRESH_MARGIN = timedelta(minutes=2)
+# Свежие хэши сливаются в отсортированный массив, когда их становится много
+MERGE_THRESHOLD = 4096
+
+
+def jti_hash(jti):
+    # Встроенный 64-битный SipHash: зависит от процесса, но и массив живёт только в нём
+    return hash(str(jti))
+
+
+class RevocationSet:
+    """
+    Множество отозванных jti. Проверка — поиск в множестве свежих хэшей и
+    бинарный поиск в массиве (~22 сравнения на C-уровне при миллионах записей).
+    Ложные срабатывания возможны только при совпадении 64-битных хэшей.
+    """
+
+    def __init__(self):
+        self._sorted = array('q')
+        self._recent = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.high_water = 0
+        self.refreshed_at = None
+        self._next_refresh = 0
+        self._next_reload = 0
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, jti):
+        return self.contains_hash(jti_hash(jti))
+
+    def contains_hash(self, value):
+        if value in self._recent:
+            return True
+        values = self._sorted
+        index = bisect_left(values, value)
+        return index < len(values) and values[index] == value
+
+    @property
+    def nbytes(self):
+        return self._sorted.itemsize * len(self._sorted)
+
+    def add(self, jti):
+        self.add_hashes([jti_hash(jti)])
+
+    def add_hashes(self, hashes):
+        # Читатели не берут блокировку: set.update атомарен под GIL,
+        # а массив при слиянии заменяется целиком
+        with self._write_lock:
+            self._recent.update(hashes)
+            if len(self._recent) > max(MERGE_THRESHOLD, len(self._sorted) // 64):
+                recent = self._recent
+                self._sorted = array('q', merge(self._sorted, sorted(recent)))
+                self._recent = set()
+
+    def load(self, hashes, high_water=0):
+        """Полностью заменяет содержимое."""
+        values = array('q', sorted(hashes))
+        with self._write_lock:
+            self._sorted = values
+            self._recent = set()
+            self.high_water = high_water
+
+    def refresh(self, force=False):
+        """Подгружает новые отзывы из БД, если подошло время (или force)."""
+        now = time.monotonic()
+        if not force and now < self._next_refresh:
+            return False
+        # Обновляет один поток, остальные проверяют по текущей копии. Пока
+        # первая загрузка не завершилась, копии нет: пустое множество пропустило
+        # бы отозванные токены, поэтому остальные потоки её дожидаются
+        if not self._lock.acquire(blocking=force or self.refreshed_at is None):
+            return False
+        try:
+            if not force and time.monotonic() < self._next_refresh:
+                # Пока ждали блокировку, копию загрузил другой поток
+                return False
+            started = timezone.now()
+            if now >= self._next_reload or self.refreshed_at is None:
+                rows = RevokedToken.objects.values_list('id', 'jti')
+                ids, hashes = [0], []
+                for pk, jti in rows.iterator(chunk_size=10000):
+                    ids.append(pk)
+                    hashes.append(jti_hash(jti))
+                self.load(hashes, max(ids))
+                self._next_reload = now + FULL_RELOAD_INTERVAL
+            else:
+                rows = list(
+                    RevokedToken.objects.filter(
+                        Q(id__gt=self.high_water) | Q(revoked_at__gte=self.refreshed_at - REFRESH_MARGIN)
+                    ).values_list('id', 'jti')
+                )
+                if rows:
+                    self.add_hashes(jti_hash(jti) for _, jti in rows)
+                    self.high_water = max(self.high_water, max(pk for pk, _ in rows))
+            self.refreshed_at = started
+            self._next_refresh = now + REFRESH_INTERVAL
+            return True
+        finally:
+            self._lock.release()
+
+
+revoked = RevocationSet()
+
+
+def is_revoked(jti):
+    revoked.refresh()
+    return jti in revoked
+
+
+def record_revocation(jti, token_type, expires_at, user_id=None):
+    """
+    Записывает отзыв jti. В этом процессе он действует сразу после коммита,
+    в остальных — не позже чем через REFRESH_INTERVAL.
+    """
+    RevokedToken.objects.get_or_create(jti=jti, defaults={
+        'token_type': token_type,
+        'user_id': user_id,
+        'expires_at': expires_at,
+    })
+    transaction.on_commit(lambda: revoked.add(jti))
+
+
+def revoke(token):
+    """Отзывает проверенный токен (AccessToken или RefreshToken)."""
+    record_revocation(
+        token[api_settings.JTI_CLAIM],
+        token.token_type,
+        datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+        token.payload.get(api_settings.USER_ID_CLAIM),
+    )
+
+
+class RevocableRefreshToken(RefreshToken):
+    """Refresh-токен, черный список которого проверяется по памяти процесса."""
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
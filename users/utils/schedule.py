@@ -0,0 +1,52 @@
+from datetime import time
+
+from users.models import ClassSchedule
+
+DAY_START = time(0, 0)
+DAY_END = time(23, 59, 59)
+
+
+def find_conflicts(hall, day_of_week, start_time, end_time, exclude_pk=None):
+    """
+    Занятия в том же зале и в тот же день, пересекающиеся с [start_time, end_time).
+
+    Запрос идёт по индексу (hall, day_of_week, start_time): отбор по start_time < end_time
+    — это диапазон индекса, поэтому проверка стоит O(log n), а не полный перебор расписания.
+    Соприкасающиеся интервалы (10:00–11:00 и 11:00–12:00) конфликтом не считаются.
+    """
+    conflicts = ClassSchedule.objects.filter(
+        hall=hall,
+        day_of_week=day_of_week,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+    )
+    if exclude_pk is not None:
+        conflicts = conflicts.exclude(pk=exclude_pk)
+    return conflicts
+
+
+def free_windows(hall, day_of_week, open_time=DAY_START, close_time=DAY_END):
+    """
+    Свободные окна зала в указанный день в пределах [open_time, close_time].
+    Возвращает список пар (начало, конец), упорядоченных по времени.
+    """
+    busy = (
+        ClassSchedule.objects.filter(
+            hall=hall,
+            day_of_week=day_of_week,
+            start_time__lt=close_time,
+            end_time__gt=open_time,
+        )
+        .order_by('start_time')
+        .values_list('start_time', 'end_time')
+    )
+
+    windows = []
+    cursor = open_time
+    for start_time, end_time in busy:
+        if start_time > cursor:
+            windows.append((cursor, start_time))
+        cursor = max(cursor, end_time)
+    if cursor < close_time:
+        windows.append((cursor, close_time))
+    return windows
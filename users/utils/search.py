@@ -0,0 +1,197 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+from users.models import Hall, Club, Trainer, SearchDocument
+
+# Конфигурация полнотекстового поиска PostgreSQL. Должна совпадать с выражением
+# GIN-индексов в миграциях, иначе планировщик их не использует.
+SEARCH_CONFIG = 'russian'
+
+# Внешние FTS5-таблицы для SQLite (создаются миграциями вместе с триггерами)
+NOTIFICATION_FTS_TABLE = 'users_notification_fts'
+CATALOG_FTS_TABLE = 'users_searchdocument_fts'
+
+# Веса колонок FTS5 (title, keywords, body) — аналог весов A/B/C в PostgreSQL
+CATALOG_FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Сколько лучших документов отдаёт поиск по одному типу
+MAX_RESULTS = 200
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts5_match_query(text):
+    """
+    Превращает пользовательский ввод в безопасное выражение FTS5 MATCH:
+    каждое слово берётся в кавычки и ищется по префиксу, слова объединяются через AND.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _postgres_search(queryset, vector, query):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.annotate(search=vector, rank=SearchRank(vector, search_query))
+        .filter(search=search_query)
+        .order_by('-rank', '-pk')
+    )
+
+
+def _sqlite_search(queryset, fts_table, query, weights=()):
+    match = fts5_match_query(query)
+    if not match:
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    bm25_args = ''.join(f', {weight}' for weight in weights)
+    # bm25 возвращает тем меньшее значение, чем релевантнее строка — инвертируем,
+    # чтобы порядок совпадал с SearchRank PostgreSQL
+    rank = RawSQL(
+        f'SELECT -bm25({fts_table}{bm25_args}) FROM {fts_table} '
+        f'WHERE {fts_table} MATCH %s AND {fts_table}.rowid = "{table}"."id"',
+        [match],
+        output_field=FloatField(),
+    )
+    matched = RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match])
+    return queryset.filter(pk__in=matched).annotate(rank=rank).order_by('-rank', '-pk')
+
+
+def search_notifications(queryset, query):
+    """
+    Полнотекстовый поиск по тексту уведомлений, упорядоченный по релевантности.
+    PostgreSQL — GIN-индекс по to_tsvector(message), SQLite — FTS5.
+    """
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, SearchVector('message', config=SEARCH_CONFIG), query)
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(queryset, NOTIFICATION_FTS_TABLE, query)
+    return queryset.filter(message__icontains=query)
+
+
+# -------------------- Каталог: залы, клубы, тренеры --------------------
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def document_fields(instance):
+    """
+    Поля поискового документа объекта каталога: (kind, title, keywords, body).
+    """
+    if isinstance(instance, Hall):
+        return (
+            SearchDocument.HALL,
+            instance.title,
+            _join(instance.sport, instance.type, instance.coating),
+            _join(instance.description, instance.address, instance.inventory),
+        )
+    if isinstance(instance, Club):
+        return (
+            SearchDocument.CLUB,
+            instance.title,
+            _join(instance.sport, instance.coach),
+            _join(instance.description, instance.address, instance.age_groups),
+        )
+    if isinstance(instance, Trainer):
+        return (
+            SearchDocument.TRAINER,
+            _join(instance.first_name, instance.last_name),
+            instance.sport or '',
+            '',
+        )
+    raise TypeError(f'{type(instance).__name__} не индексируется поиском')
+
+
+def weighted_vector():
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('keywords', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('body', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def index_object(instance):
+    """Создаёт или обновляет поисковый документ объекта каталога."""
+    kind, title, keywords, body = document_fields(instance)
+    document, _ = SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk,
+        defaults={'title': title[:255], 'keywords': keywords[:255], 'body': body},
+    )
+    if connection.vendor == 'postgresql':
+        SearchDocument.objects.filter(pk=document.pk).update(vector=weighted_vector())
+    return document
+
+
+def unindex_object(instance):
+    kind = document_fields(instance)[0]
+    SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
+
+
+def rebuild_search_index():
+    """
+    Полностью перестраивает поисковые документы каталога.
+    Документы каждого типа заменяются одной транзакцией: параллельный поиск
+    видит либо старый индекс, либо новый, а ошибка посередине оставляет старый.
+    Возвращает {kind: число документов}.
+    """
+    stats = {}
+    for model in (Hall, Club, Trainer):
+        documents = []
+        for instance in model.objects.iterator(chunk_size=500):
+            kind, title, keywords, body = document_fields(instance)
+            documents.append(SearchDocument(
+                kind=kind, object_id=instance.pk,
+                title=title[:255], keywords=keywords[:255], body=body,
+            ))
+        kind = document_fields(model())[0]
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=kind).delete()
+            SearchDocument.objects.bulk_create(documents, batch_size=500)
+            if connection.vendor == 'postgresql':
+                SearchDocument.objects.filter(kind=kind).update(vector=weighted_vector())
+        stats[kind] = len(documents)
+    return stats
+
+
+def search_documents(query, kinds=None):
+    """
+    Поиск по каталогу, упорядоченный по релевантности.
+    PostgreSQL: взвешенный tsvector (GIN) плюс триграммное сходство заголовка для опечаток.
+    SQLite: FTS5 с весами колонок и поиском по префиксу.
+    """
+    queryset = SearchDocument.objects.all()
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        # Оба условия идут по индексам: @@ — GIN по vector, % — триграммный GIN по title
+        # (порог pg_trgm.similarity_threshold, по умолчанию 0.3)
+        return (
+            queryset.filter(Q(vector=search_query) | Q(title__trigram_similar=query))
+            .annotate(rank=SearchRank(F('vector'), search_query) + TrigramSimilarity('title', query))
+            .order_by('-rank', 'pk')
+        )
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(queryset, CATALOG_FTS_TABLE, query, CATALOG_FTS_WEIGHTS)
+    return queryset.filter(Q(title__icontains=query) | Q(keywords__icontains=query)).order_by('pk')
+
+
+def rank_catalog(queryset, query):
+    """
+    Оставляет в queryset зала/клуба/тренера только найденные объекты
+    и упорядочивает их по релевантности поискового документа.
+    """
+    kind = document_fields(queryset.model())[0]
+    ids = list(search_documents(query, kinds=[kind]).values_list('object_id', flat=True)[:MAX_RESULTS])
+    if not ids:
+        return queryset.none()
+    position = Case(
+        *[When(pk=pk, then=index) for index, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).annotate(search_position=position).order_by('search_position')
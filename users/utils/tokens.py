@@ -1,14 +1,71 @@
-from rest_framework_simplejwt.tokens import RefreshToken
+from functools import lru_cache
+
+import jwt
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, BlacklistMixin
+from rest_framework_simplejwt.utils import datetime_from_epoch
 from django.contrib.auth import get_user_model
 
+from .revocation import RevocableRefreshToken
+
 User = get_user_model()
 
 
+class LazyRefreshToken(RevocableRefreshToken):
+    """
+    Refresh-токен, который записывается в OutstandingToken только тогда,
+    когда его действительно отдают клиенту (при первом str()).
+    Если нужен лишь access_token, запись в БД не делается вовсе.
+    """
+    _pending_user = None
+
+    @classmethod
+    def for_user(cls, user):
+        # Token.for_user в обход BlacklistMixin, который сразу создаёт строку
+        token = super(BlacklistMixin, cls).for_user(user)
+        token._pending_user = user
+        return token
+
+    def __str__(self):
+        encoded = super().__str__()
+        if self._pending_user is not None:
+            user, self._pending_user = self._pending_user, None
+            OutstandingToken.objects.create(
+                user=user,
+                jti=self[api_settings.JTI_CLAIM],
+                token=encoded,
+                created_at=self.current_time,
+                expires_at=datetime_from_epoch(self['exp']),
+            )
+        return encoded
+
+
+def issue_access_token(user):
+    """Только access-токен: без refresh-токена и без записи в БД."""
+    return AccessToken.for_user(user)
+
+
+@lru_cache(maxsize=1)
+def public_jwk():
+    """
+    Публичный ключ подписи в формате JWK (RFC 7517) или None,
+    если токены подписываются симметричным ключом (HS*).
+    """
+    algorithm = api_settings.ALGORITHM
+    if algorithm.startswith('HS'):
+        return None
+    signer = jwt.get_algorithm_by_name(algorithm)
+    key = signer.to_jwk(signer.prepare_key(api_settings.VERIFYING_KEY), as_dict=True)
+    key.update(alg=algorithm, use='sig')
+    return key
+
+
 def create_jwt_tokens_for_user(user):
     """
     Создает уникальные JWT токены для конкретного пользователя
     """
-    refresh = RefreshToken.for_user(user)
+    refresh = LazyRefreshToken.for_user(user)
 
     return {
         'refresh': str(refresh),
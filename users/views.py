@@ -1,29 +1,51 @@
 from rest_framework import viewsets, permissions, status, mixins, generics
 from rest_framework.views import APIView
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 from .models import (
-    UserProfile, Trainer, Hall, Club, Ad, Review, Notification,
-    ClassSchedule, Joinclub, UserRole
+    UserProfile, Trainer, Hall, Club, Ad, Review,
+    ClassSchedule, Joinclub, Attendance, UserRole
 )
 from .serializers import (
     RegisterSerializer, VerifyCodeSerializer, LoginSerializer,
     UserProfileSerializer, TrainerSerializer, HallSerializer, ClubSerializer,
     AdSerializer, ReviewSerializer, NotificationSerializer, ClientDetailSerializer,
     ForgotPasswordSerializer, ResetPasswordSerializer, ClassScheduleSerializer,
-    JoinclubSerializer, RoleTokenSerializer, MyTokenObtainPairSerializer
+    JoinclubSerializer, RoleTokenSerializer, MyTokenObtainPairSerializer,
+    AttendanceRosterSerializer, FreeWindowsQuerySerializer, BroadcastNotificationSerializer,
+    MarkNotificationsReadSerializer
 )
 from .utils import generate_and_send_code
-from .utils.tokens import create_jwt_tokens_for_user
-from .exceptions import AuthenticationFailed, ValidationError, PermissionDenied
+from .utils.accounts import normalize_email, get_user_by_email, email_taken
+from .utils.tokens import create_jwt_tokens_for_user, issue_access_token, public_jwk, LazyRefreshToken
+from .utils.revocation import RevocableRefreshToken, revoke
+from .utils.attendance import summarize_attendance
+from .utils.exports import CONTENT_TYPES, stream_export
+from .utils.schedule import free_windows
+from .utils.search import search_notifications
+from .utils.notifications import (
+    inbox, send_broadcast, mark_read, dismiss, mark_many_read, unread_count
+)
+from .exceptions import ValidationError
+from .permissions import IsAdminOrTrainer, get_trainer, get_user_profile, is_admin
+from .throttling import AuthThrottle
+from .pagination import CreatedAtCursorPagination, StandardPagination
+from .filters import RankedSearchFilter
+from .identity import fetch_or_404
+from .utils.http_cache import CachedResponseMixin
+from .utils.optimizer import OptimizedQuerysetMixin
 
 import logging
 
@@ -32,6 +54,8 @@ logger = logging.getLogger(__name__)
 
 class MyLoginView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'login')
 
 
 class GetRoleTokenView(APIView):
@@ -39,7 +63,7 @@ class GetRoleTokenView(APIView):
 
     def get(self, request):
         user_profile = request.user.userprofile
-        refresh = RefreshToken.for_user(request.user)
+        refresh = LazyRefreshToken.for_user(request.user)
         data = {
             'access_token': str(refresh.access_token),
             'refresh_token': str(refresh),
@@ -51,6 +75,8 @@ class GetRoleTokenView(APIView):
 # -------------------- AUTHENTICATION VIEWS --------------------
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'send')
 
     @swagger_auto_schema(
         tags=['🔐 Аутентификация'],
@@ -77,34 +103,38 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            email = serializer.validated_data['email']
+            email = normalize_email(serializer.validated_data['email'])
 
-            # Проверяем, существует ли пользователь с таким email
-            if User.objects.filter(email=email).exists():
+            # Проверяем, существует ли пользователь с таким email (без учёта регистра)
+            if email_taken(email):
                 return Response(
                     {'error': 'Пользователь с таким email уже существует'},
                     status=status.HTTP_409_CONFLICT
                 )
 
-            # Создаем пользователя с ролью по умолчанию (USER)
-            user = User.objects.create_user(
-                username=email,
-                email=email,
-                password=serializer.validated_data['password'],
-                first_name=serializer.validated_data.get('first_name', ''),
-                last_name=serializer.validated_data.get('last_name', '')
-            )
+            # Пользователь, профиль, код и письмо в outbox — одной транзакцией
+            with transaction.atomic():
+                # Создаем пользователя с ролью по умолчанию (USER)
+                user = User.objects.create_user(
+                    username=email,
+                    email=email,
+                    password=serializer.validated_data['password'],
+                    first_name=serializer.validated_data.get('first_name', ''),
+                    last_name=serializer.validated_data.get('last_name', '')
+                )
 
-            # Создаем профиль пользователя с ролью по умолчанию
-            UserProfile.objects.create(
-                user=user,
-                role=UserRole.USER,  # Устанавливаем роль по умолчанию
-                phone_number=serializer.validated_data.get('phone_number'),
-                birth_date=serializer.validated_data.get('birth_date')
-            )
+                # Заполняем профиль, созданный сигналом, ролью по умолчанию
+                UserProfile.objects.update_or_create(
+                    user=user,
+                    defaults={
+                        'role': UserRole.USER,  # Устанавливаем роль по умолчанию
+                        'phone_number': serializer.validated_data.get('phone_number'),
+                        'birth_date': serializer.validated_data.get('birth_date'),
+                    }
+                )
 
-            # Генерируем и отправляем код подтверждения
-            code = generate_and_send_code(email)
+                # Генерируем код и ставим письмо в очередь (отправит send_outbox)
+                code = generate_and_send_code(user)
 
             return Response(
                 {
@@ -118,6 +148,8 @@ class RegisterView(APIView):
 
 class VerifyCodeView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'code')
 
     @swagger_auto_schema(
         tags=['🔐 Аутентификация'],
@@ -187,6 +219,8 @@ class LoginView(APIView):
     Возвращает access токен и данные пользователя.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'login')
 
     @swagger_auto_schema(
         tags=['🔐 Аутентификация'],
@@ -222,21 +256,12 @@ class LoginView(APIView):
                 'message': 'Неверный формат запроса'
             })
 
-        email = serializer.validated_data['email']
-        password = serializer.validated_data['password']
+        # Пароль уже проверен в LoginSerializer — один раз
+        user = serializer.validated_data['user']
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise AuthenticationFailed('Неверный email или пароль')
-
-        if not user.check_password(password):
-            raise AuthenticationFailed('Неверный email или пароль')
-
-        if not user.is_active:
-            raise PermissionDenied('Аккаунт не активирован. Пожалуйста, подтвердите email.')
-
-        refresh = RefreshToken.for_user(user)
+        # Клиенту отдаётся только access-токен, поэтому refresh-токен
+        # (и его строка в OutstandingToken) не создаётся
+        access = issue_access_token(user)
 
         # Определяем роль
         try:
@@ -247,7 +272,7 @@ class LoginView(APIView):
             role = 'admin' if user.is_superuser or user.is_staff else 'user'
 
         data = {
-            "access": str(refresh.access_token),
+            "access": str(access),
             "user": {
                 "username": user.username,
                 "first_name": user.first_name,
@@ -263,6 +288,8 @@ class LoginView(APIView):
 
 class ForgotPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'send')
 
     @swagger_auto_schema(
         tags=['🔐 Аутентификация'],
@@ -298,8 +325,8 @@ class ForgotPasswordView(APIView):
         if serializer.is_valid():
             email = serializer.validated_data['email']
             try:
-                user = User.objects.get(email=email)
-                # Здесь должна быть логика отправки кода подтверждения
+                user = get_user_by_email(email)
+                generate_and_send_code(user, purpose='reset')
                 return Response({
                     'success': True,
                     'message': 'Код подтверждения отправлен на ваш email',
@@ -318,6 +345,8 @@ class ForgotPasswordView(APIView):
 
 class ResetPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'code')
 
     @swagger_auto_schema(
         tags=['🔐 Аутентификация'],
@@ -358,6 +387,8 @@ class ResetPasswordView(APIView):
 
 class ResendCodeView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+    auth_throttle = ('ip', 'send')
 
     @swagger_auto_schema(
         tags=['🔐 Аутентификация'],
@@ -390,7 +421,7 @@ class ResendCodeView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            user = User.objects.get(email=email)
+            user = get_user_by_email(email)
             generate_and_send_code(user)
             return Response({
                 "success": True,
@@ -444,8 +475,8 @@ class RefreshTokenView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Создаем новый access token из refresh token
-            refresh = RefreshToken(refresh_token)
+            # Создаем новый access token из refresh token (отзыв проверяется в памяти)
+            refresh = RevocableRefreshToken(refresh_token)
             access_token = str(refresh.access_token)
 
             return Response({
@@ -460,6 +491,36 @@ class RefreshTokenView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class JWKSView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        tags=['🔐 Аутентификация'],
+        operation_summary="Публичный ключ для проверки токенов",
+        operation_description="""
+        Публичный ключ подписи JWT в формате JWK Set. Позволяет другим сервисам
+        проверять токены самостоятельно. Доступен только при RS256/EdDSA.
+        """,
+        responses={
+            200: openapi.Response('JWK Set', examples={
+                'application/json': {'keys': [{'kty': 'RSA', 'alg': 'RS256', 'use': 'sig', 'n': '...', 'e': 'AQAB'}]}
+            }),
+            404: openapi.Response('Токены подписываются симметричным ключом', examples={
+                'application/json': {'success': False, 'error': 'Публичный ключ не используется'}
+            })
+        }
+    )
+    def get(self, request):
+        key = public_jwk()
+        if key is None:
+            return Response({
+                'success': False,
+                'error': 'Публичный ключ не используется'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({'keys': [key]}, status=status.HTTP_200_OK)
+
+
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -467,7 +528,8 @@ class LogoutView(APIView):
         tags=['🔐 Аутентификация'],
         operation_summary="Выход из системы",
         operation_description="""
-        Выход из системы с добавлением refresh token в черный список.
+        Выход из системы: refresh token попадает в черный список,
+        access token из заголовка Authorization отзывается.
         """,
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -496,9 +558,12 @@ class LogoutView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Добавляем refresh token в черный список
-            token = RefreshToken(refresh_token)
-            token.blacklist()
+            # Добавляем refresh token в черный список и отзываем текущий access token
+            token = RevocableRefreshToken(refresh_token)
+            with transaction.atomic():
+                token.blacklist()
+                if request.auth is not None:
+                    revoke(request.auth)
 
             return Response({
                 'success': True,
@@ -516,7 +581,7 @@ class LogoutView(APIView):
 # Остальные view остаются без изменений, так как они используют стандартную
 # аутентификацию JWT, которая теперь будет работать правильно
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -531,23 +596,17 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             200: openapi.Response('Данные профиля', UserProfileSerializer),
             401: 'Не авторизован',
             404: openapi.Response('Профиль не найден', examples={
-                'application/json': {'success': False, 'message': 'Профиль не найден'}
+                'application/json': {'status': 'error', 'code': 'error', 'message': 'UserProfile не найден', 'data': {}}
             })
         }
     )
     def retrieve(self, request, pk=None):
-        try:
-            user_profile = get_object_or_404(UserProfile, user=request.user)
-            serializer = self.get_serializer(user_profile)
-            return Response({
-                'success': True,
-                'data': serializer.data
-            }, status=status.HTTP_200_OK)
-        except UserProfile.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Профиль не найден'
-            }, status=status.HTTP_404_NOT_FOUND)
+        user_profile = fetch_or_404(UserProfile, user=request.user)
+        serializer = self.get_serializer(user_profile)
+        return Response({
+            'success': True,
+            'data': serializer.data
+        }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         tags=['👤 Профиль пользователя'],
@@ -563,36 +622,78 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             }),
             401: 'Не авторизован',
             404: openapi.Response('Профиль не найден', examples={
-                'application/json': {'success': False, 'message': 'Профиль не найден'}
+                'application/json': {'status': 'error', 'code': 'error', 'message': 'UserProfile не найден', 'data': {}}
             })
         }
     )
     def update(self, request, pk=None):
-        try:
-            user_profile = get_object_or_404(UserProfile, user=request.user)
-            serializer = self.get_serializer(user_profile, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                return Response({
-                    'success': True,
-                    'message': 'Профиль успешно обновлен',
-                    'data': serializer.data
-                }, status=status.HTTP_200_OK)
-            return Response({
-                'success': False,
-                'errors': serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
-        except UserProfile.DoesNotExist:
+        user_profile = fetch_or_404(UserProfile, user=request.user)
+        serializer = self.get_serializer(user_profile, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
             return Response({
-                'success': False,
-                'message': 'Профиль не найден'
-            }, status=status.HTTP_404_NOT_FOUND)
+                'success': True,
+                'message': 'Профиль успешно обновлен',
+                'data': serializer.data
+            }, status=status.HTTP_200_OK)
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     def get_queryset(self):
         return UserProfile.objects.filter(user=self.request.user)
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+EXPORT_PARAMETERS = [
+    openapi.Parameter('file_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(CONTENT_TYPES),
+                      description='Формат файла: csv (по умолчанию) или jsonl'),
+    openapi.Parameter('club', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='ID клуба'),
+    openapi.Parameter('trainer', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='ID тренера'),
+    openapi.Parameter('date_from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date',
+                      description='Начало периода (ГГГГ-ММ-ДД)'),
+    openapi.Parameter('date_to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date',
+                      description='Конец периода (ГГГГ-ММ-ДД)'),
+]
+
+
+def export_response(request, name, queryset):
+    """
+    Потоковый ответ с выгрузкой `name`. Параметры проверяются до начала ответа,
+    строки читаются из БД уже во время отправки.
+    """
+    params = request.query_params
+    # Не `format`: этот параметр DRF использует для выбора рендерера
+    fmt = params.get('file_format') or 'csv'
+    if fmt not in CONTENT_TYPES:
+        raise ValidationError({'file_format': f"Допустимые форматы: {', '.join(CONTENT_TYPES)}"})
+
+    filters = {}
+    for key in ('club', 'trainer'):
+        value = params.get(key)
+        if value:
+            if not value.isdigit():
+                raise ValidationError({key: 'Ожидался числовой ID'})
+            filters[key] = int(value)
+    for key in ('date_from', 'date_to'):
+        value = params.get(key)
+        if value:
+            try:
+                filters[key] = parse_date(value)
+            except ValueError:
+                filters[key] = None
+            if filters[key] is None:
+                raise ValidationError({key: 'Неверный формат даты, ожидается ГГГГ-ММ-ДД'})
+
+    response = StreamingHttpResponse(
+        stream_export(name, fmt, queryset, **filters), content_type=CONTENT_TYPES[fmt]
+    )
+    filename = f"{name}-{timezone.localdate():%Y-%m-%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ClientViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     """
     API для управления клиентами.
 
@@ -605,7 +706,7 @@ class ClientViewSet(viewsets.ModelViewSet):
     - `user__email` - фильтр по email клиента
     - `phone` - фильтр по номеру телефона
     """
-    queryset = UserProfile.objects.select_related('user').all()
+    queryset = UserProfile.objects.select_related('user').order_by('id')
     serializer_class = ClientDetailSerializer
     permission_classes = [IsAdminUser]
 
@@ -613,8 +714,8 @@ class ClientViewSet(viewsets.ModelViewSet):
         """
         Настройка прав доступа в зависимости от действия.
         """
-        if self.action in ['list']:
-            return [IsAdminUser()]
+        if self.action in ['list', 'export']:
+            return [(IsAdminOrTrainer | IsAdminUser)()]
         elif self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
@@ -726,6 +827,32 @@ class ClientViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        tags=['👥 Управление клиентами'],
+        operation_summary='Выгрузка клиентов (CSV/JSONL)',
+        operation_description="""
+        Потоковая выгрузка клиентов файлом: строки отдаются по мере чтения из базы,
+        без пагинации и без ограничения на число строк.
+
+        ### Фильтрация:
+        - `club` - клиенты, записанные на занятия клуба
+        - `trainer` - клиенты тренера
+        - `date_from`, `date_to` - дата регистрации (включительно)
+
+        ### Доступ:
+        - Администраторы (is_staff или роль admin) выгружают всех клиентов
+        - Тренеры — только закреплённых за ними; карточка тренера
+          находится по email аккаунта
+
+        Столбцы совпадают с полями команды `import_clients`.
+        """,
+        manual_parameters=EXPORT_PARAMETERS,
+        responses={200: 'Файл выгрузки', 400: 'Неверные параметры', 403: 'Нет прав'}
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, 'clients', self.get_queryset())
+
     def get_queryset(self):
         """
         Возвращает queryset в зависимости от прав пользователя.
@@ -733,20 +860,24 @@ class ClientViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
 
         # Администраторы видят всех клиентов
-        if self.request.user.is_staff:
+        if is_admin(self.request.user):
             return queryset
 
-        if hasattr(self.request.user, 'trainer_profile'):
-            return queryset.filter(trainer=self.request.user.trainer_profile)
+        # Тренеры — только закреплённых за ними
+        trainer = get_trainer(self.request.user)
+        if trainer is not None:
+            return queryset.filter(trainer=trainer)
 
         # Обычные пользователи не видят клиентов
         return queryset.none()
 
 
-class HallViewSet(viewsets.ModelViewSet):
-    queryset = Hall.objects.all()
+class HallViewSet(OptimizedQuerysetMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Hall.objects.order_by('id')
     serializer_class = HallSerializer
     permission_classes = [IsAdminUser]
+    cache_namespace = 'users.halls'
+    cache_models = (Hall,)
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -803,10 +934,12 @@ class HallViewSet(viewsets.ModelViewSet):
 
 
 # Клубы
-class ClubViewSet(viewsets.ModelViewSet):
-    queryset = Club.objects.all()
+class ClubViewSet(OptimizedQuerysetMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Club.objects.order_by('id')
     serializer_class = ClubSerializer
     permission_classes = [IsAdminUser]
+    cache_namespace = 'users.clubs'
+    cache_models = (Club,)
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -839,10 +972,13 @@ class ClubViewSet(viewsets.ModelViewSet):
 
 
 # Тренеры
-class TrainerViewSet(viewsets.ModelViewSet):
-    queryset = Trainer.objects.all()
+class TrainerViewSet(OptimizedQuerysetMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Trainer.objects.order_by('id')
     serializer_class = TrainerSerializer
     permission_classes = [IsAdminUser]
+    cache_namespace = 'users.trainers'
+    cache_models = (Trainer,)
+    filter_backends = [RankedSearchFilter]
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -874,10 +1010,12 @@ class TrainerViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class AdViewSet(viewsets.ModelViewSet):
-    queryset = Ad.objects.all()
+class AdViewSet(OptimizedQuerysetMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Ad.objects.order_by('-created_at', '-id')
     serializer_class = AdSerializer
     permission_classes = [IsAdminUser]
+    cache_namespace = 'users.ads'
+    cache_models = (Ad,)
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -910,10 +1048,11 @@ class AdViewSet(viewsets.ModelViewSet):
 
 
 # Отзывы
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CreatedAtCursorPagination
 
     def get_permissions(self):
         if self.action in []:
@@ -950,12 +1089,20 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
 
 # Уведомления
-class NotificationViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class NotificationViewSet(OptimizedQuerysetMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = NotificationSerializer
-    permission_classes = [IsAdminUser]
+    permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_permissions(self):
+        if self.action == 'broadcast':
+            return [IsAdminUser()]
+        return [IsAuthenticated()]
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        # Личные уведомления и рассылки вместе, без строки рассылки на каждого пользователя
+        return inbox(self.request.user)
+
     @swagger_auto_schema(
         tags=['🔔 Уведомления'],
         operation_summary="Получить все уведомления",
@@ -964,13 +1111,19 @@ class NotificationViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             openapi.Parameter(
                 'search',
                 openapi.IN_QUERY,
-                description='Поиск по тексту уведомления',
+                description='Полнотекстовый поиск по тексту уведомления (по релевантности)',
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description='Курсор следующей/предыдущей страницы (из полей next/previous)',
                 type=openapi.TYPE_STRING
             ),
             openapi.Parameter(
                 'page',
                 openapi.IN_QUERY,
-                description='Номер страницы для пагинации',
+                description='Номер страницы результатов поиска (вместе с search)',
                 type=openapi.TYPE_INTEGER
             )
         ],
@@ -981,21 +1134,100 @@ class NotificationViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     )
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
+        paginator = self.paginator
 
-        # Применяем поиск если указан параметр search
-        search_query = request.query_params.get('search')
+        # Применяем поиск если указан параметр search: полнотекстовый индекс,
+        # результаты по релевантности, поэтому вместо курсора — постраничная навигация
+        search_query = request.query_params.get('search', '').strip()
         if search_query:
-            queryset = queryset.filter(message__icontains=search_query)
+            queryset = search_notifications(queryset, search_query)
+            paginator = StandardPagination()
 
         # Применяем пагинацию
-        page = self.paginate_queryset(queryset)
+        page = paginator.paginate_queryset(queryset, request, view=self)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return paginator.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        tags=['🔔 Уведомления'],
+        operation_summary="Отметить уведомление прочитанным",
+        responses={200: openapi.Response('Отмечено', examples={'application/json': {'success': True}})}
+    )
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        mark_read(request.user, self.get_object())
+        return Response({'success': True}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        tags=['🔔 Уведомления'],
+        operation_summary="Скрыть уведомление",
+        responses={200: openapi.Response('Скрыто', examples={'application/json': {'success': True}})}
+    )
+    @action(detail=True, methods=['post'])
+    def dismiss(self, request, pk=None):
+        dismiss(request.user, self.get_object())
+        return Response({'success': True}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        tags=['🔔 Уведомления'],
+        operation_summary="Количество непрочитанных",
+        operation_description="Счётчик для бейджа. Не загружает сами уведомления.",
+        responses={200: openapi.Response('Счётчик', examples={'application/json': {'success': True, 'unread': 3}})}
+    )
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        return Response({'success': True, 'unread': unread_count(request.user)}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        tags=['🔔 Уведомления'],
+        operation_summary="Отметить уведомления прочитанными",
+        operation_description="""
+        Отмечает прочитанными уведомления из списка `ids`, все уведомления до момента `before`
+        или все уведомления, если тело запроса пустое.
+        """,
+        request_body=MarkNotificationsReadSerializer,
+        responses={200: openapi.Response('Отмечено', examples={
+            'application/json': {'success': True, 'marked': 12, 'unread': 0}})}
+    )
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_many_read(self, request):
+        serializer = MarkNotificationsReadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'success': False, 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        marked = mark_many_read(request.user, **serializer.validated_data)
+        return Response({
+            'success': True,
+            'marked': marked,
+            'unread': unread_count(request.user)
+        }, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        tags=['🔔 Уведомления'],
+        operation_summary="Рассылка всем пользователям",
+        operation_description="""
+        Создаёт одно уведомление для всех пользователей. Отметки о прочтении
+        создаются только когда пользователь открывает или скрывает уведомление.
+        Доступно только администраторам.
+        """,
+        request_body=BroadcastNotificationSerializer,
+        responses={201: openapi.Response('Рассылка создана', NotificationSerializer)}
+    )
+    @action(detail=False, methods=['post'])
+    def broadcast(self, request):
+        serializer = BroadcastNotificationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'success': False, 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        notification = send_broadcast(**serializer.validated_data)
+        return Response({
+            'success': True,
+            'data': NotificationSerializer(notification).data
+        }, status=status.HTTP_201_CREATED)
+
+
 class ClassScheduleView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -1035,11 +1267,60 @@ class ClassScheduleView(APIView):
                             status=status.HTTP_403_FORBIDDEN)
         serializer = ClassScheduleSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                # Пересечение с другими занятиями зала проверяется под блокировкой при сохранении
+                serializer.save()
+            except DRFValidationError as exc:
+                return Response({"success": False, "errors": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
             return Response({"success": True, "data": serializer.data}, status=status.HTTP_201_CREATED)
         return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class HallFreeWindowsView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        tags=['📅Расписание'],
+        operation_summary="Свободные окна зала",
+        operation_description="""
+        Возвращает промежутки времени, в которые зал свободен в указанный день недели.
+        """,
+        query_serializer=FreeWindowsQuerySerializer,
+        responses={
+            200: openapi.Response('Свободные окна', examples={
+                'application/json': {
+                    'success': True,
+                    'data': [{'start_time': '08:00:00', 'end_time': '10:00:00'},
+                             {'start_time': '11:30:00', 'end_time': '22:00:00'}]
+                }
+            }),
+            400: 'Неверные параметры'
+        }
+    )
+    def get(self, request):
+        serializer = FreeWindowsQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = serializer.validated_data
+        windows = free_windows(params['hall'], params['day_of_week'], params['open_time'], params['close_time'])
+        return Response({
+            "success": True,
+            "data": [{'start_time': start, 'end_time': end} for start, end in windows]
+        }, status=status.HTTP_200_OK)
+
+
+def profile_or_404(user):
+    """
+    Профиль пользователя запроса для фильтров и внешних ключей: с
+    CachedJWTAuthentication он уже лежит в request.user, без запроса к БД.
+    """
+    user_profile = get_user_profile(user)
+    if user_profile is None:
+        raise Http404("Профиль пользователя не найден")
+    return user_profile
+
+
 class JoinclubView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -1054,18 +1335,12 @@ class JoinclubView(APIView):
             200: openapi.Response('Список записей', JoinclubSerializer(many=True)),
             401: 'Не авторизован',
             404: openapi.Response('Записи не найдены или профиль отсутствует', examples={
-                'application/json': {'success': False, 'message': 'Профиль пользователя не найден'}})
+                'application/json': {'status': 'error', 'code': 'error',
+                                     'message': 'Профиль пользователя не найден', 'data': {}}})
         }
     )
     def get(self, request):
-        try:
-            user_profile = get_object_or_404(UserProfile, user=request.user)
-        except ObjectDoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Профиль пользователя не найден'
-            }, status=status.HTTP_404_NOT_FOUND)
-
+        user_profile = profile_or_404(request.user)
         joinclubs = Joinclub.objects.filter(user=user_profile)
         serializer = JoinclubSerializer(joinclubs, many=True)
         return Response({
@@ -1098,7 +1373,7 @@ class JoinclubView(APIView):
         }
     )
     def post(self, request):
-        user_profile = get_object_or_404(UserProfile, user=request.user)
+        user_profile = profile_or_404(request.user)
         schedule_id = request.data.get('schedule')
         age_group = request.data.get('age_group', 'Adult')
 
@@ -1120,8 +1395,16 @@ class AttendanceView(APIView):
         operation_summary="Получить статистику посещаемости для всех занятий пользователя",
         operation_description="""
         Возвращает сводку посещаемости для всех занятий, на которые записан текущий
-        аутентифицированный пользователь.
+        аутентифицированный пользователь. По умолчанию — за последние 30 дней.
         """,
+        manual_parameters=[
+            openapi.Parameter('days', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Окно сводки в днях (по умолчанию 30)'),
+            openapi.Parameter('date_from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date',
+                              description='Начало периода (ГГГГ-ММ-ДД)'),
+            openapi.Parameter('date_to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date',
+                              description='Конец периода (ГГГГ-ММ-ДД)'),
+        ],
         responses={
             200: openapi.Response('Список сводок посещаемости', examples={
                 'application/json': {
@@ -1136,23 +1419,38 @@ class AttendanceView(APIView):
         }
     )
     def get(self, request):
-        # Используем get_object_or_404 для получения профиля.
+        # Нужен только id профиля: он уже есть в request.user.
         # Если профиль не существует, DRF автоматически вернет 404.
-        user_profile = get_object_or_404(UserProfile, user=request.user)
-
-        # Получаем все записи (joinclub) для текущего пользователя
-        # Запрос к базе данных выполняется один раз
-        joinclubs = Joinclub.objects.filter(user=user_profile)
+        user_profile = profile_or_404(request.user)
 
-        attendance_data = []
-        for joinclub in joinclubs:
-            # Для каждой записи получаем сводку, используя уже существующий метод
-            summary = joinclub.get_attendance_summary
-            attendance_data.append({
+        try:
+            date_from = parse_date(request.query_params.get('date_from') or '')
+            date_to = parse_date(request.query_params.get('date_to') or '')
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Неверный формат даты'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        days = request.query_params.get('days')
+        days = int(days) if days and days.isdigit() else None
+
+        # Записи вместе с названием занятия — один запрос,
+        # сводка по всем записям — ещё один агрегирующий запрос
+        joinclubs = list(
+            Joinclub.objects.filter(user=user_profile)
+            .select_related('schedule')
+            .only('id', 'schedule__title')
+        )
+        summaries = summarize_attendance(joinclubs, days=days, date_from=date_from, date_to=date_to)
+
+        attendance_data = [
+            {
                 'joinclub_id': joinclub.id,
                 'title': joinclub.schedule.title,
-                'summary': summary
-            })
+                'summary': summaries[joinclub.id]
+            }
+            for joinclub in joinclubs
+        ]
 
         return Response({
             'success': True,
@@ -1160,11 +1458,69 @@ class AttendanceView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class AttendanceExportView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrTrainer | IsAdminUser]
+
+    @swagger_auto_schema(
+        tags=['✅ Посещаемость'],
+        operation_summary="Выгрузка посещаемости (CSV/JSONL)",
+        operation_description="""
+        Потоковая выгрузка отметок посещаемости файлом: строки отдаются по мере
+        чтения из базы. Фильтры: клуб занятия, тренер клиента, период отметок.
+        Администраторы (is_staff или роль admin) выгружают все отметки,
+        тренеры — только своих клиентов: карточка тренера находится по email аккаунта.
+        """,
+        manual_parameters=EXPORT_PARAMETERS,
+        responses={200: 'Файл выгрузки', 400: 'Неверные параметры', 401: 'Не авторизован', 403: 'Нет прав'}
+    )
+    def get(self, request):
+        queryset = Attendance.objects.all()
+        if not is_admin(request.user):
+            trainer = get_trainer(request.user)
+            queryset = queryset.filter(joinclub__user__trainer=trainer) if trainer else queryset.none()
+        return export_response(request, 'attendance', queryset)
+
+
+class AttendanceMarkView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrTrainer | IsAdminUser]
+
+    @swagger_auto_schema(
+        tags=['✅ Посещаемость'],
+        operation_summary="Отметить посещаемость группы",
+        operation_description="""
+        Отмечает посещаемость всех участников занятия за указанную дату одним запросом.
+        Повторная отправка за ту же дату перезаписывает прежние отметки;
+        заметка участника без поля notes остаётся прежней.
+        Доступно тренерам и администраторам. Тренер у занятия не хранится,
+        поэтому тренер может отметить посещаемость любого расписания.
+        """,
+        request_body=AttendanceRosterSerializer,
+        responses={
+            200: openapi.Response('Отметки сохранены', examples={
+                'application/json': {
+                    'success': True,
+                    'data': {'schedule_id': 1, 'date': '2025-10-01', 'enrolled': 25,
+                             'present': 20, 'absent': 3, 'total': 23, 'unmarked': 2}
+                }
+            }),
+            400: 'Ошибка валидации',
+            401: 'Не авторизован',
+            403: 'Нет прав'
+        }
+    )
+    def post(self, request):
+        serializer = AttendanceRosterSerializer(data=request.data)
+        if serializer.is_valid():
+            summary = serializer.save()
+            return Response({"success": True, "data": summary}, status=status.HTTP_200_OK)
+        return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+
 def create_jwt_tokens_for_user(user):
     """
     Генерация JWT токенов с информацией о роли пользователя
     """
-    refresh = RefreshToken.for_user(user)
+    refresh = LazyRefreshToken.for_user(user)
 
     # Добавляем информацию о пользователе в токен
     if hasattr(user, 'userprofile'):